@@ -0,0 +1,227 @@
+import threading
+import time
+from collections import deque
+
+# 会话被回收的原因
+REAP_IDLE = "idle"
+REAP_LIFETIME = "lifetime"
+REAP_DISCONNECTED = "disconnected"
+
+
+class AdmissionRejected(Exception):
+    """并发会话数已达上限，且排队已满或等待超时"""
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def mask_key(api_key):
+    return api_key[:4] + "****" if api_key else ""
+
+
+class AdmissionController:
+    """识别会话的准入控制：全局及每个 API Key 的并发会话上限
+
+    达到上限时，最多 queue_size 个请求排队等待名额，最长等待 queue_timeout 秒；
+    queue_size 为 0 时直接拒绝。上限为 0 表示不限制。
+    """
+
+    def __init__(self, max_sessions=0, max_per_key=0, queue_size=0, queue_timeout=10.0):
+        self.max_sessions = max_sessions
+        self.max_per_key = max_per_key
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._per_key = {}
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._waits = deque(maxlen=1000)
+        self.counters = {"admitted": 0, "queued": 0, "rejected": 0, "timeouts": 0, "released": 0}
+
+    def admit(self, api_key):
+        """占用一个会话名额，需要时排队等待；无法获得名额时抛出 AdmissionRejected"""
+        with self._cond:
+            if self._has_room(api_key):
+                self._take(api_key)
+                return
+            if self._waiting >= self.queue_size:
+                self.counters["rejected"] += 1
+                raise AdmissionRejected(self._limit_message(api_key))
+
+            self._waiting += 1
+            self.counters["queued"] += 1
+            started = time.monotonic()
+            try:
+                admitted = self._cond.wait_for(lambda: self._has_room(api_key), timeout=self.queue_timeout)
+            finally:
+                self._waiting -= 1
+            if not admitted:
+                self.counters["timeouts"] += 1
+                raise AdmissionRejected(f"{self._limit_message(api_key)}，排队 {self.queue_timeout:g} 秒仍未获得名额")
+            self._waits.append(time.monotonic() - started)
+            self._take(api_key)
+
+    def release(self, api_key):
+        with self._cond:
+            count = self._per_key.get(api_key, 0) - 1
+            if count < 0:
+                return
+            self._active -= 1
+            if count > 0:
+                self._per_key[api_key] = count
+            else:
+                self._per_key.pop(api_key, None)
+            self.counters["released"] += 1
+            # 不同 API Key 的等待者条件不同，全部唤醒各自检查
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "max_sessions": self.max_sessions,
+                "max_sessions_per_key": self.max_per_key,
+                "queue_size": self.queue_size,
+                "queue_timeout": self.queue_timeout,
+                "active": self._active,
+                "waiting": self._waiting,
+                "per_key": {mask_key(key): count for key, count in self._per_key.items()},
+                "counters": dict(self.counters),
+                "queue_wait_ms": {
+                    "count": len(waits),
+                    "p50": round(waits[len(waits) // 2] * 1000, 1) if waits else None,
+                    "max": round(waits[-1] * 1000, 1) if waits else None
+                }
+            }
+
+    def _has_room(self, api_key):
+        # 调用方需持有锁
+        if self.max_sessions and self._active >= self.max_sessions:
+            return False
+        if self.max_per_key and self._per_key.get(api_key, 0) >= self.max_per_key:
+            return False
+        return True
+
+    def _take(self, api_key):
+        # 调用方需持有锁
+        self._active += 1
+        self._per_key[api_key] = self._per_key.get(api_key, 0) + 1
+        self.counters["admitted"] += 1
+
+    def _limit_message(self, api_key):
+        if self.max_sessions and self._active >= self.max_sessions:
+            return f"并发会话数已达上限 {self.max_sessions}"
+        return f"该 API Key 的并发会话数已达上限 {self.max_per_key}"
+
+
+class _Tracked:
+    def __init__(self, now):
+        self.created_at = now
+        self.last_activity = now
+        self.connected = False
+        self.disconnected_at = None
+
+
+class SessionReaper:
+    """回收被遗弃的会话：空闲超时、超过最长存活时间，或 WebSocket 断开后超过宽限时间未重连
+
+    后台线程每隔 interval 秒检查一次，对过期会话调用 on_expire(session_id, reason)。
+    last_event(session_id) 可选，返回会话最近一次识别结果的 time.monotonic() 时间，也计为活动。
+    各项超时为 0 表示不启用。
+    """
+
+    def __init__(self, on_expire, idle_timeout=1800, max_lifetime=0, disconnect_grace=60,
+                 interval=5.0, last_event=None):
+        self.on_expire = on_expire
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.disconnect_grace = disconnect_grace
+        self.interval = interval
+        self.last_event = last_event
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.counters = {REAP_IDLE: 0, REAP_LIFETIME: 0, REAP_DISCONNECTED: 0}
+
+        worker = threading.Thread(target=self._run, name="session-reaper")
+        worker.daemon = True
+        worker.start()
+
+    def track(self, session_id):
+        with self._lock:
+            self._sessions[session_id] = _Tracked(time.monotonic())
+
+    def forget(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def touch(self, session_id):
+        """记录客户端活动（控制请求、WebSocket 消息、上传、任务进度）"""
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            entry.last_activity = time.monotonic()
+
+    def connected(self, session_id):
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            entry.connected = True
+            entry.disconnected_at = None
+            entry.last_activity = time.monotonic()
+
+    def disconnected(self, session_id):
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            entry.connected = False
+            entry.disconnected_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "idle_timeout": self.idle_timeout,
+                "max_lifetime": self.max_lifetime,
+                "disconnect_grace": self.disconnect_grace,
+                "tracked": len(self._sessions),
+                "connected": sum(1 for entry in self._sessions.values() if entry.connected),
+                "reaped": dict(self.counters)
+            }
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"回收会话失败: {e}")
+
+    def reap(self):
+        """检查并回收过期会话，返回 [(session_id, reason)]"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for session_id, entry in list(self._sessions.items()):
+                reason = self._expired(session_id, entry, now)
+                if reason:
+                    del self._sessions[session_id]
+                    self.counters[reason] += 1
+                    expired.append((session_id, reason))
+        for session_id, reason in expired:
+            print(f"回收会话: {session_id}, 原因: {reason}")
+            try:
+                self.on_expire(session_id, reason)
+            except Exception as e:
+                print(f"回收会话失败: {session_id}, 错误: {e}")
+        return expired
+
+    def _expired(self, session_id, entry, now):
+        if self.max_lifetime and now - entry.created_at > self.max_lifetime:
+            return REAP_LIFETIME
+        if (self.disconnect_grace and entry.disconnected_at is not None
+                and now - entry.disconnected_at > self.disconnect_grace):
+            return REAP_DISCONNECTED
+        if self.idle_timeout:
+            last = entry.last_activity
+            if self.last_event is not None:
+                last = max(last, self.last_event(session_id) or last)
+            if now - last > self.idle_timeout:
+                return REAP_IDLE
+        return None
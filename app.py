@@ -3,9 +3,32 @@ import json
 import asyncio
 import websockets
 import uuid
-from flask import Flask, render_template, request, jsonify, session
+import hashlib
+import threading
+import time
+import socket
+import functools
+import urllib.error
+import urllib.request
+from flask import Flask, Response, render_template, request, jsonify, session
 from config import Config
+import translator as translator_module
 from translator import Translator
+from fake_recognizer import FakeRecognizer
+from long_audio import probe_duration
+from audio_decode import prepare_recognizer_input
+from recognizer_pool import RecognizerPool, parse_pool_keys
+from result_cache import MODE_LONG, MODE_PLAIN, ResultCache, TieredStore, hash_file
+from outbound import OutboundQueue
+from jobs import JobQueue, JobQueueFull
+from uploads import UploadAssembly, UploadError, UploadStalled
+from protocol import (PROTOCOL_DELTA, PROTOCOL_FULL, DeltaEncoder, PartialCoalescer, codec_for, negotiate,
+                      parse_last_seq, parse_listen_path, subprotocols)
+from transcript_store import EXPORT_FORMATS, LANGUAGE_SOURCE, TranscriptStore, export as export_transcript, remove_expired
+from broadcast import CHANNEL_SOURCE, ENCODED, Broadcaster, ListenerRejected
+from session_registry import WorkerInfo, create_registry
+from admission import AdmissionController, AdmissionRejected, SessionReaper
+import metrics
 from werkzeug.utils import secure_filename
 
 app = Flask(__name__)
@@ -21,67 +44,469 @@ app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024 * 1024  # 2GB
 # 存储活跃的翻译会话
 active_translators = {}
 active_websockets = {}
+# 听众收听ID -> 会话ID；收听ID只能订阅结果，不能控制会话
+listen_sessions = {}
+
+# 会话归属登记：多个 worker 共享登记时，控制请求会被转发到持有会话的 worker
+worker = WorkerInfo(Config.WORKER_ID or f"{socket.gethostname()}-{os.getpid()}", Config.WORKER_ADDRESS)
+session_registry = create_registry(Config.SESSION_REGISTRY, worker_ttl=Config.WORKER_TTL)
+if session_registry.shared:
+    session_registry.start_heartbeat(worker, Config.WORKER_HEARTBEAT_INTERVAL)
+
+# 转发请求的标记头，收到带此头的请求不再转发，避免登记不一致时循环转发
+FORWARDED_HEADER = 'X-Forwarded-Worker'
+
+def forward_to_owner(key, stream=False):
+    """key 由其他在线 worker 持有时，把当前请求原样转发给它并返回其响应，否则返回 None
+
+    stream 为 True 时直接转发尚未读取的请求体，否则转发已缓存的请求体。
+    """
+    if not key or not session_registry.shared or request.headers.get(FORWARDED_HEADER):
+        return None
+    owner = session_registry.owner(key)
+    if owner is None or owner.worker_id == worker.worker_id:
+        return None
+    
+    headers = {FORWARDED_HEADER: worker.worker_id}
+    if request.content_type:
+        headers['Content-Type'] = request.content_type
+    if stream and request.content_length:
+        body = request.stream
+        headers['Content-Length'] = str(request.content_length)
+    else:
+        body = request.get_data() or None
+    forwarded = urllib.request.Request(
+        owner.address + request.full_path.rstrip('?'), data=body, headers=headers, method=request.method
+    )
+    try:
+        with urllib.request.urlopen(forwarded, timeout=60) as response:
+            return Response(response.read(), status=response.status,
+                            content_type=response.headers.get('Content-Type'))
+    except urllib.error.HTTPError as e:
+        return Response(e.read(), status=e.code, content_type=e.headers.get('Content-Type'))
+    except (urllib.error.URLError, OSError) as e:
+        print(f"转发请求到 {owner.worker_id} 失败: {e}")
+        return jsonify({"success": False, "message": "会话所在的服务进程不可用"}), 502
+
+def remote_owner(session_id):
+    """会话由其他在线 worker 持有时返回该 worker，供 server.py 代理 WebSocket"""
+    if not session_registry.shared or session_id in active_translators:
+        return None
+    owner = session_registry.owner(session_id)
+    return owner if owner is not None and owner.worker_id != worker.worker_id else None
+
+def remote_listen_owner(listen_id):
+    """收听ID所属的会话由其他在线 worker 持有时返回该 worker"""
+    if not session_registry.shared or listen_id in listen_sessions:
+        return None
+    owner = session_registry.owner(listen_id)
+    return owner if owner is not None and owner.worker_id != worker.worker_id else None
+
+# 识别器后端：fake 时所有会话（含预热池和文件翻译）使用本地假识别器
+if Config.RECOGNIZER_BACKEND == "fake":
+    translator_module.recognizer_factory = functools.partial(
+        FakeRecognizer,
+        partial_interval_ms=Config.FAKE_PARTIAL_INTERVAL_MS,
+        sentence_ms=Config.FAKE_SENTENCE_MS,
+        latency_ms=Config.FAKE_LATENCY_MS,
+        final_latency_ms=Config.FAKE_FINAL_LATENCY_MS,
+        jitter_ms=Config.FAKE_JITTER_MS
+    )
+    print("识别器后端: fake（本地假识别器）")
+elif Config.RECOGNIZER_BACKEND != "gummy":
+    raise ValueError(f"未知的识别器后端: {Config.RECOGNIZER_BACKEND}")
+
+# 预热的识别器连接池
+recognizer_pool = None
+if Config.RECOGNIZER_POOL_ENABLED:
+    recognizer_pool = RecognizerPool(
+        min_warm=Config.RECOGNIZER_POOL_MIN_WARM,
+        max_idle=Config.RECOGNIZER_POOL_MAX_IDLE,
+        idle_timeout=Config.RECOGNIZER_POOL_IDLE_TIMEOUT,
+        keepalive_interval=Config.RECOGNIZER_POOL_KEEPALIVE_INTERVAL,
+        api_keys={Config.API_KEY} if Config.API_KEY else set()
+    )
+    # 使用服务器配置的 API Key 固定预热常用的翻译方向
+    if Config.API_KEY:
+        for source_language, target_languages in parse_pool_keys(Config.RECOGNIZER_POOL_KEYS):
+            recognizer_pool.pin(RecognizerPool.key(Config.API_KEY, source_language, target_languages))
+
+# 文件翻译结果缓存（按音频内容寻址）
+result_cache = None
+if Config.RESULT_CACHE_ENABLED:
+    result_cache = ResultCache(TieredStore(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), Config.RESULT_CACHE_DIR),
+        memory_entries=Config.RESULT_CACHE_MEMORY_ENTRIES,
+        disk_bytes=Config.RESULT_CACHE_DISK_MB * 1024 * 1024
+    ))
+
+# 文件翻译任务队列
+file_jobs = JobQueue(workers=Config.FILE_JOB_WORKERS, max_pending=Config.FILE_JOB_MAX_PENDING)
+
+# 识别会话（实时会话及同步/流式文件翻译）的并发上限
+admission = AdmissionController(
+    max_sessions=Config.ADMISSION_MAX_SESSIONS,
+    max_per_key=Config.ADMISSION_MAX_SESSIONS_PER_KEY,
+    queue_size=Config.ADMISSION_QUEUE_SIZE,
+    queue_timeout=Config.ADMISSION_QUEUE_TIMEOUT
+)
+
+def admission_rejected(error):
+    response = jsonify({"success": False, "message": str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+def open_broadcast(session_id, translator):
+    """为会话创建听众广播，返回收听ID"""
+    listen_id = uuid.uuid4().hex
+    translator.listen_id = listen_id
+    translator.callback.broadcast = Broadcaster(
+        queue_size=Config.LISTENER_QUEUE_SIZE,
+        max_listeners=Config.LISTENER_MAX_PER_SESSION
+    )
+    listen_sessions[listen_id] = session_id
+    session_registry.register(listen_id, worker, session_id=session_id)
+    return listen_id
+
+def close_broadcast(translator):
+    """断开会话的所有听众（各听众先发完队列中剩余的消息）"""
+    listen_sessions.pop(translator.listen_id, None)
+    if translator.callback.broadcast is not None:
+        translator.callback.broadcast.close()
+
+def release_session(session_id, close_listeners=True):
+    """移除会话并释放其会话登记、回收跟踪和准入名额，返回被移除的翻译器"""
+    translator = active_translators.pop(session_id, None)
+    if translator is None:
+        return None
+    session_registry.unregister(session_id)
+    session_reaper.forget(session_id)
+    admission.release(translator.api_key)
+    if close_listeners:
+        close_broadcast(translator)
+    return translator
+
+def expire_session(session_id, reason):
+    """回收被遗弃的会话：取消其文件任务和上传，通知客户端及听众并停止识别器"""
+    translator = release_session(session_id, close_listeners=False)
+    if translator is None:
+        return
+    file_jobs.cancel_session(session_id)
+    for upload_id, (assembly, job) in list(active_uploads.items()):
+        if job.session_id == session_id:
+            if upload_id in suspended_uploads:
+                discard_upload(upload_id, assembly)
+            else:
+                assembly.abort()
+    translator.callback.notify({"status": "expired", "reason": reason}, final=True)
+    translator.stop()
+    close_broadcast(translator)
+
+def last_recognition_event(session_id):
+    translator = active_translators.get(session_id)
+    return translator.callback.last_event_at if translator else None
+
+session_reaper = SessionReaper(
+    expire_session,
+    idle_timeout=Config.SESSION_IDLE_TIMEOUT,
+    max_lifetime=Config.SESSION_MAX_LIFETIME,
+    disconnect_grace=Config.SESSION_DISCONNECT_GRACE,
+    interval=Config.SESSION_REAPER_INTERVAL,
+    last_event=last_recognition_event
+)
+
+def push_job_update(job, final):
+    """通过会话的 WebSocket 推送任务状态和进度"""
+    session_reaper.touch(job.session_id)
+    translator = active_translators.get(job.session_id)
+    if translator:
+        translator.callback.notify({"status": "job_update", "job": job.to_dict()}, final=final)
+
+def submit_file_job(session_id, file_path, cleanup, stream=None, start_seconds=0.0):
+    """把音频文件加入翻译任务队列，立即返回任务
+
+    stream 为仍在上传中的文件读取器时边上传边翻译，start_seconds 为续传时跳过的已翻译音频秒数
+    """
+    def run(job):
+        translator = active_translators.get(session_id)
+        if translator is None:
+            raise RuntimeError("会话已结束")
+        
+        # 完整的文件先查缓存，全部命中时直接推送缓存结果；会话中的识别结果可能混入麦克风、浏览器音频或
+        # 其他任务的音频，也可能经过语音活动检测，因此只读取缓存，不写入
+        if result_cache is not None and stream is None:
+            cached = result_cache.lookup(
+                hash_file(file_path), translator.source_language, translator.target_languages, MODE_PLAIN
+            )
+            if cached is not None:
+                translator.replay_results(cached, prefix=f"cache-{job.job_id[:8]}")
+                return {"cached": True, "sentences": len(cached["transcriptions"])}
+        
+        success = translator.process_audio_file(
+            file_path,
+            pacing=Config.FILE_PACING,
+            speed=Config.FILE_SPEEDUP,
+            progress=job.report_progress,
+            cancel_event=job.cancel_event,
+            stream=stream,
+            start_seconds=start_seconds
+        )
+        if stream is not None and stream.stalled:
+            # 已到达的部分已经翻译，任务结束以释放工作线程，上传文件保留到续传
+            raise UploadStalled(
+                f"上传超过 {Config.UPLOAD_STALL_TIMEOUT:g} 秒没有进展，已翻译前 {job.sent_seconds:.1f} 秒，续传后继续"
+            )
+        if not success:
+            raise RuntimeError("处理音频文件失败")
+        return translator.last_file_stats
+    
+    job = file_jobs.submit(session_id, run, cleanup=cleanup, on_update=push_job_update)
+    session_registry.register(job.job_id, worker, session_id=session_id)
+    return job
+
+# 进行中的分块上传：upload_id -> (UploadAssembly, Job)
+active_uploads = {}
+# 因停滞而结束了翻译任务、保留文件等待续传的上传ID
+suspended_uploads = set()
+uploads_lock = threading.Lock()
+
+def queue_upload_job(upload_id, session_id, assembly, start_seconds=0.0):
+    """排队边上传边翻译的任务，调用方需持有 uploads_lock
+
+    上传超过 UPLOAD_STALL_TIMEOUT 秒没有进展时，任务翻译完已到达的部分后结束，不再占用工作线程；
+    组装文件和分块记录保留 UPLOAD_RESUME_TTL 秒，期间续传的分块到达后由 resume_upload 从已翻译到的位置继续
+    """
+    reader = assembly.open_reader(stall_timeout=Config.UPLOAD_STALL_TIMEOUT)
+    
+    def cleanup():
+        reader.close()
+        if reader.stalled and not assembly.aborted:
+            with uploads_lock:
+                suspended_uploads.add(upload_id)
+            print(f"上传停滞，保留文件 {Config.UPLOAD_RESUME_TTL:g} 秒等待续传: {upload_id}")
+            timer = threading.Timer(Config.UPLOAD_RESUME_TTL, expire_upload, args=(upload_id, assembly))
+            timer.daemon = True
+            timer.start()
+        else:
+            discard_upload(upload_id, assembly)
+    
+    # file_path 使用组装文件的路径，扩展名用于判断格式
+    try:
+        job = submit_file_job(session_id, assembly.path, cleanup=cleanup, stream=reader, start_seconds=start_seconds)
+    except JobQueueFull:
+        reader.close()
+        raise
+    active_uploads[upload_id] = (assembly, job)
+    return job
+
+def resume_upload(upload_id):
+    """停滞的上传有新分块到达时，从上一个任务已翻译到的位置排队新的任务；队列已满时抛出 JobQueueFull"""
+    with uploads_lock:
+        entry = active_uploads.get(upload_id)
+        if entry is None or upload_id not in suspended_uploads:
+            return
+        assembly, job = entry
+        queue_upload_job(upload_id, job.session_id, assembly, start_seconds=job.sent_seconds)
+        suspended_uploads.discard(upload_id)
+    print(f"上传已续传，从第 {job.sent_seconds:.1f} 秒继续翻译: {upload_id}")
+
+def discard_upload(upload_id, assembly):
+    """删除上传的组装文件及分块记录，并移除上传记录"""
+    assembly.remove()
+    with uploads_lock:
+        entry = active_uploads.get(upload_id)
+        if entry is not None and entry[0] is assembly:
+            del active_uploads[upload_id]
+            suspended_uploads.discard(upload_id)
+
+def expire_upload(upload_id, assembly):
+    """停滞的上传超过 UPLOAD_RESUME_TTL 秒没有续传时删除其文件"""
+    with uploads_lock:
+        entry = active_uploads.get(upload_id)
+        if entry is None or entry[0] is not assembly or upload_id not in suspended_uploads:
+            return
+        if time.time() - assembly.updated_at < Config.UPLOAD_RESUME_TTL:
+            return
+    print(f"上传超过 {Config.UPLOAD_RESUME_TTL:g} 秒没有续传，删除文件: {upload_id}")
+    discard_upload(upload_id, assembly)
+
+def remove_file(file_path):
+    try:
+        os.remove(file_path)
+        print(f"文件已删除: {file_path}")
+    except Exception as e:
+        print(f"删除文件失败: {file_path}, 错误: {e}")
 
 # WebSocket 服务器
 async def websocket_handler(websocket, path):
-    # 从路径中提取会话ID
-    session_id = path.split('/')[-1]
-    print(f"WebSocket 连接: {session_id}")
+    # 从路径中提取会话ID，并协商结果消息协议；帧编码由握手时的子协议决定（默认 JSON）
+    session_id, protocol, max_rate = negotiate(path, Config.PARTIAL_MAX_RATE)
+    last_seq = parse_last_seq(path)
+    codec = codec_for(getattr(websocket, 'subprotocol', None))
+    print(f"WebSocket 连接: {session_id}, 协议: {protocol}, 编码: {codec.name}")
     
     if session_id not in active_translators:
         await websocket.close(1008, "无效的会话ID")
         return
     
-    # 存储 WebSocket 连接
+    # 存储 WebSocket 连接，并挂载会话发送队列
+    outbox = OutboundQueue(
+        asyncio.get_running_loop(),
+        maxsize=Config.OUTBOUND_QUEUE_SIZE,
+        policy=Config.OUTBOUND_OVERFLOW_POLICY
+    )
+    if protocol == PROTOCOL_DELTA:
+        sender = outbox.drain_to(
+            websocket,
+            encoder=DeltaEncoder(Config.DELTA_SNAPSHOT_INTERVAL),
+            coalescer=PartialCoalescer(max_rate),
+            codec=codec
+        )
+    else:
+        sender = outbox.drain_to(websocket, codec=codec)
+    sender_task = asyncio.create_task(sender)
+    callback = active_translators[session_id].callback
     active_websockets[session_id] = websocket
-    active_translators[session_id].callback.websocket = websocket
+    session_reaper.connected(session_id)
     
     try:
-        # 发送连接成功消息
-        await websocket.send(json.dumps({"status": "connected"}))
+        # 发送连接成功消息；重连的客户端带 last_seq，先补发断线期间的消息
+        replayed = callback.attach(
+            websocket, outbox, {"status": "connected", "protocol": protocol, "encoding": codec.name}, last_seq
+        )
+        if replayed:
+            print(f"WebSocket 重连: {session_id}, 补发 {replayed} 条消息")
         
         # 保持连接直到客户端断开
         async for message in websocket:
+            session_reaper.touch(session_id)
+            metrics.WEBSOCKET_MESSAGES.inc(labels=("in",))
+            metrics.WEBSOCKET_BYTES.inc(len(message), ("in",))
+            # 二进制帧为浏览器上行的 PCM 音频，只写入缓冲区，不阻塞事件循环
+            if isinstance(message, bytes):
+                translator = active_translators.get(session_id)
+                if translator:
+                    translator.feed_audio(message)
+                continue
+            
             # 处理来自客户端的消息
             try:
                 data = json.loads(message)
                 print(f"收到客户端消息: {data}")
                 
-                # 处理暂停/恢复命令
+                # 处理暂停/恢复命令；停止识别器会等待其线程结束，放到线程池执行，不阻塞事件循环
+                translator = active_translators.get(session_id)
+                loop = asyncio.get_running_loop()
+                if translator is None:
+                    continue
                 if data.get('command') == 'pause':
-                    active_translators[session_id].pause()
-                    await websocket.send(json.dumps({"status": "paused"}))
+                    await loop.run_in_executor(None, translator.pause)
+                    outbox.put({"status": "paused"}, final=True)
                 elif data.get('command') == 'resume':
-                    active_translators[session_id].resume()
-                    await websocket.send(json.dumps({"status": "resumed"}))
+                    await loop.run_in_executor(None, translator.resume)
+                    outbox.put({"status": "resumed"}, final=True)
                 elif data.get('command') == 'stop':
-                    active_translators[session_id].stop()
-                    await websocket.send(json.dumps({"status": "stopped"}))
+                    await loop.run_in_executor(None, translator.stop)
+                    outbox.put({"status": "stopped"}, final=True)
             except json.JSONDecodeError:
                 print(f"无效的 JSON 消息: {message}")
-    except websockets.exceptions.ConnectionClosed:
+    except websockets.ConnectionClosed:
         print(f"WebSocket 连接关闭: {session_id}")
     finally:
         # 清理连接
-        if session_id in active_websockets:
+        if active_websockets.get(session_id) is websocket:
             del active_websockets[session_id]
-        if session_id in active_translators:
-            active_translators[session_id].callback.websocket = None
+            session_reaper.disconnected(session_id)
+        callback.detach(outbox)
+        outbox.close()
+        sender_task.cancel()
+
+async def listener_handler(websocket, path):
+    """听众连接 /ws/listen/<listen_id>?channels=en,source：只接收所选频道的结果，不能控制会话
+
+    结果由会话的 Broadcaster 按频道编码一次后放入每个听众自己的有界队列。
+    """
+    listen_id, channels = parse_listen_path(path)
+    session_id = listen_sessions.get(listen_id)
+    translator = active_translators.get(session_id) if session_id else None
+    if translator is None or translator.callback.broadcast is None:
+        await websocket.close(1008, "无效的收听ID")
+        return
+    available = [CHANNEL_SOURCE] + list(translator.target_languages)
+    unknown = [channel for channel in channels if channel not in available]
+    if unknown:
+        await websocket.close(1008, f"未知的频道: {','.join(unknown)}")
+        return
+    channels = channels or available
+    
+    codec = codec_for(getattr(websocket, 'subprotocol', None))
+    broadcast = translator.callback.broadcast
+    outbox = broadcast.create_outbox(asyncio.get_running_loop())
+    outbox.put(codec.encode({
+        "status": "connected", "protocol": PROTOCOL_FULL, "encoding": codec.name, "channels": channels
+    }), final=True)
+    try:
+        subscriber = broadcast.subscribe(outbox, channels, codec)
+    except ListenerRejected as e:
+        await websocket.close(1013, str(e))
+        return
+    print(f"听众连接: {session_id}, 频道: {channels}, 编码: {codec.name}, 听众数: {len(broadcast)}")
+    
+    async def discard_incoming():
+        # 听众不发送命令，只用于察觉连接断开
+        try:
+            async for _ in websocket:
+                pass
+        except websockets.ConnectionClosed:
+            pass
+    
+    sender_task = asyncio.create_task(outbox.drain_to(websocket, codec=ENCODED))
+    receiver_task = asyncio.create_task(discard_incoming())
+    try:
+        await asyncio.wait({sender_task, receiver_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        broadcast.unsubscribe(subscriber)
+        sender_task.cancel()
+        receiver_task.cancel()
+    if subscriber.evicted:
+        await websocket.close(1008, "接收过慢，连接已断开")
+    else:
+        await websocket.close()
+
+async def websocket_router(websocket, path):
+    """独立 WebSocket 服务器的路由：/ws/listen/<listen_id> 为听众连接，其余为会话连接"""
+    if parse_listen_path(path) is not None:
+        await listener_handler(websocket, path)
+    else:
+        await websocket_handler(websocket, path)
+
+# 独立 WebSocket 服务器的端口；由 server.py 与 HTTP 共用端口时为 None
+websocket_port = Config.WEBSOCKET_PORT
+
+def websocket_url(session_id, prefix="/ws/"):
+    """客户端连接会话 WebSocket 的地址"""
+    if websocket_port is None:
+        scheme = 'wss' if request.scheme == 'https' else 'ws'
+        return f"{scheme}://{request.host}{prefix}{session_id}"
+    
+    # 获取主机名
+    host = request.host.split(':')[0]
+    # 如果是本地开发环境，使用 localhost
+    if host == '0.0.0.0' or host == '127.0.0.1':
+        host = 'localhost'
+    return f"ws://{host}:{websocket_port}{prefix}{session_id}"
 
-# 启动 WebSocket 服务器
+# 启动独立的 WebSocket 服务器（python app.py 时使用）
 def start_websocket_server():
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    start_server = websockets.serve(websocket_handler, "0.0.0.0", 8765)
+    start_server = websockets.serve(
+        websocket_router, "0.0.0.0", websocket_port, subprotocols=subprotocols() or None
+    )
     loop.run_until_complete(start_server)
-    print("WebSocket 服务器已启动在 ws://0.0.0.0:8765")
+    print(f"WebSocket 服务器已启动在 ws://0.0.0.0:{websocket_port}")
     loop.run_forever()
 
-# 在单独的线程中启动 WebSocket 服务器
-import threading
-websocket_thread = threading.Thread(target=start_websocket_server, daemon=True)
-websocket_thread.start()
-
 @app.route('/')
 def index():
     # 从配置中获取支持的语言列表
@@ -101,8 +526,19 @@ def save_api_key():
     
     return jsonify({"success": True})
 
+def vad_options():
+    """语音活动检测参数"""
+    return {
+        "threshold_db": Config.VAD_THRESHOLD_DB,
+        "hangover_ms": Config.VAD_HANGOVER_MS,
+        "preroll_ms": Config.VAD_PREROLL_MS,
+        "silence_mode": Config.VAD_SILENCE_MODE,
+        "keepalive_interval": Config.VAD_KEEPALIVE_INTERVAL
+    }
+
 @app.route('/api/start_translation', methods=['POST'])
 def start_translation():
+    session_id = None
     try:
         data = request.get_json()
         if not data:
@@ -130,45 +566,74 @@ def start_translation():
             return jsonify({"success": False, "message": "请至少选择一种目标语言"}), 400
             
         use_microphone = data.get('use_microphone', False)
+        # 音频来源为 browser 时，音频由浏览器通过 WebSocket 二进制帧上传
+        use_browser_audio = data.get('audio_source') == 'browser'
         
-        print(f"开始翻译: 源语言={source_language}, 目标语言={target_languages}, 使用麦克风={use_microphone}")
+        print(f"开始翻译: 源语言={source_language}, 目标语言={target_languages}, 使用麦克风={use_microphone}, 浏览器音频={use_browser_audio}")
+        
+        # 并发会话数达到上限时排队或直接拒绝
+        try:
+            admission.admit(api_key)
+        except AdmissionRejected as e:
+            print(f"拒绝翻译请求: {e}")
+            return admission_rejected(e)
         
         # 创建会话ID
         session_id = str(uuid.uuid4())
         
-        # 创建翻译器实例
+        # 创建并存储翻译器实例，准入名额随会话一起释放
         translator = Translator(api_key)
-        translator.set_use_microphone(use_microphone)
-        
-        # 存储翻译器实例
         active_translators[session_id] = translator
+        translator.set_use_microphone(use_microphone and not use_browser_audio)
+        translator.configure_microphone(Config.MIC_FRAME_MS, Config.MIC_BUFFER_SECONDS, Config.MIC_DEVICE_INDEX)
+        
+        # 语音活动检测：请求中的 vad 参数优先于配置
+        if data.get('vad', Config.VAD_ENABLED):
+            translator.enable_vad(**vad_options())
+        
+        if Config.SESSION_RECORD_DIR:
+            os.makedirs(Config.SESSION_RECORD_DIR, exist_ok=True)
+            translator.record_path = os.path.join(Config.SESSION_RECORD_DIR, f"{session_id}.rec")
+        if Config.TRANSCRIPT_DIR:
+            os.makedirs(Config.TRANSCRIPT_DIR, exist_ok=True)
+            translator.transcript_path = transcript_path(session_id)
         
         # 启动翻译
-        success = translator.start(source_language, target_languages)
+        success = translator.start(source_language, target_languages, pool=recognizer_pool)
+        if success:
+            translator.enable_replay(Config.REPLAY_BUFFER_MESSAGES, Config.REPLAY_BUFFER_BYTES)
+        if success and use_browser_audio:
+            translator.enable_audio_uplink(
+                buffer_seconds=Config.UPLINK_BUFFER_SECONDS,
+                frame_ms=Config.UPLINK_FRAME_MS
+            )
         
         if success:
-            # 获取主机名
-            host = request.host.split(':')[0]
-            # 如果是本地开发环境，使用 localhost
-            if host == '0.0.0.0' or host == '127.0.0.1':
-                host = 'localhost'
-            
-            ws_url = f"ws://{host}:8765/ws/{session_id}"
+            session_registry.register(session_id, worker)
+            session_reaper.track(session_id)
+            listen_id = open_broadcast(session_id, translator)
+            ws_url = websocket_url(session_id)
             print(f"生成 WebSocket URL: {ws_url}")
             return jsonify({
                 "success": True, 
                 "session_id": session_id,
-                "websocket_url": ws_url
+                "websocket_url": ws_url,
+                "listen_id": listen_id,
+                "listen_url": websocket_url(listen_id, prefix="/ws/listen/"),
+                "metrics_id": translator.metrics_id,
+                "transcript": translator.transcript is not None,
+                "start_kind": translator.start_kind
             })
         else:
-            if session_id in active_translators:
-                del active_translators[session_id]
+            release_session(session_id)
             print("错误: 启动翻译失败")
             return jsonify({"success": False, "message": "启动翻译失败"}), 500
     except Exception as e:
         print(f"处理翻译请求时出错: {str(e)}")
         import traceback
         traceback.print_exc()
+        if session_id is not None:
+            release_session(session_id)
         return jsonify({"success": False, "message": f"服务器错误: {str(e)}"}), 500
 
 @app.route('/api/pause_translation', methods=['POST'])
@@ -177,8 +642,9 @@ def pause_translation():
     session_id = data.get('session_id', '')
     
     if not session_id or session_id not in active_translators:
-        return jsonify({"success": False, "message": "无效的会话ID"}), 400
+        return forward_to_owner(session_id) or (jsonify({"success": False, "message": "无效的会话ID"}), 400)
     
+    session_reaper.touch(session_id)
     success = active_translators[session_id].pause()
     return jsonify({"success": success})
 
@@ -188,8 +654,9 @@ def resume_translation():
     session_id = data.get('session_id', '')
     
     if not session_id or session_id not in active_translators:
-        return jsonify({"success": False, "message": "无效的会话ID"}), 400
+        return forward_to_owner(session_id) or (jsonify({"success": False, "message": "无效的会话ID"}), 400)
     
+    session_reaper.touch(session_id)
     success = active_translators[session_id].resume()
     return jsonify({"success": success})
 
@@ -209,22 +676,26 @@ def stop_translation():
         
         # 检查会话是否存在
         if session_id not in active_translators:
+            forwarded = forward_to_owner(session_id)
+            if forwarded is not None:
+                return forwarded
             print(f"警告: 会话ID不存在: {session_id}")
             # 如果会话不存在，也返回成功，因为最终目标是停止翻译
             return jsonify({"success": True, "message": "会话不存在，无需停止"})
         
-        # 停止翻译
+        # 停止翻译；已经停止（如通过 WebSocket 的 stop 命令）时 stop() 返回 False，仍需释放会话
         translator = active_translators[session_id]
-        success = translator.stop()
+        stopped = translator.stop()
+        success = not translator.is_running
         
         # 清理资源
         if success:
-            print(f"成功停止会话: {session_id}")
-            del active_translators[session_id]
+            print(f"成功停止会话: {session_id}" if stopped else f"会话已停止，释放资源: {session_id}")
+            release_session(session_id)
         else:
             print(f"停止会话失败: {session_id}")
         
-        return jsonify({"success": success})
+        return jsonify({"success": success, "vad": translator.vad_stats.to_dict() if translator.vad_options else None})
     except Exception as e:
         print(f"处理停止翻译请求时出错: {str(e)}")
         import traceback
@@ -233,6 +704,16 @@ def stop_translation():
 
 @app.route('/upload_audio', methods=['POST'])
 def upload_audio():
+    # 会话ID放在查询参数中时，不属于本进程的上传可以不经解析直接流式转发给持有会话的 worker
+    session_id = request.args.get('session_id')
+    if session_id and session_id not in active_translators:
+        forwarded = forward_to_owner(session_id, stream=True)
+        if forwarded is not None:
+            return forwarded
+    elif not session_id and session_registry.shared:
+        # 会话ID只在表单中时，先缓存请求体，解析表单后仍可转发
+        request.get_data()
+    
     if 'audio_file' not in request.files:
         print("错误: 没有上传文件")
         return jsonify({"success": False, "message": "没有上传文件"}), 400
@@ -242,10 +723,15 @@ def upload_audio():
         print("错误: 未选择文件")
         return jsonify({"success": False, "message": "未选择文件"}), 400
         
-    session_id = request.form.get('session_id')
+    session_id = session_id or request.form.get('session_id')
+    if session_id and session_id not in active_translators:
+        forwarded = forward_to_owner(session_id)
+        if forwarded is not None:
+            return forwarded
     if not session_id or session_id not in active_translators:
         print(f"错误: 无效的会话ID: {session_id}")
         return jsonify({"success": False, "message": "无效的会话ID"}), 400
+    session_reaper.touch(session_id)
     
     # 检查文件类型
     allowed_extensions = {'wav', 'mp3', 'ogg', 'flac', 'aac', 'pcm'}
@@ -260,18 +746,226 @@ def upload_audio():
     
     print(f"文件已保存: {file_path}")
     
-    # 处理文件
-    translator = active_translators[session_id]
-    success = translator.process_audio_file(file_path)
-    
-    # 处理完成后删除文件
+    # 加入任务队列，处理完成后删除文件
     try:
-        os.remove(file_path)
-        print(f"文件已删除: {file_path}")
-    except Exception as e:
-        print(f"删除文件失败: {file_path}, 错误: {e}")
+        job = submit_file_job(session_id, file_path, cleanup=lambda: remove_file(file_path))
+    except JobQueueFull as e:
+        remove_file(file_path)
+        return jsonify({"success": False, "message": str(e)}), 503
         
-    return jsonify({"success": success})
+    return jsonify({"success": True, "job_id": job.job_id, "status": job.status})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = file_jobs.get(job_id)
+    if job is None:
+        return forward_to_owner(job_id) or (jsonify({"success": False, "message": "任务不存在"}), 404)
+    return jsonify({"success": True, "job": job.to_dict()})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if file_jobs.get(job_id) is None:
+        return forward_to_owner(job_id) or (jsonify({"success": False, "message": "任务不存在"}), 404)
+    success = file_jobs.cancel(job_id)
+    # 正在等待分块的任务无法自行察觉取消，中止上传使其读取立即结束；停滞等待续传的上传直接删除
+    for upload_id, (assembly, job) in list(active_uploads.items()):
+        if job.job_id == job_id:
+            if upload_id in suspended_uploads:
+                discard_upload(upload_id, assembly)
+                success = True
+            else:
+                assembly.abort()
+    return jsonify({"success": success, "job": file_jobs.get(job_id).to_dict()})
+
+@app.route('/api/vad_stats/<session_id>', methods=['GET'])
+def get_vad_stats(session_id):
+    translator = active_translators.get(session_id)
+    if translator is None:
+        return forward_to_owner(session_id) or (jsonify({"success": False, "message": "无效的会话ID"}), 404)
+    return jsonify({
+        "success": True,
+        "enabled": translator.vad_options is not None,
+        "vad": translator.vad_stats.to_dict()
+    })
+
+@app.route('/api/listeners/<session_id>', methods=['GET'])
+def get_listeners(session_id):
+    """会话的听众数、各频道订阅数及广播的丢弃、断开统计"""
+    translator = active_translators.get(session_id)
+    if translator is None:
+        return forward_to_owner(session_id) or (jsonify({"success": False, "message": "无效的会话ID"}), 404)
+    broadcast = translator.callback.broadcast
+    return jsonify({
+        "success": True,
+        "listen_id": translator.listen_id,
+        "broadcast": broadcast.stats() if broadcast is not None else None
+    })
+
+def transcript_path(session_id):
+    """会话转写记录的文件路径；会话ID不是 UUID 时返回 None，避免拼出目录外的路径"""
+    try:
+        session_id = str(uuid.UUID(session_id))
+    except ValueError:
+        return None
+    return os.path.join(Config.TRANSCRIPT_DIR, f"{session_id}.jsonl")
+
+def open_transcript(session_id):
+    """进行中的会话返回其转写记录，已结束的会话从磁盘只读打开，没有记录时返回 None"""
+    translator = active_translators.get(session_id)
+    if translator is not None and translator.transcript is not None:
+        return translator.transcript
+    path = transcript_path(session_id) if Config.TRANSCRIPT_DIR else None
+    if path is None or not os.path.exists(path):
+        return None
+    return TranscriptStore(path, tail_size=0, readonly=True)
+
+# 转写记录的清理间隔（秒）
+TRANSCRIPT_CLEANUP_INTERVAL = 3600
+
+def start_transcript_cleanup():
+    """在后台线程中定期删除超过保留时长的转写记录，进行中的会话的记录不删除"""
+    def cleanup():
+        while True:
+            try:
+                active = {os.path.basename(translator.transcript_path)
+                          for translator in list(active_translators.values()) if translator.transcript_path}
+                removed = remove_expired(Config.TRANSCRIPT_DIR, Config.TRANSCRIPT_RETENTION_HOURS * 3600, keep=active)
+                if removed:
+                    print(f"已清理 {removed} 个过期的转写记录")
+            except Exception as e:
+                print(f"清理转写记录失败: {e}")
+            time.sleep(TRANSCRIPT_CLEANUP_INTERVAL)
+    
+    thread = threading.Thread(target=cleanup, name="transcript-cleanup")
+    thread.daemon = True
+    thread.start()
+    return thread
+
+if Config.TRANSCRIPT_DIR and Config.TRANSCRIPT_RETENTION_HOURS > 0:
+    os.makedirs(Config.TRANSCRIPT_DIR, exist_ok=True)
+    start_transcript_cleanup()
+
+@app.route('/api/transcripts/<session_id>', methods=['GET'])
+def get_transcript(session_id):
+    """分页读取会话的句末结果：?start=N&count=M，不带 start 时返回最近的 count 句"""
+    transcript = open_transcript(session_id)
+    if transcript is None:
+        return forward_to_owner(session_id) or (jsonify({"success": False, "message": "没有该会话的转写记录"}), 404)
+    count = min(request.args.get('count', 100, type=int), 1000)
+    start = request.args.get('start', type=int)
+    if start is None:
+        start = max(len(transcript) - count, 0)
+    sentences, total = transcript.read(start, count)
+    return jsonify({"success": True, "total": total, "start": start, "sentences": sentences})
+
+@app.route('/api/transcripts/<session_id>/export', methods=['GET'])
+def export_transcript_file(session_id):
+    """流式导出会话的转写记录：?format=txt|srt|vtt|json，字幕格式用 language 选择语言（默认源语言）"""
+    format = request.args.get('format', 'txt')
+    if format not in EXPORT_FORMATS:
+        return jsonify({"success": False, "message": f"不支持的导出格式: {format}"}), 400
+    transcript = open_transcript(session_id)
+    if transcript is None:
+        return forward_to_owner(session_id) or (jsonify({"success": False, "message": "没有该会话的转写记录"}), 404)
+    language = request.args.get('language', LANGUAGE_SOURCE)
+    chunks = (chunk.encode('utf-8') for chunk in export_transcript(transcript.entries(), format, language))
+    suffix = f".{language}" if format in ("srt", "vtt") and language != LANGUAGE_SOURCE else ""
+    filename = f"transcript_{session_id}{suffix}.{format}"
+    return Response(chunks, content_type=EXPORT_FORMATS[format], headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "no-cache"
+    })
+
+@app.route('/api/recognizer_pool', methods=['GET'])
+def get_recognizer_pool():
+    """预热连接池状态及冷/热启动的就绪耗时"""
+    if recognizer_pool is None:
+        return jsonify({"success": True, "enabled": False})
+    return jsonify({"success": True, "enabled": True, "pool": recognizer_pool.stats()})
+
+def session_states():
+    counts = {"running": 0, "paused": 0, "stopped": 0}
+    for translator in list(active_translators.values()):
+        if not translator.is_running:
+            counts["stopped"] += 1
+        elif translator.is_paused:
+            counts["paused"] += 1
+        else:
+            counts["running"] += 1
+    return [((state,), count) for state, count in counts.items()]
+
+def session_outboxes():
+    return [(translator.metrics_id, translator.callback.outbox) for translator in list(active_translators.values())
+            if translator.callback.outbox is not None]
+
+def session_latencies(attribute):
+    return lambda: [((("session", translator.metrics_id),), getattr(translator.callback.latency, attribute))
+                    for translator in list(active_translators.values())]
+
+# 抓取时才计算的会话级指标，热路径上只有直方图和计数器的累加
+# 每个会话的指标以 session 标签（Translator.metrics_id 序号）区分，不公开会话ID和收听ID
+session_metrics = [
+    metrics.Gauge("translator_sessions", "按状态统计的活跃会话数", ("state",), collect=session_states),
+    metrics.Gauge("translator_websocket_connections", "已连接的会话 WebSocket 数",
+                  collect=lambda: [((), len(active_websockets))]),
+    metrics.Gauge("translator_listeners", "各会话的听众连接数", ("session",),
+                  collect=lambda: [((translator.metrics_id,), len(translator.callback.broadcast))
+                                   for translator in list(active_translators.values())
+                                   if translator.callback.broadcast is not None]),
+    metrics.Gauge("translator_outbound_queue_depth", "会话发送队列中等待发送的消息数", ("session",),
+                  collect=lambda: [((metrics_id,), outbox.qsize()) for metrics_id, outbox in session_outboxes()]),
+    metrics.Gauge("translator_outbound_dropped", "会话发送队列溢出丢弃的中间结果数", ("session",),
+                  collect=lambda: [((metrics_id,), outbox.dropped) for metrics_id, outbox in session_outboxes()]),
+    metrics.Gauge("translator_capture", "服务器麦克风的采集与发送统计（字节数、帧数及欠载、溢出次数）",
+                  ("session", "kind"),
+                  collect=lambda: [((translator.metrics_id, kind), value)
+                                   for translator in list(active_translators.values())
+                                   for kind, value in (translator.capture_stats() or {}).items()]),
+    metrics.Gauge("translator_capture_device_subscribers", "共享麦克风各输入设备的订阅会话数", ("device",),
+                  collect=lambda: [((str(device["device_index"]) if device["device_index"] is not None else "default",),
+                                    device["subscribers"]) for device in translator_module.capture_hub.stats()]),
+    metrics.HistogramFamily("translator_session_first_partial_seconds", "每个会话的首条中间结果延迟",
+                            session_latencies("first_partial")),
+    metrics.HistogramFamily("translator_session_sentence_end_seconds", "每个会话的句末结果延迟",
+                            session_latencies("sentence_end")),
+]
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 文本格式的延迟、吞吐和会话指标"""
+    body = metrics.render([
+        metrics.FIRST_PARTIAL_SECONDS,
+        metrics.SENTENCE_END_SECONDS,
+        metrics.AUDIO_SECONDS,
+        metrics.RECOGNIZER_EVENTS,
+        metrics.UPSTREAM_ERRORS,
+        metrics.WEBSOCKET_MESSAGES,
+        metrics.WEBSOCKET_BYTES,
+    ] + session_metrics)
+    return Response(body, content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/admission', methods=['GET'])
+def get_admission():
+    """并发会话名额、排队情况及会话回收统计，用于容量规划"""
+    return jsonify({
+        "success": True,
+        "sessions": len(active_translators),
+        "admission": admission.stats(),
+        "reaper": session_reaper.stats(),
+        "file_jobs": file_jobs.stats()
+    })
+
+@app.route('/api/session_registry', methods=['GET'])
+def get_session_registry():
+    """本 worker 的标识及会话登记状态"""
+    return jsonify({"success": True, "worker": worker.to_dict(), "registry": session_registry.stats()})
+
+@app.route('/api/result_cache', methods=['GET'])
+def get_result_cache():
+    """文件翻译结果缓存的命中统计"""
+    if result_cache is None:
+        return jsonify({"success": True, "enabled": False})
+    return jsonify({"success": True, "enabled": True, "cache": result_cache.stats()})
 
 @app.route('/api/languages', methods=['GET'])
 def get_languages():
@@ -290,101 +984,158 @@ def test_session():
     })
 
 # 分块上传处理
-@app.route('/api/upload_chunk', methods=['POST'])
-def upload_chunk():
-    if 'chunk' not in request.files:
-        return jsonify({"success": False, "message": "没有上传分块"}), 400
-        
-    chunk = request.files['chunk']
-    session_id = request.form.get('session_id')
-    filename = request.form.get('filename')
-    chunk_index = int(request.form.get('chunk_index', 0))
-    total_chunks = int(request.form.get('total_chunks', 1))
+# 同一会话内同名、同大小的文件视为同一次上传，客户端中断后可以续传
+def get_upload_id(session_id, filename, file_size):
+    return hashlib.sha1(f"{session_id}:{filename}:{file_size}".encode('utf-8')).hexdigest()[:16]
+
+@app.route('/api/upload_init', methods=['POST'])
+def upload_init():
+    data = request.get_json() or {}
+    session_id = data.get('session_id')
+    filename = secure_filename(data.get('filename', ''))
     
     if not session_id or session_id not in active_translators:
-        return jsonify({"success": False, "message": "无效的会话ID"}), 400
+        return forward_to_owner(session_id) or (jsonify({"success": False, "message": "无效的会话ID"}), 400)
+    session_reaper.touch(session_id)
     
-    # 创建临时目录存储分块
-    chunks_dir = os.path.join(app.config['UPLOAD_FOLDER'], f"chunks_{session_id}")
-    if not os.path.exists(chunks_dir):
-        os.makedirs(chunks_dir)
+    try:
+        file_size = int(data.get('file_size', 0))
+        chunk_size = int(data.get('chunk_size', 5 * 1024 * 1024))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "无效的文件大小或分块大小"}), 400
+    
+    if not filename or file_size <= 0 or file_size > app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({"success": False, "message": "无效的文件名或文件大小"}), 400
+    if chunk_size <= 0 or chunk_size > Config.UPLOAD_MAX_CHUNK_SIZE:
+        return jsonify({"success": False, "message": f"分块大小不能超过 {Config.UPLOAD_MAX_CHUNK_SIZE} 字节"}), 400
     
-    # 保存当前分块
-    chunk_path = os.path.join(chunks_dir, f"{filename}.part{chunk_index}")
-    chunk.save(chunk_path)
+    upload_id = get_upload_id(session_id, filename, file_size)
+    with uploads_lock:
+        entry = active_uploads.get(upload_id)
+        if entry is None:
+            # 预分配目标文件，并立即排队翻译任务：任务边上传边读取已连续到达的前缀
+            path = os.path.join(app.config['UPLOAD_FOLDER'], f"{session_id}_{upload_id}_{filename}")
+            try:
+                assembly = UploadAssembly(path, file_size, chunk_size)
+            except (UploadError, OSError) as e:
+                return jsonify({"success": False, "message": f"创建上传文件失败: {e}"}), 500
+            try:
+                queue_upload_job(upload_id, session_id, assembly)
+            except JobQueueFull as e:
+                assembly.remove()
+                return jsonify({"success": False, "message": str(e)}), 503
+            session_registry.register(upload_id, worker, session_id=session_id)
+        entry = active_uploads[upload_id]
+    
+    assembly, job = entry
+    print(f"分块上传: {upload_id}, 已收到 {len(assembly.received)}/{assembly.total_chunks} 块")
+    return jsonify({"success": True, "upload_id": upload_id, "job_id": job.job_id, **assembly.status()})
+
+@app.route('/api/upload_status/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    entry = active_uploads.get(upload_id)
+    if entry is None:
+        return forward_to_owner(upload_id) or (jsonify({"success": False, "message": "上传不存在或已结束"}), 404)
+    assembly, job = entry
+    return jsonify({
+        "success": True, "upload_id": upload_id, "job_id": job.job_id,
+        "suspended": upload_id in suspended_uploads, **assembly.status()
+    })
+
+@app.route('/api/upload_chunk', methods=['POST', 'PUT'])
+def upload_chunk():
+    # 分块数据可以是请求体本身（推荐，直接流式写入目标偏移），也可以是表单中的 chunk 文件
+    upload_id = request.args.get('upload_id')
+    if upload_id and upload_id not in active_uploads:
+        forwarded = forward_to_owner(upload_id, stream=True)
+        if forwarded is not None:
+            return forwarded
+    elif not upload_id and session_registry.shared:
+        request.get_data()
+    upload_id = upload_id or request.form.get('upload_id')
+    try:
+        chunk_index = int(request.args.get('chunk_index', request.form.get('chunk_index', -1)))
+    except ValueError:
+        return jsonify({"success": False, "message": "无效的分块序号"}), 400
+    
+    entry = active_uploads.get(upload_id)
+    if entry is None:
+        return forward_to_owner(upload_id) or (jsonify({"success": False, "message": "上传不存在或已结束"}), 404)
+    assembly, job = entry
+    session_reaper.touch(job.session_id)
+    
+    stream = request.files['chunk'].stream if 'chunk' in request.files else request.stream
+    try:
+        assembly.write_part(chunk_index, stream)
+    except UploadError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    
+    # 上传曾停滞时，续传的分块到达后继续翻译；任务队列已满时等下一个分块或完成上传时再试
+    try:
+        resume_upload(upload_id)
+    except JobQueueFull as e:
+        print(f"续传的上传暂时无法排队: {upload_id}, {e}")
     
     return jsonify({
         "success": True,
-        "message": f"分块 {chunk_index + 1}/{total_chunks} 上传成功"
+        "received_chunks": len(assembly.received),
+        "total_chunks": assembly.total_chunks,
+        "message": f"分块 {chunk_index + 1}/{assembly.total_chunks} 上传成功"
     })
 
 # 完成分块上传
 @app.route('/api/complete_upload', methods=['POST'])
 def complete_upload():
-    data = request.get_json()
-    session_id = data.get('session_id')
-    filename = data.get('filename')
-    total_chunks = data.get('total_chunks')
-    
-    if not session_id or session_id not in active_translators:
-        return jsonify({"success": False, "message": "无效的会话ID"}), 400
+    data = request.get_json() or {}
+    upload_id = data.get('upload_id')
     
-    # 分块目录
-    chunks_dir = os.path.join(app.config['UPLOAD_FOLDER'], f"chunks_{session_id}")
-    if not os.path.exists(chunks_dir):
-        return jsonify({"success": False, "message": "找不到上传的分块"}), 400
+    entry = active_uploads.get(upload_id)
+    if entry is None:
+        return forward_to_owner(upload_id) or (jsonify({"success": False, "message": "上传不存在或已结束"}), 404)
+    assembly, job = entry
     
-    # 合并文件路径
-    merged_file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{session_id}_{filename}")
+    missing = assembly.missing()
+    if missing:
+        return jsonify({"success": False, "message": f"还有 {len(missing)} 个分块未上传", "missing_chunks": missing}), 400
     
+    # 翻译任务在上传过程中已开始读取，这里只返回任务信息；停滞后续传的上传此时仍未排队时再试一次
     try:
-        # 合并所有分块
-        with open(merged_file_path, 'wb') as merged_file:
-            for i in range(total_chunks):
-                chunk_path = os.path.join(chunks_dir, f"{filename}.part{i}")
-                if os.path.exists(chunk_path):
-                    with open(chunk_path, 'rb') as chunk_file:
-                        merged_file.write(chunk_file.read())
-                else:
-                    return jsonify({"success": False, "message": f"找不到分块 {i}"}), 400
-        
-        # 处理合并后的文件
-        translator = active_translators[session_id]
-        success = translator.process_audio_file(merged_file_path)
-        
-        # 清理临时文件
-        import shutil
-        shutil.rmtree(chunks_dir)
-        os.remove(merged_file_path)
-        
-        return jsonify({"success": success})
-    except Exception as e:
-        print(f"合并文件失败: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({"success": False, "message": f"合并文件失败: {str(e)}"}), 500
+        resume_upload(upload_id)
+    except JobQueueFull as e:
+        return jsonify({"success": False, "message": str(e)}), 503
+    assembly, job = active_uploads.get(upload_id, entry)
+    return jsonify({"success": True, "job_id": job.job_id, "status": job.status})
 
-@app.route('/api/translate_file_sync', methods=['POST'])
-def translate_file_sync():
+def long_file_splitter_options():
+    """长音频模式的静音切分参数"""
+    return {
+        "threshold_db": Config.LONG_FILE_SILENCE_DB,
+        "min_silence": Config.LONG_FILE_MIN_SILENCE,
+        "target_seconds": Config.LONG_FILE_SEGMENT_SECONDS,
+        "max_seconds": Config.LONG_FILE_MAX_SEGMENT_SECONDS
+    }
+
+def parse_file_translation_request():
+    """解析文件翻译请求的表单，返回 (参数, None) 或 (None, 错误响应)"""
     if 'audio_file' not in request.files:
         print("错误: 没有上传文件")
-        return jsonify({"success": False, "message": "没有上传文件"}), 400
+        return None, (jsonify({"success": False, "message": "没有上传文件"}), 400)
         
     file = request.files['audio_file']
     if file.filename == '':
         print("错误: 未选择文件")
-        return jsonify({"success": False, "message": "未选择文件"}), 400
+        return None, (jsonify({"success": False, "message": "未选择文件"}), 400)
     
     # 获取参数
     source_language = request.form.get('source_language', '')
     if not source_language:
         print("错误: 未指定源语言")
-        return jsonify({"success": False, "message": "请指定源语言"}), 400
+        return None, (jsonify({"success": False, "message": "请指定源语言"}), 400)
         
     target_languages = request.form.get('target_languages', '').split(',')
     if not target_languages or target_languages[0] == '':
         print("错误: 未指定目标语言")
-        return jsonify({"success": False, "message": "请至少选择一种目标语言"}), 400
+        return None, (jsonify({"success": False, "message": "请至少选择一种目标语言"}), 400)
     
     # 获取 API Key
     api_key = request.form.get('api_key', '')
@@ -394,48 +1145,181 @@ def translate_file_sync():
         
     if not api_key:
         print("错误: 未设置 API Key")
-        return jsonify({"success": False, "message": "未设置 API Key"}), 400
+        return None, (jsonify({"success": False, "message": "未设置 API Key"}), 400)
     
-    # 保存文件
+    # 保存文件，文件名唯一，避免同名文件的并发请求互相覆盖
     filename = secure_filename(file.filename)
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"sync_{filename}")
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"sync_{uuid.uuid4().hex}_{filename}")
     file.save(file_path)
-    
     print(f"文件已保存: {file_path}")
     
+    return {
+        "file_path": file_path,
+        "source_language": source_language,
+        "target_languages": target_languages,
+        "api_key": api_key
+    }, None
+
+@app.route('/api/translate_file_sync', methods=['POST'])
+def translate_file_sync():
+    params, error = parse_file_translation_request()
+    if error:
+        return error
+    file_path = params["file_path"]
+    source_language = params["source_language"]
+    target_languages = params["target_languages"]
+    # 非目标格式的上传转换后的识别器输入
+    converted_path = file_path + ".16k.wav"
+    
+    try:
+        admission.admit(params["api_key"])
+    except AdmissionRejected as e:
+        remove_file(file_path)
+        return admission_rejected(e)
+    
     try:
         # 创建翻译器实例
-        translator = Translator(api_key)
+        translator = Translator(params["api_key"])
         
-        # 调用同步翻译方法
-        result = translator.call_sync(
-            file_path=file_path,
-            source_language=source_language,
-            target_languages=target_languages,
-            format="wav",  # 根据文件类型调整
-            sample_rate=16000
-        )
+        # mode=long 强制使用长音频模式，mode=auto（默认）时超过 LONG_FILE_MIN_SECONDS 自动启用
+        mode = request.form.get('mode', 'auto')
+        if mode == 'auto':
+            duration = probe_duration(file_path)
+            use_long = duration is not None and duration >= Config.LONG_FILE_MIN_SECONDS
+        else:
+            use_long = mode == 'long'
         
-        # 处理完成后删除文件
-        try:
-            os.remove(file_path)
-            print(f"文件已删除: {file_path}")
-        except Exception as e:
-            print(f"删除文件失败: {file_path}, 错误: {e}")
+        # 客户端可以调低并发数，但每个请求只占一个准入名额，不能超过配置的上限
+        concurrency = request.form.get('concurrency', Config.LONG_FILE_CONCURRENCY, type=int)
+        concurrency = min(max(concurrency, 1), Config.LONG_FILE_CONCURRENCY)
+        
+        def fetch(languages):
+            if use_long:
+                # 长音频：在静音处切分，多个识别会话并发翻译
+                return translator.call_sync_long(
+                    file_path=file_path,
+                    source_language=source_language,
+                    target_languages=languages,
+                    concurrency=concurrency,
+                    splitter_options=long_file_splitter_options()
+                )
+            # 按上传内容判断格式，非 16kHz 单声道 WAV/PCM 先转换
+            input_path, input_format = prepare_recognizer_input(file_path, converted_path)
+            # 调用同步翻译方法
+            return translator.call_sync(
+                file_path=input_path,
+                source_language=source_language,
+                target_languages=languages,
+                format=input_format,
+                sample_rate=16000
+            )
+        
+        if result_cache is not None:
+            # 按音频内容查缓存，只向上游请求缺失的语言
+            audio_hash = hash_file(file_path)
+            result = result_cache.translate(
+                audio_hash, source_language, target_languages, fetch, MODE_LONG if use_long else MODE_PLAIN
+            )
+        else:
+            result = fetch(target_languages)
         
         return jsonify(result)
     except Exception as e:
         print(f"同步翻译失败: {e}")
         import traceback
         traceback.print_exc()
-        
-        # 尝试删除文件
+        return jsonify({"success": False, "message": f"同步翻译失败: {str(e)}"}), 500
+    finally:
+        admission.release(params["api_key"])
+        # 处理完成后删除文件
+        remove_file(file_path)
+        if os.path.exists(converted_path):
+            remove_file(converted_path)
+
+@app.route('/api/translate_file_stream', methods=['POST'])
+def translate_file_stream():
+    """流式翻译文件：识别完成一句就返回一句
+    
+    默认返回 NDJSON（每行一个 JSON 对象）；表单参数 stream=sse 或请求头 Accept: text/event-stream 时返回 Server-Sent Events
+    """
+    params, error = parse_file_translation_request()
+    if error:
+        return error
+    file_path = params["file_path"]
+    source_language = params["source_language"]
+    target_languages = params["target_languages"]
+    use_sse = request.form.get('stream') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
+    
+    try:
+        admission.admit(params["api_key"])
+    except AdmissionRejected as e:
+        remove_file(file_path)
+        return admission_rejected(e)
+    
+    def encode(event):
+        data = json.dumps(event, ensure_ascii=False)
+        if use_sse:
+            return f"event: {event['type']}\ndata: {data}\n\n"
+        return data + "\n"
+    
+    def generate():
         try:
-            os.remove(file_path)
-        except:
-            pass
+            audio_hash = hash_file(file_path) if result_cache is not None else None
+            cached = result_cache.lookup(audio_hash, source_language, target_languages, MODE_PLAIN) if audio_hash else None
+            if cached is not None:
+                # 缓存全部命中：直接逐句返回
+                for i, text in enumerate(cached["transcriptions"]):
+                    yield encode({
+                        "type": "sentence",
+                        "sentence_id": i,
+                        "transcription": text,
+                        "translations": {
+                            lang: texts[i] for lang, texts in cached["translations"].items() if i < len(texts)
+                        },
+                        "cached": True
+                    })
+                yield encode({"type": "done", "request_id": None, "sentences": len(cached["transcriptions"]), "cached": True})
+                return
             
-        return jsonify({"success": False, "message": f"同步翻译失败: {str(e)}"}), 500
+            translator = Translator(params["api_key"])
+            transcriptions = []
+            translations = {lang: [] for lang in target_languages}
+            timestamps = []
+            # 有句子缺少识别文本或某种语言的译文时不写入缓存，避免以后命中不完整的结果
+            complete = True
+            for event in translator.translate_file_stream(file_path, source_language, target_languages):
+                if event["type"] == "sentence":
+                    complete = complete and event["transcription"] is not None and \
+                        all(lang in event["translations"] for lang in target_languages)
+                    transcriptions.append(event["transcription"])
+                    timestamps.append({"begin_time": event["begin_time"], "end_time": event["end_time"]})
+                    for lang in target_languages:
+                        translations[lang].append(event["translations"].get(lang))
+                elif event["type"] == "done" and audio_hash and not complete:
+                    print(f"流式翻译结果不完整，不写入缓存: {file_path}")
+                elif event["type"] == "done" and audio_hash:
+                    result_cache.save(audio_hash, source_language, {
+                        "transcriptions": transcriptions,
+                        "translations": translations,
+                        "timestamps": timestamps
+                    }, MODE_PLAIN)
+                yield encode(event)
+        except Exception as e:
+            print(f"流式翻译失败: {e}")
+            import traceback
+            traceback.print_exc()
+            yield encode({"type": "error", "error": str(e)})
+        finally:
+            remove_file(file_path)
+    
+    mimetype = 'text/event-stream' if use_sse else 'application/x-ndjson'
+    response = Response(generate(), mimetype=mimetype, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # 响应结束（包括客户端提前断开）时释放名额
+    response.call_on_close(lambda: admission.release(params["api_key"]))
+    return response
 
 if __name__ == '__main__':
+    # 在单独的线程中启动 WebSocket 服务器
+    websocket_thread = threading.Thread(target=start_websocket_server, daemon=True)
+    websocket_thread.start()
     app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False) 
\ No newline at end of file
@@ -0,0 +1,91 @@
+import threading
+
+
+class AudioRingBuffer:
+    """线程安全的 PCM 环形缓冲区
+
+    写入端（WebSocket 事件循环）永不阻塞：缓冲区满时覆盖最旧的音频并计入溢出；
+    读取端（识别器发送线程）按帧读取，数据不足时等待到超时。
+    这样网络抖动不会卡住识别器，识别器变慢也不会卡住 WebSocket。
+    """
+
+    def __init__(self, capacity, sample_width=2):
+        # 容量按采样宽度对齐，保证不会截断半个采样
+        self.capacity = capacity - capacity % sample_width
+        self.sample_width = sample_width
+        self._buffer = bytearray(self.capacity)
+        self._start = 0
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # 统计
+        self.written_bytes = 0
+        self.overrun_bytes = 0
+
+    def __len__(self):
+        return self._size
+
+    def write(self, data):
+        """写入音频数据，返回因溢出被丢弃的字节数"""
+        with self._cond:
+            if self._closed:
+                return 0
+
+            data = memoryview(data).cast('B')
+            data = data[:len(data) - len(data) % self.sample_width]
+            self.written_bytes += len(data)
+            dropped = 0
+
+            # 单次写入超过容量时只保留最新部分
+            if len(data) > self.capacity:
+                dropped += len(data) - self.capacity
+                data = data[-self.capacity:]
+
+            overflow = self._size + len(data) - self.capacity
+            if overflow > 0:
+                self._start = (self._start + overflow) % self.capacity
+                self._size -= overflow
+                dropped += overflow
+
+            end = (self._start + self._size) % self.capacity
+            first = min(len(data), self.capacity - end)
+            self._buffer[end:end + first] = data[:first]
+            self._buffer[:len(data) - first] = data[first:]
+            self._size += len(data)
+
+            self.overrun_bytes += dropped
+            self._cond.notify()
+            return dropped
+
+    def read(self, size, timeout=None):
+        """读取最多 size 字节
+
+        数据足够时立即返回；否则等待到超时后返回已有数据（可能为空）。
+        缓冲区关闭且已读空时返回 None。
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._size >= size or self._closed, timeout)
+            if self._closed and self._size == 0:
+                return None
+
+            size = min(size, self._size)
+            size -= size % self.sample_width
+            end = self._start + size
+            if end <= self.capacity:
+                data = bytes(self._buffer[self._start:end])
+            else:
+                data = bytes(self._buffer[self._start:]) + bytes(self._buffer[:end - self.capacity])
+            self._start = end % self.capacity
+            self._size -= size
+            return data
+
+    def clear(self):
+        with self._cond:
+            self._start = 0
+            self._size = 0
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,403 @@
+import os
+import shutil
+import struct
+import subprocess
+import threading
+import wave
+
+import numpy as np
+
+# 识别器所需的音频格式：16kHz 单声道 16 位小端 PCM
+TARGET_SAMPLE_RATE = 16000
+TARGET_SAMPLE_WIDTH = 2
+
+# 每次处理的输入帧数，内存占用与文件长度无关
+BLOCK_FRAMES = 8192
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# 需要借助 ffmpeg 解码的压缩格式
+COMPRESSED_FORMATS = ("mp3", "flac", "ogg", "aac")
+# 按原始 16kHz 单声道 16 位 PCM 处理、不检查文件头的扩展名
+RAW_PCM_EXTENSIONS = ("pcm", "raw")
+
+
+class AudioDecodeError(Exception):
+    """无法解析或解码的音频"""
+
+
+class AudioInfo:
+    """源音频参数"""
+
+    def __init__(self, format, sample_rate, channels, sample_width, float_samples=False, data_bytes=None):
+        self.format = format
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.float_samples = float_samples
+        self.data_bytes = data_bytes
+
+    @property
+    def passthrough(self):
+        """已经是识别器格式，无需解码"""
+        return (self.sample_rate == TARGET_SAMPLE_RATE and self.channels == 1
+                and self.sample_width == TARGET_SAMPLE_WIDTH and not self.float_samples)
+
+    @property
+    def duration(self):
+        """音频时长（秒），未知时为 None"""
+        if not self.data_bytes:
+            return None
+        return self.data_bytes / (self.sample_rate * self.channels * self.sample_width)
+
+    def __repr__(self):
+        return (f"AudioInfo(format={self.format}, sample_rate={self.sample_rate}, channels={self.channels}, "
+                f"sample_width={self.sample_width}, float={self.float_samples}, duration={self.duration})")
+
+
+def sniff_format(header, filename=None):
+    """根据文件头（必要时参考扩展名）判断音频格式
+
+    扩展名为 .pcm / .raw 时直接按原始 PCM 处理：原始采样的字节是任意的，可能恰好像 MPEG/ADTS 的帧同步。
+    """
+    ext = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if ext in RAW_PCM_EXTENSIONS:
+        return "pcm"
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        return "wav"
+    if header[:4] == b'fLaC':
+        return "flac"
+    if header[:4] == b'OggS':
+        return "ogg"
+    if header[:3] == b'ID3':
+        return "mp3"
+    if _is_adts_header(header):
+        return "aac"
+    if _is_mpeg_header(header):
+        return "mp3"
+    if ext in COMPRESSED_FORMATS or ext == "wav":
+        return ext
+    return "pcm"
+
+
+def _is_adts_header(header):
+    """ADTS 帧头：12 位同步字、layer 为 0、采样率序号有效、帧长不小于头长"""
+    if len(header) < 7 or header[0] != 0xFF or header[1] & 0xF6 != 0xF0:
+        return False
+    if (header[2] >> 2) & 0x0F > 12:
+        return False
+    frame_length = ((header[3] & 0x03) << 11) | (header[4] << 3) | (header[5] >> 5)
+    return frame_length >= 7
+
+
+def _is_mpeg_header(header):
+    """MPEG 音频帧头：11 位同步字，版本、层、码率序号和采样率序号均为有效取值"""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return False
+    version = (header[1] >> 3) & 0x03
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    return version != 0x01 and layer != 0x00 and bitrate_index not in (0x00, 0x0F) and sample_rate_index != 0x03
+
+
+class PcmStream:
+    """把任意支持的音频转换为 16kHz 单声道 16 位 PCM 的流式管道
+
+    由生成器串联：容器解析 -> 解码 -> 混音 -> 重采样 -> 量化，每一级只持有一个数据块。
+    已是目标格式的 WAV/PCM 只剥离容器头，直接透传原始字节。
+    """
+
+    def __init__(self, source, filename=None, block_frames=BLOCK_FRAMES):
+        self._owns_file = isinstance(source, (str, bytes, os.PathLike))
+        self._file = open(source, 'rb') if self._owns_file else source
+        self._path = source if self._owns_file else None
+        self._filename = filename or (os.fspath(source) if self._owns_file else None)
+        self.block_frames = block_frames
+        self._process = None
+
+        header = self._peek(12)
+        self.format = sniff_format(header, self._filename)
+
+        if self.format == "wav":
+            self.info, self._data = _parse_wav(self._file, self.format)
+        elif self.format == "pcm":
+            size = os.path.getsize(self._path) if self._path else None
+            self.info = AudioInfo("pcm", TARGET_SAMPLE_RATE, 1, TARGET_SAMPLE_WIDTH, data_bytes=size)
+            self._data = self._file
+        else:
+            self._process = _start_ffmpeg(self._path, self._file)
+            decoded, self._data = _parse_wav(self._process.stdout, self.format)
+            self.info = decoded
+            self.info.data_bytes = None
+
+    @property
+    def passthrough(self):
+        return self.format in ("wav", "pcm") and self.info.passthrough
+
+    def chunks(self, chunk_bytes=3200):
+        """按固定字节数产出 16kHz 单声道 16 位 PCM 数据块（最后一块可能更短）"""
+        pending = bytearray()
+        for block in self._pcm16_blocks():
+            pending += block
+            while len(pending) >= chunk_bytes:
+                yield bytes(pending[:chunk_bytes])
+                del pending[:chunk_bytes]
+        if pending:
+            yield bytes(pending)
+
+    def close(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+        if self._owns_file:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _pcm16_blocks(self):
+        info = self.info
+        frame_bytes = info.channels * info.sample_width
+        raw = _read_blocks(self._data, self.block_frames * frame_bytes, frame_bytes, info.data_bytes)
+        if self.passthrough:
+            return raw
+        samples = _decode(raw, info)
+        samples = _downmix(samples, info.channels)
+        samples = _resample(samples, info.sample_rate, TARGET_SAMPLE_RATE)
+        return _quantize(samples)
+
+    def _peek(self, size):
+        # 读取文件头后回到起始位置；不可回退的流把文件头拼接回去
+        header = self._file.read(size)
+        try:
+            self._file.seek(-len(header), os.SEEK_CUR)
+        except (AttributeError, OSError, ValueError):
+            self._file = _Prepended(header, self._file)
+        return header
+
+
+def prepare_recognizer_input(path, work_path):
+    """按上传内容判断格式，返回可直接交给识别器的 (文件路径, 格式)
+
+    已是 16kHz 单声道 16 位的 WAV/PCM 原样返回；其他格式或参数转换为 work_path 处的 WAV 文件。
+    """
+    with PcmStream(path) as audio:
+        if audio.passthrough:
+            return path, audio.format
+        with wave.open(work_path, 'wb') as writer:
+            writer.setnchannels(1)
+            writer.setsampwidth(TARGET_SAMPLE_WIDTH)
+            writer.setframerate(TARGET_SAMPLE_RATE)
+            for chunk in audio.chunks(64 * 1024):
+                writer.writeframes(chunk)
+    return work_path, "wav"
+
+
+class _Prepended:
+    """把已读取的文件头拼接回不可回退的流"""
+
+    def __init__(self, head, stream):
+        self._head = head
+        self._stream = stream
+
+    def read(self, size=-1):
+        if self._head:
+            if size is None or size < 0:
+                data, self._head = self._head + self._stream.read(), b''
+                return data
+            data, self._head = self._head[:size], self._head[size:]
+            if len(data) < size:
+                data += self._stream.read(size - len(data))
+            return data
+        return self._stream.read(size)
+
+    def close(self):
+        self._stream.close()
+
+
+def _read_exact(stream, size):
+    data = bytearray()
+    while len(data) < size:
+        part = stream.read(size - len(data))
+        if not part:
+            break
+        data += part
+    return bytes(data)
+
+
+def _parse_wav(stream, format):
+    """流式解析 RIFF/WAVE 头，返回 (AudioInfo, 定位到 data 块起点的流)"""
+    header = _read_exact(stream, 12)
+    if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        raise AudioDecodeError("不是有效的 WAV 数据")
+
+    info = None
+    while True:
+        chunk_header = _read_exact(stream, 8)
+        if len(chunk_header) < 8:
+            raise AudioDecodeError("WAV 文件缺少 data 块")
+        chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+
+        if chunk_id == b'fmt ':
+            fmt = _read_exact(stream, chunk_size + (chunk_size & 1))
+            tag, channels, sample_rate, _, _, bits = struct.unpack('<HHIIHH', fmt[:16])
+            if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                tag = struct.unpack('<H', fmt[24:26])[0]
+            if tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+                raise AudioDecodeError(f"不支持的 WAV 编码: 0x{tag:04x}")
+            info = AudioInfo(format, sample_rate, channels, bits // 8, float_samples=tag == WAVE_FORMAT_IEEE_FLOAT)
+        elif chunk_id == b'data':
+            if info is None:
+                raise AudioDecodeError("WAV 文件的 data 块出现在 fmt 块之前")
+            # 流式输出（如 ffmpeg 管道）的长度字段可能是 0 或 0xFFFFFFFF，表示读到结尾
+            info.data_bytes = chunk_size if chunk_size not in (0, 0xFFFFFFFF) else None
+            return info, stream
+        else:
+            # 跳过 LIST 等无关块
+            _read_exact(stream, chunk_size + (chunk_size & 1))
+
+
+def _read_blocks(stream, block_bytes, frame_bytes, limit=None):
+    """按帧对齐读取原始数据块，最多读取 limit 字节"""
+    remaining = limit
+    carry = b''
+    while remaining is None or remaining > 0:
+        size = block_bytes if remaining is None else min(block_bytes, remaining)
+        data = stream.read(size)
+        if not data:
+            break
+        if remaining is not None:
+            remaining -= len(data)
+        data = carry + data
+        usable = len(data) - len(data) % frame_bytes
+        carry = data[usable:]
+        if usable:
+            yield data[:usable]
+
+
+def _decode(blocks, info):
+    """原始字节 -> float32 交错采样（范围 -1..1）"""
+    width = info.sample_width
+    for block in blocks:
+        if info.float_samples:
+            dtype = '<f4' if width == 4 else '<f8'
+            yield np.frombuffer(block, dtype=dtype).astype(np.float32)
+        elif width == 1:
+            yield (np.frombuffer(block, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+        elif width == 2:
+            yield np.frombuffer(block, dtype='<i2').astype(np.float32) / 32768.0
+        elif width == 3:
+            raw = np.frombuffer(block, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+            values = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+            values = np.where(values & 0x800000, values - 0x1000000, values)
+            yield values.astype(np.float32) / 8388608.0
+        elif width == 4:
+            yield np.frombuffer(block, dtype='<i4').astype(np.float32) / 2147483648.0
+        else:
+            raise AudioDecodeError(f"不支持的采样宽度: {width}")
+
+
+def _downmix(blocks, channels):
+    """多声道取平均混为单声道"""
+    for samples in blocks:
+        if channels == 1:
+            yield samples
+        else:
+            yield samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+
+
+def _lowpass_taps(cutoff, num_taps=63):
+    """加窗 sinc 低通滤波器，cutoff 为相对采样率的截止频率（0..0.5）"""
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.blackman(num_taps)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+def _resample(blocks, src_rate, dst_rate):
+    """分块重采样：降采样前先低通抗混叠，再线性插值；块间保留滤波历史和插值相位"""
+    if src_rate == dst_rate:
+        yield from blocks
+        return
+
+    step = src_rate / dst_rate
+    taps = _lowpass_taps(0.45 / step) if step > 1 else None
+    history = np.zeros(len(taps) - 1, dtype=np.float32) if taps is not None else None
+
+    # position 为下一个输出采样相对于 buffer 起点的位置
+    buffer = np.zeros(0, dtype=np.float32)
+    position = 0.0
+    for samples in blocks:
+        if taps is not None:
+            extended = np.concatenate((history, samples))
+            samples = np.convolve(extended, taps, mode='valid').astype(np.float32)
+            history = extended[-(len(taps) - 1):]
+
+        buffer = np.concatenate((buffer, samples))
+        if len(buffer) < 2:
+            continue
+
+        count = int(np.floor((len(buffer) - 1 - position) / step)) + 1
+        if count <= 0:
+            continue
+        positions = position + np.arange(count) * step
+        index = positions.astype(np.int64)
+        frac = (positions - index).astype(np.float32)
+        yield buffer[index] * (1 - frac) + buffer[np.minimum(index + 1, len(buffer) - 1)] * frac
+
+        # 丢弃已用完的样本，保留插值所需的最后一个样本
+        next_position = position + count * step
+        consumed = min(int(next_position), len(buffer) - 1)
+        buffer = buffer[consumed:]
+        position = next_position - consumed
+
+
+def _quantize(blocks):
+    """float32 -> 16 位小端 PCM 字节"""
+    for samples in blocks:
+        yield (np.clip(samples, -1.0, 1.0) * 32767.0).astype('<i2').tobytes()
+
+
+def _start_ffmpeg(path, stream):
+    """用 ffmpeg 把压缩格式流式解码为 WAV（保持原始采样率和声道数，混音和重采样由本模块完成）"""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise AudioDecodeError("解码 MP3/FLAC/OGG/AAC 需要安装 ffmpeg")
+
+    args = [ffmpeg, "-hide_banner", "-loglevel", "error"]
+    args += ["-nostdin", "-i", os.fspath(path)] if path else ["-i", "pipe:0"]
+    args += ["-f", "wav", "-acodec", "pcm_s16le", "pipe:1"]
+    process = subprocess.Popen(
+        args,
+        stdin=subprocess.DEVNULL if path else subprocess.PIPE,
+        stdout=subprocess.PIPE
+    )
+
+    if not path:
+        # 非文件来源（如正在上传的文件）由后台线程写入 ffmpeg 的标准输入
+        def pump():
+            try:
+                while True:
+                    data = stream.read(64 * 1024)
+                    if not data:
+                        break
+                    process.stdin.write(data)
+            except (BrokenPipeError, ValueError):
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        thread = threading.Thread(target=pump)
+        thread.daemon = True
+        thread.start()
+
+    return process
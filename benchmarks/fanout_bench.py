@@ -0,0 +1,272 @@
+"""听众广播的扇出测试：一个会话的结果分发给大量本地听众
+
+在本进程中启动 server.py（假识别器后端）并建立一个会话，由 --client-processes 个客户端子进程
+连接 N 个听众（按 --channels 轮流分配频道），然后以 --rate 条/秒直接调用识别回调产生结果，统计：
+1. 每个听众收到的消息数与应收数，以及从产生结果到听众收到的延迟
+2. 广播的编码次数、入队帧数、每条结果的分发耗时，慢听众的丢弃和断开情况
+3. 服务进程（不含客户端）的 CPU、RSS 和线程数
+
+--slow K 额外连接 K 个只握手、从不读取的听众，用于验证慢听众不会拖慢其他听众。
+
+用法：
+    python benchmarks/fanout_bench.py --listeners 1000 --rate 20 --duration 10
+    python benchmarks/fanout_bench.py --listeners 2000 --encoding msgpack --slow 20 --output fanout.json
+"""
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import resource
+import socket
+import sys
+import threading
+import time
+import urllib.request
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RECOGNIZER_BACKEND", "fake")
+os.environ.setdefault("RECOGNIZER_POOL_ENABLED", "false")
+os.environ["SESSION_RECORD_DIR"] = ""
+
+from protocol import SUBPROTOCOL_MSGPACK  # noqa: E402
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 服务端模块只在主进程中导入，客户端子进程（spawn）不加载整个应用
+
+
+class _Translation:
+    def __init__(self, translations):
+        self._translations = translations
+
+    def get_language_list(self):
+        return list(self._translations)
+
+    def get_translation(self, lang):
+        return self._translations.get(lang)
+
+
+def make_event(sequence, source_language, target_languages, sentence_length):
+    """第 sequence 条结果，文本以序号和产生时的单调时钟开头，供听众计算延迟"""
+    sentence_id = sequence // sentence_length
+    is_end = sequence % sentence_length == sentence_length - 1
+    stamp = f"{sequence} {time.monotonic():.6f}"
+
+    def sentence(language):
+        return SimpleNamespace(
+            sentence_id=sentence_id, text=f"{stamp} {language} " + "x" * 40,
+            begin_time=None, end_time=None, is_sentence_end=is_end, stash=None
+        )
+    translation = _Translation({lang: sentence(lang) for lang in target_languages})
+    return sentence(source_language), translation
+
+
+def publish(callback, args, targets):
+    interval = 1.0 / args.rate
+    start = time.monotonic()
+    for sequence in range(int(args.rate * args.duration)):
+        due = start + sequence * interval
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        transcription, translation = make_event(sequence, args.source_language, targets, args.sentence_length)
+        callback.on_event(f"fanout-{sequence}", transcription, translation, None)
+
+
+def open_slow_listener(url):
+    """只完成握手、从不读取的听众；接收缓冲区很小，服务端很快会积压"""
+    parts = urlsplit(url)
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.connect((parts.hostname, parts.port))
+    key = base64.b64encode(os.urandom(16)).decode()
+    sock.sendall((
+        f"GET {parts.path}?{parts.query} HTTP/1.1\r\nHost: {parts.netloc}\r\nUpgrade: websocket\r\n"
+        f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+    ).encode())
+    return sock
+
+
+async def listen(listen_url, channels, encoding, expected, deadline_seconds, ready):
+    """在客户端子进程中连接一组听众并接收到 expected 条或超时，返回统计"""
+    connector = aiohttp.TCPConnector(limit=0)
+    protocols = (SUBPROTOCOL_MSGPACK,) if encoding == "msgpack" else ()
+    async with aiohttp.ClientSession(connector=connector) as client:
+        gate = asyncio.Semaphore(100)
+        listeners = []
+        connect_times = []
+
+        async def connect(channel):
+            async with gate:
+                begin = time.perf_counter()
+                ws = await client.ws_connect(f"{listen_url}?channels={channel}", protocols=protocols, heartbeat=None)
+                await ws.receive(timeout=30)
+                connect_times.append(time.perf_counter() - begin)
+            listeners.append({"ws": ws, "received": 0, "latency": []})
+
+        await asyncio.gather(*(connect(channel) for channel in channels))
+        ready.put(len(listeners))
+
+        async def receive(listener):
+            async for msg in listener["ws"]:
+                now = time.monotonic()
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    data = json.loads(msg.data)
+                    part = data.get("transcription") or next(iter(data.get("translations", {}).values()), None)
+                    text = part and part["text"]
+                elif msg.type == aiohttp.WSMsgType.BINARY:
+                    data = msgpack.unpackb(msg.data, strict_map_key=False)
+                    part = data.get(2) or next(iter(data.get(3, {}).values()), None)
+                    text = part and part[5]
+                else:
+                    continue
+                if not text:
+                    continue
+                listener["received"] += 1
+                listener["latency"].append(now - float(text.split(" ", 2)[1]))
+                if listener["received"] >= expected:
+                    return
+
+        receivers = [asyncio.create_task(receive(listener)) for listener in listeners]
+        await asyncio.wait(receivers, timeout=deadline_seconds)
+        for task in receivers:
+            task.cancel()
+        await asyncio.gather(*(listener["ws"].close() for listener in listeners))
+        return {
+            "connect": connect_times,
+            "received": [listener["received"] for listener in listeners],
+            "latency": [value for listener in listeners for value in listener["latency"]]
+        }
+
+
+def client_process(listen_url, channels, encoding, expected, deadline_seconds, ready, results):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    results.put(asyncio.run(listen(listen_url, channels, encoding, expected, deadline_seconds, ready)))
+
+
+def process_cpu():
+    times = os.times()
+    return times.user + times.system
+
+
+def post_json(url, body):
+    request = urllib.request.Request(url, json.dumps(body).encode(), {"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def run(http_base, args):
+    import app as flask_app
+    from server_bench import percentiles, rss_mb
+
+    started = post_json(f"{http_base}/api/start_translation", {
+        "api_key": "fanout",
+        "source_language": args.source_language,
+        "target_languages": args.target_languages.split(","),
+        "audio_source": "browser"
+    })
+    session_id, listen_url = started["session_id"], started["listen_url"]
+    translator = flask_app.active_translators[session_id]
+    channels = args.channels.split(",")
+    assigned = [channels[i % len(channels)] for i in range(args.listeners)]
+    expected = int(args.rate * args.duration)
+
+    context = multiprocessing.get_context("spawn")
+    ready, results = context.Queue(), context.Queue()
+    deadline_seconds = args.duration + args.drain_seconds + 5
+    processes = [
+        context.Process(target=client_process, args=(
+            listen_url, assigned[i::args.client_processes], args.encoding, expected, deadline_seconds, ready, results
+        ), daemon=True)
+        for i in range(args.client_processes)
+    ]
+    begin = time.monotonic()
+    for process in processes:
+        process.start()
+    connected = sum(ready.get(timeout=120) for _ in processes)
+    connect_wall = time.monotonic() - begin
+    slow = [open_slow_listener(f"{listen_url}?channels={channels[0]}") for _ in range(args.slow)]
+    time.sleep(0.5)
+
+    cpu_before, wall_before = process_cpu(), time.monotonic()
+    publish(translator.callback, args, translator.target_languages)
+    collected = [results.get(timeout=deadline_seconds + 30) for _ in processes]
+    wall, cpu = time.monotonic() - wall_before, process_cpu() - cpu_before
+    broadcast = translator.callback.broadcast.stats()
+    threads, rss = threading.active_count(), rss_mb()
+
+    post_json(f"{http_base}/api/stop_translation", {"session_id": session_id})
+    for sock in slow:
+        sock.close()
+    for process in processes:
+        process.join(timeout=10)
+
+    received = [count for result in collected for count in result["received"]]
+    return {
+        "listeners": args.listeners,
+        "connected": connected,
+        "slow_listeners": args.slow,
+        "client_processes": args.client_processes,
+        "encoding": args.encoding,
+        "channels": channels,
+        "rate": args.rate,
+        "events": expected,
+        "connect_wall_seconds": round(connect_wall, 3),
+        "connect_ms": percentiles([value for result in collected for value in result["connect"]]),
+        "complete_listeners": sum(1 for count in received if count >= expected),
+        "messages_received": sum(received),
+        "messages_expected": expected * args.listeners,
+        "delivery_ms": percentiles([value for result in collected for value in result["latency"]]),
+        "broadcast": broadcast,
+        "server_cpu_percent": round(cpu / wall * 100, 1),
+        "threads": threads,
+        "rss_mb": rss
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listeners", type=int, default=1000)
+    parser.add_argument("--slow", type=int, default=0, help="从不读取的慢听众数")
+    parser.add_argument("--rate", type=float, default=20, help="每秒产生的结果数")
+    parser.add_argument("--duration", type=float, default=10, help="产生结果的时长（秒）")
+    parser.add_argument("--sentence-length", type=int, default=10, help="每句的结果数（最后一条为句末结果）")
+    parser.add_argument("--source-language", default="zh")
+    parser.add_argument("--target-languages", default="en,ja,ko", help="会话的目标语言，逗号分隔")
+    parser.add_argument("--channels", default="en,ja,ko,source", help="听众轮流订阅的频道，逗号分隔")
+    parser.add_argument("--encoding", choices=("json", "msgpack"), default="json")
+    parser.add_argument("--client-processes", type=int, default=4, help="运行听众的客户端子进程数")
+    parser.add_argument("--drain-seconds", type=float, default=5, help="产生结束后等待听众收完的时间")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5058)
+    parser.add_argument("--output", help="结果 JSON 文件，默认输出到标准输出")
+    args = parser.parse_args()
+    if args.encoding == "msgpack" and msgpack is None:
+        parser.error("--encoding msgpack 需要安装 msgpack")
+
+    # 每个听众占用客户端和服务端各一个文件描述符
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    from server_bench import start_unified
+    http_base, _ = start_unified(args.host, args.port)
+    result = run(http_base, args)
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
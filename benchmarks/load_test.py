@@ -0,0 +1,364 @@
+"""多会话负载测试：在假识别器后端上逐级增加并发会话数，找出满足延迟目标的最大会话数
+
+默认以 RECOGNIZER_BACKEND=fake 在子进程中启动 server.py（不访问识别服务），每一级：
+1. 通过 /api/start_translation 并发建立 N 个浏览器音频上行会话并连接 /ws/<session_id>
+2. 每个会话按实时节奏（单调时钟时间表）发送合成音频：speech_ms 的语音段与 silence_ms 的静音交替
+3. 统计端到端延迟：首条中间结果从语音段第一帧发出算起，句末结果从语音段最后一帧发出算起
+4. 采样服务进程的 CPU 占用和 RSS
+
+某一级启动失败或连接中断、句末结果缺失超过 5%，或句末延迟 p95 超过 --slo-ms 时停止加压，
+上一级即为可持续的最大会话数。结果（含当前提交）写为 JSON，便于在不同提交之间对比。
+
+用法：
+    python benchmarks/load_test.py --steps 10,50,100,200 --duration 20 --output load.json
+    FAKE_LATENCY_MS=150 python benchmarks/load_test.py --steps 100
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --server-pid 12345 --steps 50
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_RATE = 16000
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def percentiles(values):
+    # 与 server_bench.percentiles 相同；不从 server_bench 导入，以免在客户端进程中加载整个应用
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 2)
+    return {"count": len(ordered), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": pick(1.0)}
+
+
+def synthetic_frames(frame_ms):
+    """一帧语音（带噪声的 220Hz 正弦波，约 -13 dBFS）和一帧静音的 16 位 PCM"""
+    count = SAMPLE_RATE * frame_ms // 1000
+    samples = []
+    for i in range(count):
+        value = 0.3 * math.sin(2 * math.pi * 220 * i / SAMPLE_RATE) + random.uniform(-0.02, 0.02)
+        samples.append(int(value * 32767).to_bytes(2, "little", signed=True))
+    return b"".join(samples), b"\x00" * (count * 2)
+
+
+def process_sample(pid):
+    """服务进程累计 CPU 秒数、RSS（MB）和线程数"""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        rss = threads = None
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith("Threads:"):
+                    threads = int(line.split()[1])
+    except OSError:
+        return None
+    return {"cpu_seconds": (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, "rss_mb": rss, "threads": threads}
+
+
+def start_server(port, log_path):
+    """在子进程中以假识别器后端启动 server.py，FAKE_* 等环境变量原样传入"""
+    env = dict(os.environ)
+    env.setdefault("RECOGNIZER_BACKEND", "fake")
+    env.setdefault("SESSION_RECORD_DIR", "")
+    env["SERVER_HOST"] = "127.0.0.1"
+    env["SERVER_PORT"] = str(port)
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py")], cwd=ROOT, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(http_base, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"服务进程已退出，返回码 {process.returncode}")
+            try:
+                async with client.get(f"{http_base}/api/languages") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("等待服务启动超时")
+
+
+class SessionRun:
+    """一个会话的发送时间表和收到的结果"""
+
+    def __init__(self):
+        self.session_id = None
+        self.start_seconds = None
+        self.segment_starts = []   # 每个语音段第一帧的发出时间
+        self.segment_ends = []     # 每个语音段最后一帧的发出时间
+        self.ended_segments = 0    # 已发出结尾静音帧的语音段数，即应收到的句末结果数
+        self.sentences = {}        # sentence_id -> 语音段序号
+        self.first_partial = []
+        self.sentence_end = []
+        self.send_lag = []
+        self.messages = 0
+        self.error = None
+
+    def on_message(self, data, now):
+        self.messages += 1
+        transcription = data.get("transcription")
+        if not transcription:
+            return
+        sentence_id = transcription["sentence_id"]
+        if sentence_id not in self.sentences:
+            index = self.sentences[sentence_id] = len(self.sentences)
+            if index < len(self.segment_starts):
+                self.first_partial.append(now - self.segment_starts[index])
+        index = self.sentences[sentence_id]
+        if transcription.get("is_sentence_end") and index < len(self.segment_ends):
+            self.sentence_end.append(now - self.segment_ends[index])
+
+
+async def run_session(client, http_base, args, frames, gate, run):
+    speech, silence = frames
+    async with gate:
+        started = time.monotonic()
+        try:
+            async with client.post(f"{http_base}/api/start_translation", json={
+                "api_key": "load-test",
+                "source_language": args.source_language,
+                "target_languages": args.target_languages.split(","),
+                "audio_source": "browser"
+            }) as response:
+                body = await response.json()
+            if not body.get("success"):
+                raise RuntimeError(body.get("message") or body.get("error") or response.status)
+            run.session_id = body["session_id"]
+            ws = await client.ws_connect(body["websocket_url"], heartbeat=None)
+            await ws.receive_json(timeout=30)
+        except Exception as e:
+            run.error = f"启动失败: {e}"
+            return None
+        run.start_seconds = time.monotonic() - started
+
+    async def receive():
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                run.on_message(json.loads(msg.data), time.monotonic())
+        if run.error is None and not sending_done.is_set():
+            run.error = "WebSocket 连接中断"
+
+    sending_done = asyncio.Event()
+    receiver = asyncio.create_task(receive())
+    cycle = (args.speech_ms + args.silence_ms) // args.frame_ms
+    speech_frames = args.speech_ms // args.frame_ms
+    total = args.duration * 1000 // args.frame_ms
+    # 各会话错开起点，避免所有会话在同一时刻发送
+    schedule_start = time.monotonic() + random.uniform(0, args.frame_ms / 1000)
+    try:
+        for i in range(total):
+            due = schedule_start + i * args.frame_ms / 1000
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            is_speech = i % cycle < speech_frames
+            await ws.send_bytes(speech if is_speech else silence)
+            now = time.monotonic()
+            run.send_lag.append(max(now - due, 0.0))
+            if is_speech and i % cycle == 0:
+                run.segment_starts.append(now)
+            elif is_speech and i % cycle == speech_frames - 1:
+                run.segment_ends.append(now)
+            elif i % cycle == speech_frames:
+                run.ended_segments += 1
+        sending_done.set()
+        # 等待最后一句的句末结果
+        deadline = time.monotonic() + args.drain_seconds
+        while len(run.sentence_end) < run.ended_segments and time.monotonic() < deadline and not receiver.done():
+            await asyncio.sleep(0.05)
+    except Exception as e:
+        run.error = run.error or f"发送失败: {e}"
+    finally:
+        sending_done.set()
+        try:
+            async with client.post(f"{http_base}/api/stop_translation", json={"session_id": run.session_id}) as response:
+                await response.read()
+        except aiohttp.ClientError:
+            pass
+        await ws.close()
+        receiver.cancel()
+    return run
+
+
+async def run_step(http_base, args, sessions, frames, server_pid):
+    runs = [SessionRun() for _ in range(sessions)]
+    samples = []
+
+    async def sample_process():
+        while True:
+            sample = process_sample(server_pid)
+            if sample is not None:
+                samples.append(sample)
+            await asyncio.sleep(0.5)
+
+    client_cpu = time.process_time()
+    before = process_sample(server_pid)
+    wall_start = time.monotonic()
+    sampler = asyncio.create_task(sample_process())
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as client:
+        gate = asyncio.Semaphore(args.start_concurrency)
+        await asyncio.gather(*(run_session(client, http_base, args, frames, gate, run) for run in runs))
+    sampler.cancel()
+    wall = time.monotonic() - wall_start
+    after = process_sample(server_pid)
+
+    first_partial = [value for run in runs for value in run.first_partial]
+    sentence_end = [value for run in runs for value in run.sentence_end]
+    send_lag = [value for run in runs for value in run.send_lag]
+    expected = sum(run.ended_segments for run in runs)
+    received = sum(min(len(run.sentence_end), run.ended_segments) for run in runs)
+    errors = [run.error for run in runs if run.error]
+    result = {
+        "sessions": sessions,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "wall_seconds": round(wall, 2),
+        "start_ms": percentiles([run.start_seconds for run in runs if run.start_seconds is not None]),
+        "first_partial_ms": percentiles(first_partial),
+        "sentence_end_ms": percentiles(sentence_end),
+        "sentences_expected": expected,
+        "sentences_received": received,
+        "messages_received": sum(run.messages for run in runs),
+        "client_send_lag_ms": percentiles(send_lag),
+        "client_cpu_percent": round((time.process_time() - client_cpu) / wall * 100, 1),
+        "server": None
+    }
+    if before is not None and after is not None:
+        result["server"] = {
+            "cpu_percent": round((after["cpu_seconds"] - before["cpu_seconds"]) / wall * 100, 1),
+            "rss_mb": after["rss_mb"],
+            "peak_rss_mb": max((sample["rss_mb"] for sample in samples), default=after["rss_mb"]),
+            "peak_threads": max((sample["threads"] for sample in samples), default=after["threads"])
+        }
+    result["sustainable"], result["reason"] = judge(result, args.slo_ms)
+    return result
+
+
+def judge(result, slo_ms):
+    if result["errors"]:
+        return False, f"{result['errors']} 个会话失败"
+    if result["sentences_expected"] and result["sentences_received"] < result["sentences_expected"] * 0.95:
+        return False, f"句末结果缺失: {result['sentences_received']}/{result['sentences_expected']}"
+    p95 = result["sentence_end_ms"].get("p95")
+    if p95 is None:
+        return False, "没有收到句末结果"
+    if p95 > slo_ms:
+        return False, f"句末延迟 p95 {p95} 毫秒超过 {slo_ms} 毫秒"
+    return True, None
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def run_load_test(http_base, args, server_pid, process):
+    await wait_ready(http_base, process)
+    frames = synthetic_frames(args.frame_ms)
+    steps = []
+    for sessions in [int(value) for value in args.steps.split(",")]:
+        print(f"并发会话数 {sessions} ...", file=sys.stderr)
+        result = await run_step(http_base, args, sessions, frames, server_pid)
+        steps.append(result)
+        print(f"  句末延迟 p95={result['sentence_end_ms'].get('p95')} 毫秒, "
+              f"服务 CPU={result['server'] and result['server']['cpu_percent']}%, "
+              f"{'可持续' if result['sustainable'] else '不可持续: ' + result['reason']}", file=sys.stderr)
+        if not result["sustainable"]:
+            break
+        await asyncio.sleep(args.cooldown)
+    sustainable = [step["sessions"] for step in steps if step["sustainable"]]
+    return {
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "settings": {
+            "backend": os.environ.get("RECOGNIZER_BACKEND", "fake") if process is not None else None,
+            "fake": {name: os.environ[name] for name in sorted(os.environ) if name.startswith("FAKE_")},
+            "duration": args.duration,
+            "frame_ms": args.frame_ms,
+            "speech_ms": args.speech_ms,
+            "silence_ms": args.silence_ms,
+            "slo_ms": args.slo_ms,
+            "source_language": args.source_language,
+            "target_languages": args.target_languages
+        },
+        "steps": steps,
+        "max_sustainable_sessions": max(sustainable) if sustainable else 0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", default="10,25,50,100,200", help="逐级的并发会话数，逗号分隔")
+    parser.add_argument("--duration", type=int, default=20, help="每个会话发送的音频时长（秒）")
+    parser.add_argument("--frame-ms", type=int, default=100, help="每帧音频时长（毫秒）")
+    parser.add_argument("--speech-ms", type=int, default=2000, help="每个语音段时长（毫秒）")
+    parser.add_argument("--silence-ms", type=int, default=600, help="语音段之间的静音时长（毫秒）")
+    parser.add_argument("--slo-ms", type=float, default=1500, help="句末延迟 p95 的目标（毫秒）")
+    parser.add_argument("--source-language", default="zh")
+    parser.add_argument("--target-languages", default="en", help="逗号分隔")
+    parser.add_argument("--start-concurrency", type=int, default=50, help="同时进行的会话启动数")
+    parser.add_argument("--drain-seconds", type=float, default=5, help="发送结束后等待句末结果的时间")
+    parser.add_argument("--cooldown", type=float, default=2, help="两级之间的间隔（秒）")
+    parser.add_argument("--port", type=int, default=5057, help="子进程服务的端口")
+    parser.add_argument("--server-log", help="子进程服务的输出文件，默认丢弃")
+    parser.add_argument("--url", help="测试已在运行的服务，不启动子进程")
+    parser.add_argument("--server-pid", type=int, help="配合 --url 采样该进程的 CPU 和内存")
+    parser.add_argument("--output", help="结果 JSON 文件，默认输出到标准输出")
+    args = parser.parse_args()
+    if args.speech_ms % args.frame_ms or args.silence_ms % args.frame_ms or args.silence_ms <= 0:
+        parser.error("--speech-ms 和 --silence-ms 必须是 --frame-ms 的整数倍，且静音不能为 0")
+
+    # 语音段按出现顺序对应识别结果中的句子，假识别器不能在一个语音段内切出两句
+    os.environ.setdefault("FAKE_SENTENCE_MS", str(args.speech_ms + args.frame_ms))
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    process = None
+    if args.url:
+        http_base, server_pid = args.url.rstrip("/"), args.server_pid
+    else:
+        process = start_server(args.port, args.server_log)
+        http_base, server_pid = f"http://127.0.0.1:{args.port}", process.pid
+    try:
+        result = asyncio.run(run_load_test(http_base, args, server_pid, process))
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""用假识别器回放会话录制（SESSION_RECORD_DIR 生成的 .rec 文件），不需要访问识别服务
+
+client 模式（默认）：在本进程中启动 server.py，以浏览器音频上行的方式建立会话，
+按录制时的节奏（--speed 倍速）通过 WebSocket 发送录制的音频，假识别器在收到相应音频后
+按录制时的间隔产出识别事件；统计客户端收到每句首条中间结果和句末结果相对于对应音频发出的延迟。
+
+serve 模式：启动完整的服务（含前端页面），之后在浏览器中开始的每个会话都按录制时间表回放识别结果，
+用于复现前端渲染的时序。
+
+用法：
+    python benchmarks/replay.py recordings/<会话ID>.rec --speed 4 --output replay.json
+    python benchmarks/replay.py recordings/<会话ID>.rec --mode serve --port 5000
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import sys
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RECOGNIZER_POOL_ENABLED", "false")
+os.environ["SESSION_RECORD_DIR"] = ""
+
+import translator  # noqa: E402
+from session_recorder import RECORD_EVENT, ReplayRecognizer, ReplayScript  # noqa: E402
+from server_bench import percentiles, start_unified  # noqa: E402
+
+
+def use_replay_recognizer(script, speed, pace):
+    """让新建的会话使用回放录制的假识别器"""
+    def start_recognizer(callback, source_language, target_languages, format="pcm", sample_rate=16000, api_key=None):
+        recognizer = ReplayRecognizer(script, callback, speed=speed, pace=pace)
+        recognizer.start()
+        return recognizer
+
+    translator.start_recognizer = start_recognizer
+
+
+def expected_sentences(script):
+    """录制中每句话的开头和结尾音频位置（毫秒）"""
+    sentences = {}
+    for _, _, _, kind, payload in script.events:
+        transcription = payload.get("transcription") if kind == RECORD_EVENT else None
+        if not transcription:
+            continue
+        sentence = sentences.setdefault(transcription["sentence_id"], {"begin_ms": None, "end_ms": None})
+        if sentence["begin_ms"] is None:
+            sentence["begin_ms"] = transcription.get("begin_time")
+        if transcription.get("is_sentence_end"):
+            sentence["end_ms"] = transcription.get("end_time")
+    return sentences
+
+
+async def run_client(http_base, script, speed):
+    meta = script.meta
+    sentences = expected_sentences(script)
+    sent_ms = []          # 每帧发出后的累计音频毫秒数
+    sent_times = []       # 对应的发出时间
+    first_partial = {}
+    sentence_end = {}
+    messages = 0
+
+    def sent_at(audio_ms):
+        index = bisect.bisect_left(sent_ms, audio_ms)
+        return sent_times[index] if index < len(sent_ms) else None
+
+    async with aiohttp.ClientSession() as client:
+        async with client.post(f"{http_base}/api/start_translation", json={
+            "api_key": "replay",
+            "source_language": meta.get("source_language", "zh"),
+            "target_languages": meta.get("target_languages", ["en"]),
+            "audio_source": "browser"
+        }) as response:
+            started = await response.json()
+        if not started.get("success"):
+            raise RuntimeError(f"启动会话失败: {started}")
+        ws = await client.ws_connect(started["websocket_url"])
+        await ws.receive_json(timeout=10)
+
+        async def receive():
+            nonlocal messages
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                messages += 1
+                data = json.loads(msg.data)
+                transcription = data.get("transcription")
+                if not transcription:
+                    continue
+                now = time.monotonic()
+                first_partial.setdefault(transcription["sentence_id"], now)
+                if transcription.get("is_sentence_end"):
+                    sentence_end.setdefault(transcription["sentence_id"], now)
+
+        receiver = asyncio.create_task(receive())
+        bytes_per_ms = meta.get("sample_rate", 16000) * 2 / 1000
+        audio_ms = 0.0
+        wall_start = time.monotonic()
+        first_frame = script.frames[0][0] if script.frames else 0.0
+        for timestamp, data in script.frames:
+            delay = wall_start + (timestamp - first_frame) / speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await ws.send_bytes(data)
+            audio_ms += len(data) / bytes_per_ms
+            sent_ms.append(audio_ms)
+            sent_times.append(time.monotonic())
+
+        # 等待剩余的句末结果
+        deadline = time.monotonic() + max(script.duration - (script.frames[-1][0] if script.frames else 0), 0) / speed + 5
+        while len(sentence_end) < sum(1 for s in sentences.values() if s["end_ms"] is not None) \
+                and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        wall_seconds = time.monotonic() - wall_start
+
+        async with client.post(f"{http_base}/api/stop_translation", json={"session_id": started["session_id"]}):
+            pass
+        await ws.close()
+        receiver.cancel()
+
+    first_partial_latency = []
+    sentence_end_latency = []
+    for sentence_id, expected in sentences.items():
+        if sentence_id in first_partial and expected["begin_ms"] is not None:
+            at = sent_at(expected["begin_ms"])
+            if at is not None:
+                first_partial_latency.append(first_partial[sentence_id] - at)
+        if sentence_id in sentence_end and expected["end_ms"] is not None:
+            at = sent_at(expected["end_ms"])
+            if at is not None:
+                sentence_end_latency.append(sentence_end[sentence_id] - at)
+
+    return {
+        "speed": speed,
+        "audio_seconds": round(audio_ms / 1000, 3),
+        "wall_seconds": round(wall_seconds, 3),
+        "sentences_expected": len(sentences),
+        "sentences_completed": len(sentence_end),
+        "messages_received": messages,
+        "first_partial_ms": percentiles(first_partial_latency),
+        "sentence_end_ms": percentiles(sentence_end_latency)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="会话录制文件")
+    parser.add_argument("--index", type=int, default=0, help="文件中第几次录制")
+    parser.add_argument("--mode", choices=("client", "serve"), default="client")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速")
+    parser.add_argument("--pace", choices=("audio", "clock"),
+                        help="事件按收到的音频（audio）还是按录制时间表（clock）产出，默认 client 为 audio，serve 为 clock")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5056)
+    parser.add_argument("--output", help="结果 JSON 文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    script = ReplayScript.load(args.log, args.index)
+    print(f"录制: {len(script.frames)} 帧音频, {len(script.events)} 个事件, 时长 {script.duration:.1f} 秒", file=sys.stderr)
+    pace = args.pace or ("audio" if args.mode == "client" else "clock")
+    use_replay_recognizer(script, args.speed, pace)
+
+    if args.mode == "serve":
+        import server
+        from aiohttp import web
+        print(f"回放服务已启动在 http://{args.host}:{args.port}", file=sys.stderr)
+        web.run_app(server.create_app(), host=args.host, port=args.port, print=None)
+        return
+
+    http_base, _ = start_unified(args.host, args.port)
+    result = asyncio.run(run_client(http_base, script, args.speed))
+    result["pace"] = pace
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""对比独立 WebSocket 线程（python app.py）与单事件循环服务器（python server.py）
+
+在本进程中启动被测服务器，注册若干不连接识别服务的空闲会话，然后：
+1. 并发建立 N 个会话 WebSocket 连接，统计建连耗时和失败数
+2. 在 N 个空闲连接保持的情况下，统计 REST 接口（/api/languages）的请求延迟
+3. 在部分连接上发送 pause 命令，统计命令往返延迟
+4. 记录进程线程数和内存占用
+
+用法：
+    python benchmarks/server_bench.py --mode unified --connections 2000
+    python benchmarks/server_bench.py --mode legacy --connections 2000 --output legacy.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RECOGNIZER_POOL_ENABLED", "false")
+
+import app as flask_app  # noqa: E402
+from translator import TranslatorCallback  # noqa: E402
+
+
+class IdleSession:
+    """不连接识别服务的会话，只响应控制命令"""
+
+    def __init__(self):
+        self.callback = TranslatorCallback()
+
+    def pause(self):
+        return True
+
+    def resume(self):
+        return True
+
+    def stop(self):
+        return True
+
+    def feed_audio(self, data):
+        return True
+
+
+def start_legacy(host, http_port, ws_port):
+    from werkzeug.serving import make_server
+    flask_app.websocket_port = ws_port
+    threading.Thread(target=flask_app.start_websocket_server, daemon=True).start()
+    http_server = make_server(host, http_port, flask_app.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    return f"http://{host}:{http_port}", f"ws://{host}:{ws_port}"
+
+
+def start_unified(host, port):
+    import server
+    from aiohttp import web
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(server.create_app())
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, host, port).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return f"http://{host}:{port}", f"ws://{host}:{port}"
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 2)
+    return {"count": len(ordered), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": pick(1.0)}
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return None
+
+
+async def run_clients(http_base, ws_base, connections, http_requests, commands, concurrency):
+    session_ids = [f"bench-{i}" for i in range(connections)]
+    for session_id in session_ids:
+        flask_app.active_translators[session_id] = IdleSession()
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as client:
+        gate = asyncio.Semaphore(concurrency)
+        connect_times = []
+        failures = 0
+        sockets = []
+
+        async def connect(session_id):
+            nonlocal failures
+            async with gate:
+                started = time.perf_counter()
+                try:
+                    ws = await client.ws_connect(f"{ws_base}/ws/{session_id}", heartbeat=None)
+                    await ws.receive_json(timeout=30)
+                except Exception:
+                    failures += 1
+                    return
+                connect_times.append(time.perf_counter() - started)
+                sockets.append(ws)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connect(session_id) for session_id in session_ids))
+        connect_wall = time.perf_counter() - started
+
+        http_times = []
+        for _ in range(http_requests):
+            started = time.perf_counter()
+            async with client.get(f"{http_base}/api/languages") as response:
+                await response.read()
+            http_times.append(time.perf_counter() - started)
+
+        command_times = []
+        for ws in sockets[:commands]:
+            started = time.perf_counter()
+            await ws.send_str(json.dumps({"command": "pause"}))
+            await ws.receive_json(timeout=30)
+            command_times.append(time.perf_counter() - started)
+
+        result = {
+            "connections": connections,
+            "connected": len(sockets),
+            "connect_failures": failures,
+            "connect_wall_seconds": round(connect_wall, 3),
+            "connect_ms": percentiles(connect_times),
+            "http_ms": percentiles(http_times),
+            "command_ms": percentiles(command_times),
+            "threads": threading.active_count(),
+            "rss_mb": rss_mb()
+        }
+        await asyncio.gather(*(ws.close() for ws in sockets))
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("legacy", "unified"), default="unified")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--ws-port", type=int, default=8795, help="legacy 模式下独立 WebSocket 服务器的端口")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--http-requests", type=int, default=200)
+    parser.add_argument("--commands", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=200, help="同时进行的建连数")
+    parser.add_argument("--output", help="结果 JSON 文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    # 每个连接占用客户端和服务端各一个文件描述符
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    if args.mode == "legacy":
+        http_base, ws_base = start_legacy(args.host, args.port, args.ws_port)
+    else:
+        http_base, ws_base = start_unified(args.host, args.port)
+    time.sleep(0.5)
+
+    result = asyncio.run(run_clients(
+        http_base, ws_base, args.connections, args.http_requests, args.commands, args.concurrency
+    ))
+    result["mode"] = args.mode
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
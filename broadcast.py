@@ -0,0 +1,193 @@
+import threading
+import time
+
+from outbound import OVERFLOW_DROP_OLDEST, OutboundQueue
+
+# 听众可订阅的频道：source 为源语言识别文本，其余为目标语言代码
+CHANNEL_SOURCE = "source"
+# 转发给听众的会话状态；任务进度等可能含会话ID的状态消息不转发
+LISTENER_STATUSES = ("complete", "error", "expired")
+
+
+class ListenerRejected(Exception):
+    """会话已结束或听众数已达上限"""
+
+
+class _Encoded:
+    """发送已编码好的帧，不再序列化"""
+
+    name = "encoded"
+
+    def encode(self, data):
+        return data
+
+
+ENCODED = _Encoded()
+
+
+def channel_message(message, channel):
+    """从完整结果中取出一个频道的消息，该频道在本条结果中没有内容时返回 None"""
+    if channel == CHANNEL_SOURCE:
+        part = message.get("transcription")
+        if not part:
+            return None
+        view = {"transcription": part}
+    else:
+        part = (message.get("translations") or {}).get(channel)
+        if part is None:
+            return None
+        view = {"translations": {channel: part}}
+    view["request_id"] = message.get("request_id")
+    view["channel"] = channel
+    view["is_sentence_end"] = bool(part.get("is_sentence_end"))
+    return view
+
+
+def status_message(message):
+    """听众可见的状态消息：只保留 status 和 reason 字段，不在 LISTENER_STATUSES 中的状态返回 None"""
+    status = message.get("status")
+    if status not in LISTENER_STATUSES:
+        return None
+    view = {"status": status}
+    if message.get("reason") is not None:
+        view["reason"] = message["reason"]
+    return view
+
+
+def _wake_all(outboxes):
+    for outbox in outboxes:
+        outbox.wake()
+
+
+class Subscriber:
+    """一个听众连接：订阅的频道、帧编码及自己的有界发送队列"""
+
+    def __init__(self, outbox, channels, codec_name):
+        self.outbox = outbox
+        self.channels = tuple(channels)
+        self.codec_name = codec_name
+        self.evicted = False
+
+
+class Broadcaster:
+    """把一个会话的结果分发给多个听众
+
+    每条结果在每个（频道, 编码）上只构造和序列化一次，编码好的帧放入各听众自己的有界队列，
+    由各连接的发送任务独立发送，慢听众只会丢弃自己队列中的中间结果，不影响其他听众。
+    句末结果不丢弃；某个听众积压超过 evict_after 条时断开该听众。
+    """
+
+    def __init__(self, queue_size=64, max_listeners=0, evict_after=None):
+        self.queue_size = queue_size
+        self.max_listeners = max_listeners
+        self.evict_after = evict_after or queue_size * 2
+        self._subscribers = ()
+        self._codecs = {}
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        self._closed = False
+        self.counters = {"published": 0, "encoded": 0, "frames": 0, "evicted": 0}
+        self.publish_seconds = 0.0
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def create_outbox(self, loop):
+        """听众的有界发送队列，订阅前可先放入连接确认消息"""
+        return OutboundQueue(loop, maxsize=self.queue_size, policy=OVERFLOW_DROP_OLDEST)
+
+    def subscribe(self, outbox, channels, codec):
+        """添加一个听众，返回 Subscriber；codec 为该连接协商出的编码"""
+        with self._lock:
+            if self._closed:
+                raise ListenerRejected("会话已结束")
+            if self.max_listeners and len(self._subscribers) >= self.max_listeners:
+                raise ListenerRejected(f"听众数已达上限 {self.max_listeners}")
+            self._codecs.setdefault(codec.name, codec)
+            subscriber = Subscriber(outbox, channels, codec.name)
+            # 发布线程无锁遍历快照，订阅变化时整体替换
+            self._subscribers = self._subscribers + (subscriber,)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not subscriber)
+        subscriber.outbox.close()
+
+    def publish(self, message, final=False):
+        """在识别回调线程中调用：按频道拆分、编码一次后放入各听众的队列
+
+        状态消息只转发 LISTENER_STATUSES 中的状态，且只保留 status 和 reason 字段。
+        """
+        subscribers = self._subscribers
+        if not subscribers:
+            return
+        is_status = "status" in message
+        if is_status:
+            # 听众只能收到结果和会话结束类状态，不能拿到可用于控制会话的信息
+            message = status_message(message)
+            if message is None:
+                return
+        started = time.perf_counter()
+        evicted = []
+        woken = {}
+        with self._publish_lock:
+            frames = {}
+            for subscriber in subscribers:
+                if subscriber.evicted:
+                    continue
+                channels = (None,) if is_status else subscriber.channels
+                for channel in channels:
+                    key = (channel, subscriber.codec_name)
+                    if key not in frames:
+                        view = message if is_status else channel_message(message, channel)
+                        frames[key] = None if view is None else (
+                            self._codecs[subscriber.codec_name].encode(view),
+                            final if is_status else view["is_sentence_end"]
+                        )
+                    frame = frames[key]
+                    if frame is None:
+                        continue
+                    if subscriber.outbox.put(frame[0], final=frame[1], notify=False):
+                        woken.setdefault(subscriber.outbox.loop, []).append(subscriber.outbox)
+                    self.counters["frames"] += 1
+                if subscriber.outbox.qsize() > self.evict_after:
+                    subscriber.evicted = True
+                    evicted.append(subscriber)
+            self.counters["published"] += 1
+            self.counters["encoded"] += sum(1 for frame in frames.values() if frame is not None)
+            self.counters["evicted"] += len(evicted)
+            # 每个事件循环只做一次跨线程调度，在循环中唤醒所有收到消息的听众
+            for loop, outboxes in woken.items():
+                try:
+                    loop.call_soon_threadsafe(_wake_all, outboxes)
+                except RuntimeError:
+                    pass
+            self.publish_seconds += time.perf_counter() - started
+        for subscriber in evicted:
+            print("听众积压过多，断开连接")
+            subscriber.outbox.abort()
+
+    def close(self):
+        """会话结束：关闭所有听众的队列，发送任务发完剩余消息后结束连接"""
+        with self._lock:
+            self._closed = True
+            subscribers, self._subscribers = self._subscribers, ()
+        for subscriber in subscribers:
+            subscriber.outbox.close()
+
+    def stats(self):
+        subscribers = self._subscribers
+        channels = {}
+        for subscriber in subscribers:
+            for channel in subscriber.channels:
+                channels[channel] = channels.get(channel, 0) + 1
+        published = self.counters["published"]
+        return {
+            "listeners": len(subscribers),
+            "channels": channels,
+            "queued": sum(subscriber.outbox.qsize() for subscriber in subscribers),
+            "dropped": sum(subscriber.outbox.dropped for subscriber in subscribers),
+            "counters": dict(self.counters),
+            "publish_us": round(self.publish_seconds / published * 1e6, 1) if published else None
+        }
@@ -0,0 +1,273 @@
+import threading
+import time
+from collections import deque
+
+
+class SharedBlockQueue:
+    """单生产者、单消费者的无锁音频块队列
+
+    生产者（采集回调线程）把 PortAudio 交来的只读 bytes 块按引用放入队列，同一个块由所有订阅者共享，
+    分发时不复制；消费者（发送线程）按帧长取出，帧与块对齐时直接返回原块，否则拼帧时复制一次。
+    写入、读出的字节数各只由一个线程累加，deque 的 append / popleft 是原子操作，因此不需要加锁，
+    回调线程永远不会等待发送线程。排队的字节数将超过 capacity 时丢弃新到达的块并计入 overrun_bytes。
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._blocks = deque()
+        self._offset = 0   # 队首块中已读出的字节数，只由消费者修改
+        self._written = 0
+        self._read = 0
+        self.overrun_bytes = 0
+
+    def __len__(self):
+        return self._written - self._read
+
+    @property
+    def written_bytes(self):
+        return self._written
+
+    def write(self, block):
+        """生产者：按引用放入一个只读块，返回因队列满被丢弃的字节数"""
+        if self._written - self._read + len(block) > self.capacity:
+            self.overrun_bytes += len(block)
+            return len(block)
+        # 块入队后再发布写入字节数，消费者不会看到尚未入队的数据
+        self._blocks.append(block)
+        self._written += len(block)
+        return 0
+
+    def read(self, size):
+        """消费者：已有至少 size 字节时读出 size 字节，否则返回 None"""
+        if self._written - self._read < size:
+            return None
+        head = self._blocks[0]
+        if self._offset == 0 and len(head) == size:
+            self._blocks.popleft()
+            self._read += size
+            return head
+        parts = []
+        remaining = size
+        while remaining:
+            head = self._blocks[0]
+            part = memoryview(head)[self._offset:self._offset + remaining]
+            parts.append(part)
+            remaining -= len(part)
+            self._offset += len(part)
+            if self._offset == len(head):
+                self._blocks.popleft()
+                self._offset = 0
+        self._read += size
+        return b"".join(parts)
+
+    def skip(self):
+        """消费者：丢弃当前已排队的全部音频，返回丢弃的字节数"""
+        skipped = self._written - self._read
+        remaining = skipped + self._offset
+        while remaining > 0:
+            remaining -= len(self._blocks.popleft())
+        self._offset = 0
+        self._read += skipped
+        return skipped
+
+
+class CaptureSubscription:
+    """一个会话对共享输入设备的订阅：自己的块队列、暂停标志及丢弃统计
+
+    暂停时采集回调直接丢弃该订阅的音频（计入 discarded_bytes），不影响同一设备上的其他订阅。
+    """
+
+    def __init__(self, device, buffer):
+        self.device = device
+        self.buffer = buffer
+        self.paused = False
+        self.discarded_bytes = 0
+
+    def stats(self):
+        return {
+            "captured_bytes": self.buffer.written_bytes,
+            "overrun_bytes": self.buffer.overrun_bytes,
+            "discarded_bytes": self.discarded_bytes,
+            "device_overflows": self.device.overflows,
+            "device_subscribers": len(self.device.subscriptions)
+        }
+
+
+class CaptureDevice:
+    """一个已打开的输入设备
+
+    PortAudio 在自己的线程中每 block_ms 回调一次，回调把同一个音频块按引用放入每个订阅的队列，
+    不加锁、不复制、不做 I/O。订阅列表是整体替换的元组，回调线程无锁遍历快照。
+    """
+
+    def __init__(self, pyaudio, device_index=None, sample_rate=16000, block_ms=10):
+        self.pyaudio = pyaudio
+        self.device_index = device_index
+        self.sample_rate = sample_rate
+        self.frames_per_buffer = max(int(sample_rate * block_ms / 1000), 1)
+        self.subscriptions = ()
+        self.overflows = 0
+        self._audio = None
+        self._stream = None
+
+    def open(self):
+        self._audio = self.pyaudio.PyAudio()
+        try:
+            self._stream = self._audio.open(
+                format=self.pyaudio.paInt16,
+                channels=1,
+                rate=self.sample_rate,
+                input=True,
+                input_device_index=self.device_index,
+                frames_per_buffer=self.frames_per_buffer,
+                stream_callback=self._on_audio
+            )
+            self._stream.start_stream()
+        except Exception:
+            self._audio.terminate()
+            self._audio = None
+            raise
+
+    def close(self):
+        stream, self._stream = self._stream, None
+        audio, self._audio = self._audio, None
+        if stream is not None:
+            stream.stop_stream()
+            stream.close()
+        if audio is not None:
+            audio.terminate()
+
+    def _on_audio(self, in_data, frame_count, time_info, status):
+        if status & self.pyaudio.paInputOverflow:
+            self.overflows += 1
+        for subscription in self.subscriptions:
+            if subscription.paused:
+                subscription.discarded_bytes += len(in_data)
+            else:
+                subscription.buffer.write(in_data)
+        return None, self.pyaudio.paContinue
+
+
+class CaptureHub:
+    """共享的麦克风采集：每个输入设备只打开一次，按订阅计数
+
+    第一个订阅时打开设备，最后一个订阅退订时关闭；多个会话（如按语言分组的多个会话）共用一个
+    房间麦克风，停止其中一个会话不影响其他会话。pyaudio_module 可替换为测试用的假实现。
+    """
+
+    def __init__(self, pyaudio_module=None, block_ms=10):
+        self._pyaudio = pyaudio_module
+        self.block_ms = block_ms
+        self._devices = {}  # (设备序号, 采样率) -> CaptureDevice
+        self._lock = threading.Lock()
+
+    def subscribe(self, buffer_bytes, device_index=None, sample_rate=16000):
+        """订阅输入设备（device_index 为 None 时使用默认设备），返回 CaptureSubscription；打开设备失败时抛出异常"""
+        key = (device_index, sample_rate)
+        with self._lock:
+            device = self._devices.get(key)
+            if device is None:
+                if self._pyaudio is None:
+                    import pyaudio
+                    self._pyaudio = pyaudio
+                device = CaptureDevice(self._pyaudio, device_index, sample_rate, self.block_ms)
+                device.open()
+                self._devices[key] = device
+                print(f"麦克风已打开: 设备 {'默认' if device_index is None else device_index}, 采样率 {sample_rate}")
+            subscription = CaptureSubscription(device, SharedBlockQueue(buffer_bytes))
+            device.subscriptions = device.subscriptions + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """退订；设备上没有其他订阅时关闭设备"""
+        device = subscription.device
+        with self._lock:
+            if subscription not in device.subscriptions:
+                return
+            device.subscriptions = tuple(s for s in device.subscriptions if s is not subscription)
+            if device.subscriptions:
+                return
+            self._devices.pop((device.device_index, device.sample_rate), None)
+            device.close()
+            print(f"麦克风已关闭: 设备 {'默认' if device.device_index is None else device.device_index}")
+
+    def stats(self):
+        with self._lock:
+            devices = list(self._devices.values())
+        return [{
+            "device_index": device.device_index,
+            "sample_rate": device.sample_rate,
+            "subscribers": len(device.subscriptions),
+            "overflows": device.overflows
+        } for device in devices]
+
+
+class CaptureSender:
+    """按单调时钟节拍从采集缓冲区取出固定长度的帧并发送
+
+    每 frame_ms 醒来一次，发送缓冲区中所有完整的帧（落后时追上，不在帧之间额外休眠）；到点时不足一帧
+    计为一次 underrun。节拍按 time.monotonic() 计算，不随处理耗时漂移，落后超过 max_lag_frames 帧时
+    从当前时刻重新对齐，避免突发补发。暂停期间不计 underrun，恢复时丢弃暂停前残留的音频。
+    """
+
+    def __init__(self, buffer, send, frame_ms=20, sample_rate=16000, max_lag_frames=5, clock=time.monotonic):
+        self.buffer = buffer
+        self.send = send
+        self.frame_ms = frame_ms
+        self.frame_bytes = int(sample_rate * 2 * frame_ms / 1000)
+        self.max_lag_frames = max_lag_frames
+        self.clock = clock
+        self.frames_sent = 0
+        self.underruns = 0
+        self.paused = False
+        self._skip = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="capture-sender")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        # 残留音频由发送线程自己丢弃，保持缓冲区只有一个消费者
+        self._skip = True
+        self.paused = False
+
+    def _run(self):
+        interval = self.frame_ms / 1000
+        due = self.clock() + interval
+        while not self._stop.wait(max(due - self.clock(), 0)):
+            now = self.clock()
+            if now - due > interval * self.max_lag_frames:
+                due = now
+            due += interval
+            if self.paused:
+                continue
+            if self._skip:
+                self._skip = False
+                self.buffer.skip()
+            sent = 0
+            while True:
+                frame = self.buffer.read(self.frame_bytes)
+                if frame is None:
+                    break
+                try:
+                    self.send(frame)
+                except Exception as e:
+                    print(f"发送麦克风音频失败: {e}")
+                sent += 1
+            self.frames_sent += sent
+            if not sent:
+                self.underruns += 1
+
+    def stats(self):
+        return {"frame_ms": self.frame_ms, "frames_sent": self.frames_sent, "underruns": self.underruns}
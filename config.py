@@ -8,6 +8,130 @@ class Config:
     # 阿里云 API 密钥
     API_KEY = os.getenv("ALIYUN_API_KEY", "")
     
+    # WebSocket 会话发送队列长度及溢出策略（drop_oldest / drop_newest）
+    # 句末结果和状态消息永远不会因溢出被丢弃
+    OUTBOUND_QUEUE_SIZE = int(os.getenv("OUTBOUND_QUEUE_SIZE", "256"))
+    OUTBOUND_OVERFLOW_POLICY = os.getenv("OUTBOUND_OVERFLOW_POLICY", "drop_oldest")
+    
+    # 增量协议（protocol=delta）：中间结果默认最大发送频率（Hz）及完整快照间隔
+    PARTIAL_MAX_RATE = float(os.getenv("PARTIAL_MAX_RATE", "10"))
+    DELTA_SNAPSHOT_INTERVAL = int(os.getenv("DELTA_SNAPSHOT_INTERVAL", "20"))
+    
+    # 浏览器音频上行：环形缓冲区时长（秒）及发送到识别器的帧长（毫秒）
+    UPLINK_BUFFER_SECONDS = float(os.getenv("UPLINK_BUFFER_SECONDS", "5"))
+    UPLINK_FRAME_MS = int(os.getenv("UPLINK_FRAME_MS", "100"))
+    
+    # 服务器麦克风：发送给识别器的帧长（20~100 毫秒）、每个会话的采集缓冲区时长（秒）
+    # 及输入设备序号（为空时使用默认设备；同一设备由所有使用麦克风的会话共享）
+    MIC_FRAME_MS = int(os.getenv("MIC_FRAME_MS", "20"))
+    MIC_BUFFER_SECONDS = float(os.getenv("MIC_BUFFER_SECONDS", "2"))
+    MIC_DEVICE_INDEX = int(os.getenv("MIC_DEVICE_INDEX")) if os.getenv("MIC_DEVICE_INDEX") else None
+    
+    # 音频文件发送节奏：realtime / speedup / fastest，以及 speedup 模式的倍速
+    FILE_PACING = os.getenv("FILE_PACING", "speedup")
+    FILE_SPEEDUP = float(os.getenv("FILE_SPEEDUP", "2.0"))
+    
+    # 文件翻译任务队列：工作线程数及最多等待的任务数
+    FILE_JOB_WORKERS = int(os.getenv("FILE_JOB_WORKERS", "2"))
+    FILE_JOB_MAX_PENDING = int(os.getenv("FILE_JOB_MAX_PENDING", "100"))
+    
+    # 分块上传：单个分块大小上限（字节）、上传停滞多久后翻译任务先行结束（秒），
+    # 以及停滞后保留上传文件等待续传的时长（秒）
+    UPLOAD_MAX_CHUNK_SIZE = int(os.getenv("UPLOAD_MAX_CHUNK_SIZE", str(64 * 1024 * 1024)))
+    UPLOAD_STALL_TIMEOUT = float(os.getenv("UPLOAD_STALL_TIMEOUT", "60"))
+    UPLOAD_RESUME_TTL = float(os.getenv("UPLOAD_RESUME_TTL", "3600"))
+    
+    # 长音频模式：在静音处切分后并发翻译
+    # 并发识别会话数、超过多长（秒）自动启用、分段目标/最大时长（秒）、静音判定阈值（dBFS）及最短静音时长（秒）
+    LONG_FILE_CONCURRENCY = int(os.getenv("LONG_FILE_CONCURRENCY", "4"))
+    LONG_FILE_MIN_SECONDS = float(os.getenv("LONG_FILE_MIN_SECONDS", "600"))
+    LONG_FILE_SEGMENT_SECONDS = float(os.getenv("LONG_FILE_SEGMENT_SECONDS", "60"))
+    LONG_FILE_MAX_SEGMENT_SECONDS = float(os.getenv("LONG_FILE_MAX_SEGMENT_SECONDS", "180"))
+    LONG_FILE_SILENCE_DB = float(os.getenv("LONG_FILE_SILENCE_DB", "-40"))
+    LONG_FILE_MIN_SILENCE = float(os.getenv("LONG_FILE_MIN_SILENCE", "0.4"))
+    
+    # 语音活动检测：是否默认启用、能量阈值（dBFS）、语音结束后的拖尾及语音开始前的预录时长（毫秒）
+    # 持续静音的处理方式（keepalive 发送短静音帧保活 / drop 直接丢弃）及保活间隔（秒）
+    VAD_ENABLED = os.getenv("VAD_ENABLED", "false").lower() in ("1", "true", "yes")
+    VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "-45"))
+    VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "400"))
+    VAD_PREROLL_MS = int(os.getenv("VAD_PREROLL_MS", "300"))
+    VAD_SILENCE_MODE = os.getenv("VAD_SILENCE_MODE", "keepalive")
+    VAD_KEEPALIVE_INTERVAL = float(os.getenv("VAD_KEEPALIVE_INTERVAL", "1.0"))
+    
+    # 预热识别器连接池：是否启用、每组最少预热数、池中最多闲置数、闲置超时（秒）、保活间隔（秒）
+    # RECOGNIZER_POOL_KEYS 为使用 API_KEY 固定预热的翻译方向，如 "zh:en;en:zh"；API_KEY 的其他方向在首次使用后按需预热
+    # 预热的连接持续发送保活音频并计入 Key 的用量，默认不启用，且只为服务器配置的 API_KEY 预热，不保留用户的 Key
+    RECOGNIZER_POOL_ENABLED = os.getenv("RECOGNIZER_POOL_ENABLED", "false").lower() in ("1", "true", "yes")
+    RECOGNIZER_POOL_MIN_WARM = int(os.getenv("RECOGNIZER_POOL_MIN_WARM", "1"))
+    RECOGNIZER_POOL_MAX_IDLE = int(os.getenv("RECOGNIZER_POOL_MAX_IDLE", "8"))
+    RECOGNIZER_POOL_IDLE_TIMEOUT = float(os.getenv("RECOGNIZER_POOL_IDLE_TIMEOUT", "300"))
+    RECOGNIZER_POOL_KEEPALIVE_INTERVAL = float(os.getenv("RECOGNIZER_POOL_KEEPALIVE_INTERVAL", "5"))
+    RECOGNIZER_POOL_KEYS = os.getenv("RECOGNIZER_POOL_KEYS", "")
+    
+    # 文件翻译结果缓存：是否启用、磁盘目录（相对于项目目录）、内存层条目数及磁盘层容量（MB）
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "cache")
+    RESULT_CACHE_MEMORY_ENTRIES = int(os.getenv("RESULT_CACHE_MEMORY_ENTRIES", "256"))
+    RESULT_CACHE_DISK_MB = int(os.getenv("RESULT_CACHE_DISK_MB", "1024"))
+    
+    # 服务端口：server.py 在 SERVER_PORT 上同时提供 HTTP 和 WebSocket；python app.py 时 WebSocket 使用 WEBSOCKET_PORT
+    # SERVER_EXECUTOR_WORKERS 为执行 Flask 路由及阻塞调用的线程池大小
+    # SERVER_STREAM_WORKERS 为迭代流式响应体的线程池大小，即可同时进行的流式响应数
+    SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "5000"))
+    WEBSOCKET_PORT = int(os.getenv("WEBSOCKET_PORT", "8765"))
+    SERVER_EXECUTOR_WORKERS = int(os.getenv("SERVER_EXECUTOR_WORKERS", "32"))
+    SERVER_STREAM_WORKERS = int(os.getenv("SERVER_STREAM_WORKERS", "32"))
+    
+    # 多 worker 部署：SESSION_REGISTRY 为 memory（单进程）或 sqlite:///路径（同机多进程共享）
+    # SQLite 路径与 SQLAlchemy 写法一致：sqlite:///sessions.db 为相对路径，sqlite:////var/lib/si/sessions.db 为绝对路径
+    # WORKER_ADDRESS 为其他 worker 转发请求到本进程时使用的内部地址
+    SESSION_REGISTRY = os.getenv("SESSION_REGISTRY", "memory")
+    WORKER_ID = os.getenv("WORKER_ID", "")
+    WORKER_ADDRESS = os.getenv("WORKER_ADDRESS", f"http://127.0.0.1:{SERVER_PORT}")
+    WORKER_HEARTBEAT_INTERVAL = float(os.getenv("WORKER_HEARTBEAT_INTERVAL", "10"))
+    WORKER_TTL = float(os.getenv("WORKER_TTL", "30"))
+    
+    # 会话回收（秒，0 表示不启用）：空闲超时、最长存活时间、WebSocket 断开后等待重连的宽限时间
+    SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "1800"))
+    SESSION_MAX_LIFETIME = float(os.getenv("SESSION_MAX_LIFETIME", "14400"))
+    SESSION_DISCONNECT_GRACE = float(os.getenv("SESSION_DISCONNECT_GRACE", "60"))
+    SESSION_REAPER_INTERVAL = float(os.getenv("SESSION_REAPER_INTERVAL", "5"))
+    
+    # 准入控制：全局及每个 API Key 的并发识别会话上限（0 表示不限制）
+    # 达到上限时最多 ADMISSION_QUEUE_SIZE 个请求排队等待 ADMISSION_QUEUE_TIMEOUT 秒，为 0 时直接返回 503
+    ADMISSION_MAX_SESSIONS = int(os.getenv("ADMISSION_MAX_SESSIONS", "0"))
+    ADMISSION_MAX_SESSIONS_PER_KEY = int(os.getenv("ADMISSION_MAX_SESSIONS_PER_KEY", "0"))
+    ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "0"))
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+    
+    # 会话录制目录：非空时把每个实时会话发送的音频和识别事件写入 <会话ID>.rec，用于离线回放
+    SESSION_RECORD_DIR = os.getenv("SESSION_RECORD_DIR", "")
+    
+    # 转写记录目录：非空时把每个实时会话的句末结果追加写入 <会话ID>.jsonl，供分页读取和导出（默认不记录）
+    # 及记录的保留时长（小时）：超过该时长未更新的记录每小时清理一次，0 表示不清理
+    TRANSCRIPT_DIR = os.getenv("TRANSCRIPT_DIR", "")
+    TRANSCRIPT_RETENTION_HOURS = float(os.getenv("TRANSCRIPT_RETENTION_HOURS", "168"))
+    
+    # 听众广播：每个听众的发送队列长度（慢听众只丢弃自己队列中的中间结果，积压超过两倍时断开）
+    # 及每个会话的听众数上限（0 表示不限制）
+    LISTENER_QUEUE_SIZE = int(os.getenv("LISTENER_QUEUE_SIZE", "64"))
+    LISTENER_MAX_PER_SESSION = int(os.getenv("LISTENER_MAX_PER_SESSION", "0"))
+    
+    # 断线重连补发：每个会话保留最近发给客户端的消息条数及估算字节数上限
+    REPLAY_BUFFER_MESSAGES = int(os.getenv("REPLAY_BUFFER_MESSAGES", "500"))
+    REPLAY_BUFFER_BYTES = int(os.getenv("REPLAY_BUFFER_BYTES", str(1024 * 1024)))
+    
+    # 识别器后端：gummy 为通义 Gummy 实时识别服务，fake 为本地假识别器（压测及离线开发用，不访问识别服务）
+    # fake 后端的中间结果间隔、句子时长、中间结果及句末结果延迟、随机抖动（毫秒）
+    RECOGNIZER_BACKEND = os.getenv("RECOGNIZER_BACKEND", "gummy")
+    FAKE_PARTIAL_INTERVAL_MS = int(os.getenv("FAKE_PARTIAL_INTERVAL_MS", "200"))
+    FAKE_SENTENCE_MS = int(os.getenv("FAKE_SENTENCE_MS", "3000"))
+    FAKE_LATENCY_MS = int(os.getenv("FAKE_LATENCY_MS", "300"))
+    FAKE_FINAL_LATENCY_MS = int(os.getenv("FAKE_FINAL_LATENCY_MS", "500"))
+    FAKE_JITTER_MS = int(os.getenv("FAKE_JITTER_MS", "50"))
+    
     # 支持的语言列表
     SUPPORTED_LANGUAGES = {
         "zh": "中文",
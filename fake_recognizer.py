@@ -0,0 +1,211 @@
+import heapq
+import random
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+
+from audio_decode import PcmStream
+
+# 拼出假识别文本用的词，不在表中的语言使用英文
+_WORDS = {
+    "zh": ("今天", "我们", "讨论", "一下", "实时", "翻译", "系统", "的", "延迟", "和", "吞吐量", "问题"),
+    "yue": ("今日", "我哋", "倾下", "实时", "翻译", "系统", "嘅", "延迟", "同埋", "吞吐量"),
+    "ja": ("今日", "は", "リアルタイム", "翻訳", "システム", "の", "遅延", "と", "スループット", "について"),
+    "ko": ("오늘은", "실시간", "번역", "시스템의", "지연", "시간과", "처리량에", "대해", "이야기합니다"),
+    "en": ("today", "we", "talk", "about", "the", "latency", "and", "throughput", "of", "realtime", "translation")
+}
+# 词之间不加空格的语言
+_NO_SPACE = ("zh", "yue", "ja")
+
+
+def fake_text(language, words):
+    vocabulary = _WORDS.get(language, _WORDS["en"])
+    text = [vocabulary[i % len(vocabulary)] for i in range(words)]
+    return ("" if language in _NO_SPACE else " ").join(text)
+
+
+class _FakeTranslation:
+    """模拟 TranslationResult 的 get_language_list / get_translation"""
+
+    def __init__(self, translations):
+        self._translations = translations
+
+    def get_language_list(self):
+        return list(self._translations)
+
+    def get_translation(self, lang):
+        return self._translations.get(lang)
+
+
+class FakeRecognizer:
+    """本地模拟的实时识别器，构造参数及 start/send_audio_frame/stop/call 与 TranslationRecognizerRealtime 相同
+
+    按收到的音频推进：语音每满 partial_interval_ms 产出一条中间结果，一句满 sentence_ms 或遇到静音
+    （低于 silence_db）时产出句末结果；事件在对应音频收到后经过 latency_ms（句末为 final_latency_ms）
+    及 0~jitter_ms 的随机抖动再回调，按音频顺序送达。静音不产生结果，与识别服务一致。
+    """
+
+    def __init__(self, model=None, format="pcm", sample_rate=16000, source_language="zh",
+                 transcription_enabled=True, translation_enabled=True, translation_target_languages=None,
+                 callback=None, api_key=None, partial_interval_ms=200, sentence_ms=3000,
+                 latency_ms=300, final_latency_ms=500, jitter_ms=50, silence_db=-50.0, **kwargs):
+        self.sample_rate = sample_rate
+        self.source_language = source_language
+        self.transcription_enabled = transcription_enabled
+        self.target_languages = list(translation_target_languages or []) if translation_enabled else []
+        self.callback = callback
+        self.partial_interval_ms = partial_interval_ms
+        self.sentence_ms = sentence_ms
+        self.latency_ms = latency_ms
+        self.final_latency_ms = final_latency_ms
+        self.jitter_ms = jitter_ms
+        self.silence_db = silence_db
+        self.request_id = uuid.uuid4().hex
+        self.bytes_per_ms = sample_rate * 2 / 1000
+
+        self._cond = threading.Condition()
+        self._pending = []          # [(送达时间, 序号, 事件)]
+        self._sequence = 0
+        self._last_due = 0.0
+        self._audio_ms = 0.0
+        self._sentence_id = -1
+        self._sentence_begin = None  # 当前句开头的音频时间，没有进行中的句子时为 None
+        self._partial_ms = 0.0       # 当前句最近一条中间结果对应的音频时间
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="fake-recognizer")
+        self._thread.daemon = True
+        self._thread.start()
+        self.callback.on_open()
+
+    def send_audio_frame(self, data):
+        samples = np.frombuffer(data[:len(data) - len(data) % 2], dtype=np.int16).astype(np.float32) / 32768.0
+        rms = float(np.sqrt(np.mean(samples * samples))) if len(samples) else 0.0
+        speech = 20 * np.log10(max(rms, 1e-10)) > self.silence_db
+        now = time.monotonic()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("识别器已停止")
+            frame_start = self._audio_ms
+            self._audio_ms += len(data) / self.bytes_per_ms
+            if not speech:
+                if self._sentence_begin is not None:
+                    self._finish_sentence(frame_start, now)
+                return
+            if self._sentence_begin is None:
+                self._begin_sentence(frame_start)
+            while self._audio_ms - self._partial_ms >= self.partial_interval_ms:
+                self._partial_ms += self.partial_interval_ms
+                if self._partial_ms - self._sentence_begin >= self.sentence_ms:
+                    self._finish_sentence(self._partial_ms, now)
+                    self._begin_sentence(self._partial_ms)
+                else:
+                    self._schedule(self._partial_ms, False, now)
+
+    def stop(self):
+        """结束进行中的句子，等待已产生的结果送达后回调 on_complete / on_close"""
+        with self._cond:
+            if self._stopped:
+                return
+            if self._sentence_begin is not None:
+                self._finish_sentence(self._audio_ms, time.monotonic())
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=max(self.final_latency_ms, self.latency_ms) / 1000 + self.jitter_ms / 1000 + 5)
+        self.callback.on_complete()
+        self.callback.on_close()
+
+    def call(self, file_path):
+        """同步识别一个文件：按文件时长切成 sentence_ms 长的句子，经过 final_latency_ms 后一次返回"""
+        with PcmStream(file_path) as audio:
+            duration_ms = sum(len(chunk) for chunk in audio.chunks(64 * 1024)) / 32
+        transcriptions, translations = [], []
+        begin = 0.0
+        while begin < duration_ms:
+            end = min(begin + self.sentence_ms, duration_ms)
+            self._sentence_id += 1
+            self._sentence_begin = begin
+            transcription, translation = self._results(self._event(end, True))
+            transcriptions.append(transcription)
+            translations.append(translation)
+            begin = end
+        self._sentence_begin = None
+        time.sleep(self.final_latency_ms / 1000)
+        return SimpleNamespace(
+            request_id=self.request_id,
+            transcription_result_list=transcriptions if self.transcription_enabled else [],
+            translation_result_list=translations if self.target_languages else [],
+            error_message=None
+        )
+
+    def _begin_sentence(self, begin_ms):
+        # 调用方需持有锁
+        self._sentence_id += 1
+        self._sentence_begin = begin_ms
+        self._partial_ms = begin_ms
+
+    def _finish_sentence(self, end_ms, now):
+        # 调用方需持有锁
+        self._schedule(end_ms, True, now)
+        self._sentence_begin = None
+
+    def _event(self, end_ms, is_sentence_end):
+        return {
+            "sentence_id": self._sentence_id,
+            "begin_time": int(self._sentence_begin),
+            "end_time": int(end_ms),
+            "words": max(1, int((end_ms - self._sentence_begin) // self.partial_interval_ms)),
+            "is_sentence_end": is_sentence_end
+        }
+
+    def _schedule(self, end_ms, is_sentence_end, now):
+        # 调用方需持有锁；送达时间不早于前一个事件，保证按音频顺序送达
+        latency = self.final_latency_ms if is_sentence_end else self.latency_ms
+        due = max(now + (latency + random.uniform(0, self.jitter_ms)) / 1000, self._last_due)
+        self._last_due = due
+        self._sequence += 1
+        heapq.heappush(self._pending, (due, self._sequence, self._event(end_ms, is_sentence_end)))
+        self._cond.notify_all()
+
+    def _results(self, event):
+        def sentence(language):
+            return SimpleNamespace(
+                sentence_id=event["sentence_id"],
+                text=fake_text(language, event["words"]),
+                begin_time=event["begin_time"],
+                end_time=event["end_time"],
+                is_sentence_end=event["is_sentence_end"],
+                stash=None,
+                words=[]
+            )
+        transcription = sentence(self.source_language) if self.transcription_enabled else None
+        translation = None
+        if self.target_languages:
+            translation = _FakeTranslation({lang: sentence(lang) for lang in self.target_languages})
+        return transcription, translation
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._pending:
+                        delay = self._pending[0][0] - time.monotonic()
+                        if delay <= 0:
+                            break
+                    elif self._stopped:
+                        return
+                    else:
+                        delay = None
+                    self._cond.wait(delay)
+                _, _, event = heapq.heappop(self._pending)
+            transcription, translation = self._results(event)
+            try:
+                self.callback.on_event(self.request_id, transcription, translation, None)
+            except Exception as e:
+                print(f"假识别器回调失败: {e}")
@@ -0,0 +1,190 @@
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """等待中的任务数已达上限"""
+
+
+class Job:
+    """文件翻译任务"""
+
+    def __init__(self, session_id, run, cleanup=None, on_update=None):
+        self.job_id = str(uuid.uuid4())
+        self.session_id = session_id
+        self.status = JOB_QUEUED
+        self.error = None
+        self.result = None
+        self.sent_seconds = 0.0
+        self.total_seconds = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+        self._run = run
+        self._cleanup = cleanup
+        self._cleaned = False
+        self._on_update = on_update
+        self._lock = threading.Lock()
+
+    def report_progress(self, sent_seconds, total_seconds=None):
+        """由处理函数调用，更新已发送的音频秒数"""
+        self.sent_seconds = sent_seconds
+        if total_seconds is not None:
+            self.total_seconds = total_seconds
+        self._notify(final=False)
+
+    def cleanup(self):
+        """清理任务文件，保证只执行一次"""
+        with self._lock:
+            if self._cleaned:
+                return
+            self._cleaned = True
+        if self._cleanup:
+            try:
+                self._cleanup()
+            except Exception as e:
+                print(f"清理任务文件失败: {self.job_id}, 错误: {e}")
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "session_id": self.session_id,
+            "status": self.status,
+            "error": self.error,
+            "result": self.result,
+            "progress": {
+                "sent_seconds": round(self.sent_seconds, 3),
+                "total_seconds": round(self.total_seconds, 3) if self.total_seconds is not None else None
+            },
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+    def _transition(self, from_states, to_state):
+        with self._lock:
+            if self.status not in from_states:
+                return False
+            self.status = to_state
+            if to_state == JOB_RUNNING:
+                self.started_at = time.time()
+            elif to_state in FINISHED_STATES:
+                self.finished_at = time.time()
+            return True
+
+    def _notify(self, final):
+        if self._on_update:
+            try:
+                self._on_update(self, final)
+            except Exception as e:
+                print(f"推送任务状态失败: {self.job_id}, 错误: {e}")
+
+
+class JobQueue:
+    """有界工作线程池，按提交顺序处理文件翻译任务"""
+
+    def __init__(self, workers=2, max_pending=100, keep_finished=1000):
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        for i in range(workers):
+            worker = threading.Thread(target=self._worker, name=f"file-job-{i}")
+            worker.daemon = True
+            worker.start()
+
+    def submit(self, session_id, run, cleanup=None, on_update=None):
+        """提交任务，run(job) 在工作线程中执行；队列已满时抛出 JobQueueFull"""
+        job = Job(session_id, run, cleanup, on_update)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"等待中的任务已达上限 {self.max_pending}")
+            self._pending += 1
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """取消任务：等待中的任务直接取消，运行中的任务通知其尽快停止"""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        if job._transition((JOB_QUEUED,), JOB_CANCELLED):
+            with self._lock:
+                self._pending -= 1
+            job.cleanup()
+            job._notify(final=True)
+            return True
+        if job.status == JOB_RUNNING:
+            job.cancel_event.set()
+            return True
+        return False
+
+    def cancel_session(self, session_id):
+        """取消会话的所有未结束任务"""
+        with self._lock:
+            job_ids = [job.job_id for job in self._jobs.values()
+                       if job.session_id == session_id and job.status not in FINISHED_STATES]
+        for job_id in job_ids:
+            self.cancel(job_id)
+        return job_ids
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {"pending": self._pending, "jobs": counts}
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if not job._transition((JOB_QUEUED,), JOB_RUNNING):
+                # 已被取消
+                continue
+            with self._lock:
+                self._pending -= 1
+            job._notify(final=False)
+
+            try:
+                job.result = job._run(job)
+                if job.cancel_event.is_set():
+                    job._transition((JOB_RUNNING,), JOB_CANCELLED)
+                else:
+                    job._transition((JOB_RUNNING,), JOB_COMPLETED)
+            except Exception as e:
+                print(f"文件翻译任务失败: {job.job_id}, 错误: {e}")
+                import traceback
+                traceback.print_exc()
+                job.error = str(e)
+                job._transition((JOB_RUNNING,), JOB_FAILED)
+            finally:
+                job.cleanup()
+                job._notify(final=True)
+
+    def _prune(self):
+        # 调用方需持有锁：只保留最近 keep_finished 个已结束的任务
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(len(finished) - self.keep_finished, 0)]:
+            del self._jobs[job_id]
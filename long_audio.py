@@ -0,0 +1,271 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from audio_decode import PcmStream, TARGET_SAMPLE_RATE
+from vad import frame_levels
+
+
+class Segment:
+    """切分出的一段音频（16kHz 单声道 16 位 WAV 文件）"""
+
+    def __init__(self, index, path, offset, duration):
+        self.index = index
+        self.path = path
+        self.offset = offset        # 在原始音频中的起始时间（秒）
+        self.duration = duration    # 时长（秒）
+
+    def to_dict(self):
+        return {"index": self.index, "offset": round(self.offset, 3), "duration": round(self.duration, 3)}
+
+
+class SilenceSplitter:
+    """在静音处把 PCM 流切分为若干段
+
+    按 frame_ms 分帧，用 NumPy 按块计算每帧能量（dBFS）。当前段达到 target_seconds 后，
+    在第一段持续 min_silence 秒的静音中切分；到达 max_seconds 仍无静音时强制切分。
+    每段写入临时 WAV 文件，切出一段就产出一段，内存占用与文件长度无关。
+    """
+
+    def __init__(self, work_dir, frame_ms=30, threshold_db=-40.0, min_silence=0.4,
+                 target_seconds=60.0, max_seconds=180.0, sample_rate=TARGET_SAMPLE_RATE):
+        self.work_dir = work_dir
+        self.sample_rate = sample_rate
+        self.frame_samples = int(sample_rate * frame_ms / 1000)
+        self.threshold_db = threshold_db
+        self.min_silence_frames = max(1, int(min_silence * 1000 / frame_ms))
+        self.target_frames = int(target_seconds * 1000 / frame_ms)
+        self.max_frames = int(max_seconds * 1000 / frame_ms)
+
+    def split(self, chunks):
+        """输入 16 位 PCM 数据块，逐段产出 Segment"""
+        frame_bytes = self.frame_samples * 2
+        pending = b''
+        index = 0
+        offset_frames = 0
+        segment_frames = 0
+        silent_run = 0
+        writer, path = self._open(index)
+
+        for chunk in chunks:
+            data = pending + chunk
+            usable = len(data) - len(data) % frame_bytes
+            pending = data[usable:]
+            if not usable:
+                continue
+
+            samples = np.frombuffer(data[:usable], dtype='<i2').reshape(-1, self.frame_samples)
+            silent = frame_levels(samples) < self.threshold_db
+
+            # 逐帧决定切分点，切分点之间的数据整段写入
+            written = 0
+            for i, is_silent in enumerate(silent):
+                silent_run = silent_run + 1 if is_silent else 0
+                segment_frames += 1
+                if (segment_frames >= self.target_frames and silent_run >= self.min_silence_frames) \
+                        or segment_frames >= self.max_frames:
+                    writer.writeframes(data[written * frame_bytes:(i + 1) * frame_bytes])
+                    written = i + 1
+                    writer.close()
+                    yield self._segment(index, path, offset_frames, segment_frames)
+                    index += 1
+                    offset_frames += segment_frames
+                    segment_frames = 0
+                    silent_run = 0
+                    writer, path = self._open(index)
+            writer.writeframes(data[written * frame_bytes:usable])
+
+        if pending:
+            writer.writeframes(pending)
+        writer.close()
+        if segment_frames > 0 or pending:
+            duration_frames = segment_frames + len(pending) / frame_bytes
+            yield self._segment(index, path, offset_frames, duration_frames)
+        else:
+            os.remove(path)
+
+    def _open(self, index):
+        path = os.path.join(self.work_dir, f"segment_{index:05d}.wav")
+        writer = wave.open(path, 'wb')
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(self.sample_rate)
+        return writer, path
+
+    def _segment(self, index, path, offset_frames, frames):
+        frame_seconds = self.frame_samples / self.sample_rate
+        return Segment(index, path, offset_frames * frame_seconds, frames * frame_seconds)
+
+
+def probe_duration(file_path):
+    """读取音频时长（秒），压缩格式等无法直接得知时长时返回 None"""
+    try:
+        with PcmStream(file_path) as audio:
+            return audio.info.duration
+    except Exception:
+        return None
+
+
+def translate_segment(segment, recognizer_factory, source_language, target_languages, retries=1):
+    """用一次同步识别调用翻译一段音频，时间戳换算为原始音频中的绝对时间（毫秒）
+
+    识别结果报告错误或调用本身抛出异常（如网络错误、超时）时重试，最多 retries 次
+    """
+    offset_ms = int(round(segment.offset * 1000))
+    error = None
+    for attempt in range(retries + 1):
+        recognizer = recognizer_factory(
+            model="gummy-realtime-v1",
+            format="wav",
+            sample_rate=TARGET_SAMPLE_RATE,
+            source_language=source_language,
+            transcription_enabled=True,
+            translation_enabled=True,
+            translation_target_languages=target_languages,
+            callback=None
+        )
+        try:
+            result = recognizer.call(segment.path)
+        except Exception as e:
+            error = str(e)
+        else:
+            error = getattr(result, 'error_message', None)
+            if not error:
+                break
+        print(f"分段 {segment.index} 翻译失败 (第 {attempt + 1} 次): {error}")
+    else:
+        raise RuntimeError(f"分段 {segment.index} 翻译失败: {error}")
+
+    sentences = []
+    transcriptions = result.transcription_result_list or []
+    translations = result.translation_result_list or []
+    for i in range(max(len(transcriptions), len(translations))):
+        transcription = transcriptions[i] if i < len(transcriptions) else None
+        translation = translations[i] if i < len(translations) else None
+        timing = transcription or _first_translation(translation)
+        sentence = {
+            "text": transcription.text if transcription else None,
+            "begin_time": _shift(getattr(timing, 'begin_time', None), offset_ms),
+            "end_time": _shift(getattr(timing, 'end_time', None), offset_ms),
+            "translations": {}
+        }
+        if translation:
+            for lang in translation.get_language_list():
+                trans = translation.get_translation(lang)
+                if trans:
+                    sentence["translations"][lang] = trans.text
+        sentences.append(sentence)
+    return result.request_id, sentences
+
+
+def _first_translation(translation):
+    if not translation:
+        return None
+    for lang in translation.get_language_list():
+        return translation.get_translation(lang)
+    return None
+
+
+def _shift(value, offset_ms):
+    return value + offset_ms if value is not None else None
+
+
+def translate_long_file(file_path, source_language, target_languages, recognizer_factory,
+                        concurrency=4, splitter_options=None, work_dir=None, progress=None, cancel_event=None):
+    """长音频模式：在静音处切分，多个识别会话并发翻译，再按顺序合并
+
+    返回与 Translator.call_sync 相同结构的 transcriptions/translations，
+    另附每句在原始音频中的绝对时间 timestamps 以及分段信息 segments。
+    progress(done_seconds) 在每段翻译完成后调用；cancel_event 置位后不再开始新的分段，
+    有分段因此被跳过时返回 success 为 False、cancelled 为 True，附带已完成部分的结果（不会写入缓存）。
+    """
+    work_dir = tempfile.mkdtemp(prefix="segments_", dir=work_dir)
+    # 限制已切出但尚未翻译完的分段数，避免切分远远跑在翻译前面占用磁盘
+    in_flight = threading.BoundedSemaphore(concurrency * 2)
+    progress_lock = threading.Lock()
+    failed = threading.Event()
+    cancelled = threading.Event()
+    done = [0.0]
+    started = time.monotonic()
+
+    def run(segment):
+        try:
+            if failed.is_set():
+                return None, []
+            if cancel_event is not None and cancel_event.is_set():
+                cancelled.set()
+                return None, []
+            try:
+                translated = translate_segment(segment, recognizer_factory, source_language, target_languages)
+            except Exception:
+                # 任一分段失败后整体失败，尚未开始的分段直接跳过
+                failed.set()
+                raise
+            if progress:
+                with progress_lock:
+                    done[0] += segment.duration
+                    progress(done[0])
+            return translated
+        finally:
+            try:
+                os.remove(segment.path)
+            except OSError:
+                pass
+            in_flight.release()
+
+    try:
+        splitter = SilenceSplitter(work_dir, **(splitter_options or {}))
+        futures = []
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            with PcmStream(file_path) as audio:
+                for segment in splitter.split(audio.chunks(64 * 1024)):
+                    if failed.is_set() or (cancel_event is not None and cancel_event.is_set()):
+                        os.remove(segment.path)
+                        if not failed.is_set():
+                            cancelled.set()
+                        break
+                    in_flight.acquire()
+                    futures.append((segment, pool.submit(run, segment)))
+
+            request_ids = []
+            transcriptions = []
+            translations = {lang: [] for lang in target_languages}
+            timestamps = []
+            for segment, future in futures:
+                request_id, sentences = future.result()
+                if request_id is not None:
+                    request_ids.append(request_id)
+                for sentence in sentences:
+                    if sentence["text"] is not None:
+                        transcriptions.append(sentence["text"])
+                        timestamps.append({"begin_time": sentence["begin_time"], "end_time": sentence["end_time"]})
+                    for lang, text in sentence["translations"].items():
+                        translations.setdefault(lang, []).append(text)
+
+        audio_seconds = sum(segment.duration for segment, _ in futures)
+        wall_seconds = time.monotonic() - started
+        if cancelled.is_set():
+            print(f"长音频翻译已取消: 已开始 {len(futures)} 段, 音频 {audio_seconds:.1f} 秒, 耗时 {wall_seconds:.1f} 秒")
+        else:
+            print(f"长音频翻译完成: {len(futures)} 段, 音频 {audio_seconds:.1f} 秒, 耗时 {wall_seconds:.1f} 秒, 并发 {concurrency}")
+        result = {
+            "success": not cancelled.is_set(),
+            "cancelled": cancelled.is_set(),
+            "request_id": request_ids[0] if request_ids else None,
+            "request_ids": request_ids,
+            "transcriptions": transcriptions,
+            "translations": translations,
+            "timestamps": timestamps,
+            "segments": [segment.to_dict() for segment, _ in futures]
+        }
+        if cancelled.is_set():
+            result["error"] = "长音频翻译已取消"
+        return result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,234 @@
+import bisect
+import threading
+import time
+
+# 延迟直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """单调递增计数器，labels 为与 labelnames 对应的取值元组"""
+
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for values, value in items:
+            yield self.name, tuple(zip(self.labelnames, values)), value
+
+
+class Gauge:
+    """抓取时才计算的瞬时值，collect() 返回 [(labels, value)]，不在热路径上维护"""
+
+    type = "gauge"
+
+    def __init__(self, name, help, labelnames=(), collect=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self):
+        for values, value in self.collect():
+            yield self.name, tuple(zip(self.labelnames, values)), value
+
+
+class Histogram:
+    """固定桶直方图：observe 只做一次二分查找和计数"""
+
+    type = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}   # labels -> [各桶计数（含 +Inf）, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, labels=()):
+        with self._lock:
+            series = self._series.get(labels)
+            return sum(series[0]) if series else 0
+
+    def samples(self, extra_labels=()):
+        with self._lock:
+            items = [(values, list(counts), total) for values, (counts, total) in self._series.items()]
+        for values, counts, total in items:
+            labels = tuple(extra_labels) + tuple(zip(self.labelnames, values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", labels + (("le", _format_value(float(bound))),), cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class HistogramFamily:
+    """按标签分组的一组直方图（如每个会话一个），collect() 返回 [(labels, Histogram)]"""
+
+    type = "histogram"
+
+    def __init__(self, name, help, collect):
+        self.name = name
+        self.help = help
+        self.collect = collect
+
+    def samples(self):
+        for labels, histogram in self.collect():
+            for name, sample_labels, value in histogram.samples(labels):
+                yield self.name + name[len(histogram.name):], sample_labels, value
+
+
+def render(metrics):
+    """按 Prometheus 文本格式输出一组指标"""
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# 全局指标
+FIRST_PARTIAL_SECONDS = Histogram(
+    "translator_first_partial_seconds",
+    "从发送一句话开头的音频到收到该句第一条中间结果的耗时"
+)
+SENTENCE_END_SECONDS = Histogram(
+    "translator_sentence_end_seconds",
+    "从发送一句话结尾的音频到收到该句句末结果的耗时"
+)
+AUDIO_SECONDS = Counter(
+    "translator_audio_seconds_total",
+    "发送给识别器的音频秒数，rate() 即每秒墙钟时间处理的音频秒数",
+    ("source",)
+)
+RECOGNIZER_EVENTS = Counter(
+    "translator_recognizer_events_total",
+    "识别器返回的事件数",
+    ("kind",)
+)
+UPSTREAM_ERRORS = Counter(
+    "translator_upstream_errors_total",
+    "识别服务错误数（recognizer 为识别器报告的错误，send 为发送音频失败）",
+    ("kind",)
+)
+WEBSOCKET_MESSAGES = Counter(
+    "translator_websocket_messages_total",
+    "会话 WebSocket 收发的消息数",
+    ("direction",)
+)
+WEBSOCKET_BYTES = Counter(
+    "translator_websocket_bytes_total",
+    "会话 WebSocket 收发的字节数",
+    ("direction",)
+)
+
+
+class SendClock:
+    """记录每段音频的发送时间，用于把识别结果中的音频时间换算回发送时刻
+
+    只保留最近 max_marks 次发送，超出范围的查询返回 None。
+    """
+
+    def __init__(self, sample_rate=16000, max_marks=4096):
+        self.bytes_per_ms = sample_rate * 2 / 1000
+        self.max_marks = max_marks
+        self.sent_ms = 0.0
+        self._ends = []    # 每次发送后累计的音频毫秒数
+        self._times = []   # 对应的 time.monotonic()
+        self._lock = threading.Lock()
+
+    def sent(self, nbytes, at=None):
+        at = time.monotonic() if at is None else at
+        with self._lock:
+            self.sent_ms += nbytes / self.bytes_per_ms
+            self._ends.append(self.sent_ms)
+            self._times.append(at)
+            if len(self._ends) > self.max_marks * 2:
+                del self._ends[:self.max_marks]
+                del self._times[:self.max_marks]
+
+    def sent_at(self, audio_ms):
+        """包含 audio_ms 处音频的那次发送的时间"""
+        with self._lock:
+            index = bisect.bisect_left(self._ends, audio_ms)
+            if index >= len(self._ends) or (index == 0 and len(self._ends) >= self.max_marks * 2):
+                return None
+            return self._times[index]
+
+
+class SessionLatency:
+    """单个会话的发送时钟与延迟直方图，观测值同时计入全局直方图"""
+
+    def __init__(self, sample_rate=16000):
+        self.clock = SendClock(sample_rate)
+        self.first_partial = Histogram(FIRST_PARTIAL_SECONDS.name, FIRST_PARTIAL_SECONDS.help)
+        self.sentence_end = Histogram(SENTENCE_END_SECONDS.name, SENTENCE_END_SECONDS.help)
+        self._current_sentence = None
+
+    def audio_sent(self, nbytes, source):
+        self.clock.sent(nbytes)
+        AUDIO_SECONDS.inc(nbytes / self.clock.bytes_per_ms / 1000, (source,))
+
+    def result(self, sentence_id, begin_ms, end_ms, is_sentence_end):
+        """记录一条识别结果，begin_ms/end_ms 为相对本会话已发送音频的时间"""
+        now = time.monotonic()
+        if sentence_id != self._current_sentence and begin_ms is not None:
+            self._current_sentence = sentence_id
+            sent = self.clock.sent_at(begin_ms)
+            if sent is not None:
+                self.first_partial.observe(now - sent)
+                FIRST_PARTIAL_SECONDS.observe(now - sent)
+        if is_sentence_end and end_ms is not None:
+            sent = self.clock.sent_at(end_ms)
+            if sent is not None:
+                self.sentence_end.observe(now - sent)
+                SENTENCE_END_SECONDS.observe(now - sent)
@@ -0,0 +1,189 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+from metrics import WEBSOCKET_BYTES, WEBSOCKET_MESSAGES
+from protocol import JsonCodec
+
+# 发送队列溢出策略
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # 丢弃队列中最旧的中间结果，为新消息腾出空间
+OVERFLOW_DROP_NEWEST = "drop_newest"  # 直接丢弃新到达的中间结果
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST)
+
+
+def message_size(value):
+    """估算消息序列化后的字节数（只计字符串长度和每个值的固定开销），用于重放缓冲区的字节上限"""
+    if isinstance(value, dict):
+        return sum(len(key) + message_size(item) for key, item in value.items()) + 2
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) + 2
+    if isinstance(value, (list, tuple)):
+        return sum(message_size(item) for item in value) + 2
+    return 8
+
+
+class ReplayBuffer:
+    """会话级重放缓冲区：给发往客户端的消息依次编号（"seq" 字段），并保留最近的消息
+
+    客户端断线重连时带上最后收到的序号，缓冲区返回其后的消息用于补发。
+    按条数（max_messages）和估算字节数（max_bytes）两个上限淘汰最旧的消息。
+    不是线程安全的，由调用方加锁。
+    """
+
+    def __init__(self, max_messages=500, max_bytes=1024 * 1024):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.seq = 0
+        self.bytes = 0
+        self.evicted = 0
+        self._items = deque()  # [(序号, 消息, 是否为 final, 估算字节数)]
+
+    def __len__(self):
+        return len(self._items)
+
+    def append(self, message, final=False):
+        """给消息编号并保留，返回序号"""
+        self.seq += 1
+        message["seq"] = self.seq
+        size = message_size(message)
+        self._items.append((self.seq, message, final, size))
+        self.bytes += size
+        while self._items and (len(self._items) > self.max_messages or self.bytes > self.max_bytes):
+            self.bytes -= self._items.popleft()[3]
+            self.evicted += 1
+        return self.seq
+
+    def since(self, seq):
+        """返回 (序号大于 seq 的 [(消息, final)], 是否完整)；其中部分消息已被淘汰时不完整"""
+        if seq >= self.seq:
+            return [], True
+        first = self._items[0][0] if self._items else self.seq + 1
+        start = max(seq + 1 - first, 0)
+        return [(message, final) for _, message, final, _ in islice(self._items, start, None)], first <= seq + 1
+
+
+class OutboundQueue:
+    """会话级有界发送队列
+
+    dashscope 回调线程只调用 put() 入队，实际发送由 WebSocket 服务器事件循环中的
+    发送任务完成，避免跨线程、跨事件循环操作 websockets 连接。
+    final=True 的消息（句末结果、状态消息）无论采用哪种溢出策略都不会被丢弃。
+    """
+
+    def __init__(self, loop, maxsize=256, policy=OVERFLOW_DROP_OLDEST):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {policy}")
+        self.loop = loop
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self._closed = False
+
+    def qsize(self):
+        return len(self._items)
+
+    def put(self, message, final=False, notify=True):
+        """线程安全地入队，返回消息是否被接受
+
+        notify=False 时不唤醒发送任务，由调用方之后在事件循环中调用 wake()（广播时一次唤醒所有听众）。
+        """
+        with self._lock:
+            if self._closed:
+                return False
+            if len(self._items) >= self.maxsize:
+                if final:
+                    # 尽量腾出空间，但句末结果总是入队（允许短暂超出上限）
+                    self._drop_oldest_partial()
+                elif self.policy == OVERFLOW_DROP_NEWEST or not self._drop_oldest_partial():
+                    self.dropped += 1
+                    return False
+            self._items.append((message, final))
+        if notify:
+            self._notify()
+        return True
+
+    def close(self):
+        """关闭队列，发送任务在取完剩余消息后退出"""
+        with self._lock:
+            self._closed = True
+        self._notify()
+
+    def abort(self):
+        """丢弃未发送的消息并关闭队列，发送任务立即退出"""
+        with self._lock:
+            self.dropped += len(self._items)
+            self._items.clear()
+            self._closed = True
+        self._notify()
+
+    def wake(self):
+        """在事件循环中唤醒发送任务"""
+        self._wakeup.set()
+
+    async def get(self):
+        """在事件循环中取出下一条消息，队列关闭且为空时返回 None"""
+        while True:
+            self._wakeup.clear()
+            with self._lock:
+                if self._items:
+                    return self._items.popleft()[0]
+                if self._closed:
+                    return None
+            await self._wakeup.wait()
+
+    async def drain_to(self, websocket, encoder=None, coalescer=None, codec=None):
+        """发送任务：持续将队列中的消息发送到 WebSocket
+
+        encoder 用于增量协议编码，coalescer 用于按句合并中间结果，二者均可选；
+        codec 把消息序列化为帧（默认 JSON 文本帧），每条消息只序列化一次。
+        """
+        codec = codec or JsonCodec()
+        while True:
+            deadline = coalescer.next_deadline() if coalescer else None
+            if deadline is None:
+                message = await self.get()
+                if message is None:
+                    return
+                batch = coalescer.offer(message) if coalescer else [message]
+            else:
+                try:
+                    message = await asyncio.wait_for(self.get(), max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    batch = coalescer.due()
+                else:
+                    if message is None:
+                        return
+                    batch = coalescer.due() + coalescer.offer(message)
+
+            for item in batch:
+                if encoder is not None:
+                    item = encoder.encode(item)
+                data = codec.encode(item)
+                try:
+                    await websocket.send(data)
+                except Exception as e:
+                    print(f"发送 WebSocket 消息失败: {e}")
+                    return
+                WEBSOCKET_MESSAGES.inc(labels=("out",))
+                WEBSOCKET_BYTES.inc(len(data), ("out",))
+
+    def _drop_oldest_partial(self):
+        # 调用方需持有锁
+        for i, (_, final) in enumerate(self._items):
+            if not final:
+                del self._items[i]
+                self.dropped += 1
+                return True
+        return False
+
+    def _notify(self):
+        try:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
@@ -0,0 +1,117 @@
+import time
+
+# 音频文件发送节奏
+PACING_REALTIME = "realtime"  # 按实时速度发送
+PACING_SPEEDUP = "speedup"    # 按固定倍速发送
+PACING_FASTEST = "fastest"    # 尽可能快发送，根据后端反馈自适应降速
+PACING_MODES = (PACING_REALTIME, PACING_SPEEDUP, PACING_FASTEST)
+
+
+class FilePacer:
+    """音频文件发送节奏控制
+
+    使用单调时钟按音频时长排定每一帧的发送时刻（而不是发送后固定休眠），
+    发送耗时本身不会累积成额外延迟。fastest 模式下不设速度上限，
+    一旦出现发送阻塞、发送失败或识别结果明显滞后，就按比例降速，情况好转后再逐步提速。
+    """
+
+    def __init__(self, mode=PACING_SPEEDUP, speed=2.0, max_lag=10.0, min_speed=1.0):
+        if mode not in PACING_MODES:
+            raise ValueError(f"未知的发送节奏: {mode}")
+        self.mode = mode
+        self.max_lag = max_lag
+        self.min_speed = min_speed
+        if mode == PACING_REALTIME:
+            self.speed = 1.0
+        elif mode == PACING_SPEEDUP:
+            self.speed = max(speed, 0.1)
+        else:
+            self.speed = float('inf')
+
+        self.audio_seconds = 0.0
+        self.slowdowns = 0
+        self.errors = 0
+        self._start = None
+        self._next_time = None
+        self._lag_slowdown_at = None
+
+    @property
+    def adaptive(self):
+        return self.mode == PACING_FASTEST
+
+    def start(self):
+        self._start = time.monotonic()
+        self._next_time = self._start
+
+    def wait(self):
+        """等待到下一帧的发送时刻"""
+        delay = self._next_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def sent(self, seconds, send_duration):
+        """记录已发送一帧，并排定下一帧的发送时刻"""
+        self.audio_seconds += seconds
+        if self.adaptive:
+            if send_duration > seconds * 0.5:
+                # 发送调用被阻塞，说明后端处理不过来
+                self._slow_down()
+            else:
+                self._speed_up()
+
+        now = time.monotonic()
+        if self.speed != float('inf'):
+            self._next_time += seconds / self.speed
+        # 落后太多时不再追赶，避免突发地连续发送
+        if self._next_time < now - 1.0 or self.speed == float('inf'):
+            self._next_time = max(self._next_time, now)
+
+    def failed(self):
+        """发送失败：降速并退避一小段时间"""
+        self.errors += 1
+        self._slow_down()
+        time.sleep(min(0.1 * self.errors, 2.0))
+
+    def observe_lag(self, lag):
+        """识别结果相对已发送音频的滞后（秒），超过阈值时降速
+
+        每发送一块都会测量一次滞后，降速后已积压的音频仍需时间消化，
+        因此每 max_lag 秒至多因滞后降速一次，避免同一次积压被连续计入、速度迅速降到下限。
+        """
+        if not self.adaptive or lag <= self.max_lag:
+            return
+        now = time.monotonic()
+        if self._lag_slowdown_at is not None and now - self._lag_slowdown_at < self.max_lag:
+            return
+        self._lag_slowdown_at = now
+        self._slow_down()
+
+    def hold(self, seconds):
+        """暂停期间顺延发送计划"""
+        time.sleep(seconds)
+        if self._next_time is not None:
+            self._next_time += seconds
+
+    def stats(self):
+        """返回发送统计：音频秒数、耗时及吞吐量（音频秒/墙钟秒）"""
+        wall_seconds = time.monotonic() - self._start if self._start else 0.0
+        return {
+            "pacing": self.mode,
+            "audio_seconds": round(self.audio_seconds, 3),
+            "wall_seconds": round(wall_seconds, 3),
+            "throughput": round(self.audio_seconds / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+            "slowdowns": self.slowdowns,
+            "errors": self.errors
+        }
+
+    def _slow_down(self):
+        wall_seconds = time.monotonic() - self._start
+        current = self.audio_seconds / wall_seconds if wall_seconds > 0 else self.min_speed
+        self.speed = max(self.min_speed, min(self.speed, current) * 0.5)
+        self.slowdowns += 1
+
+    def _speed_up(self):
+        if self.speed != float('inf'):
+            self.speed *= 1.05
+            if self.speed > 64:
+                self.speed = float('inf')
@@ -0,0 +1,245 @@
+import json
+import os
+import time
+from urllib.parse import urlsplit, parse_qs
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# WebSocket 结果消息协议
+PROTOCOL_FULL = "full"    # 默认：每次发送完整文本
+PROTOCOL_DELTA = "delta"  # 增量：只发送文本变化部分，并定期发送完整快照
+PROTOCOLS = (PROTOCOL_FULL, PROTOCOL_DELTA)
+
+# 二进制 WebSocket 子协议（Sec-WebSocket-Protocol）：结果以 MessagePack 二进制帧发送，
+# 字段名、状态和语言用下面的小整数编码，表中没有的保持字符串；修改编码表时需同时修改 static/js/msgpack.js 并升级版本号
+SUBPROTOCOL_MSGPACK = "si.msgpack.v1"
+FIELD_CODES = {
+    "status": 0, "request_id": 1, "transcription": 2, "translations": 3, "is_sentence_end": 4,
+    "text": 5, "sentence_id": 6, "stash": 7, "offset": 8, "append": 9,
+    "protocol": 10, "encoding": 11, "reason": 12, "message": 13, "job": 14, "channel": 15,
+    "seq": 16, "replayed": 17, "gap": 18
+}
+STATUS_CODES = {
+    "connected": 0, "paused": 1, "resumed": 2, "stopped": 3,
+    "complete": 4, "error": 5, "expired": 6, "job_update": 7
+}
+LANGUAGE_CODES = {
+    "zh": 0, "en": 1, "ja": 2, "yue": 3, "ko": 4, "de": 5, "fr": 6, "ru": 7, "it": 8, "es": 9
+}
+
+
+def negotiate(path, default_max_rate=10.0):
+    """解析 WebSocket 连接路径，返回 (session_id, 协议, 中间结果最大频率)
+
+    客户端通过查询参数选择协议，例如 /ws/<session_id>?protocol=delta&max_rate=10，
+    不带参数的旧客户端保持完整文本消息。
+    """
+    parts = urlsplit(path)
+    session_id = parts.path.rstrip('/').split('/')[-1]
+    query = parse_qs(parts.query)
+
+    protocol = query.get('protocol', [PROTOCOL_FULL])[0]
+    if protocol not in PROTOCOLS:
+        protocol = PROTOCOL_FULL
+
+    max_rate = default_max_rate
+    try:
+        max_rate = float(query.get('max_rate', [default_max_rate])[0])
+    except ValueError:
+        pass
+
+    return session_id, protocol, max(max_rate, 0.0)
+
+
+def parse_last_seq(path):
+    """重连时客户端在查询参数 last_seq 中给出最后收到的消息序号，没有或无效时返回 None"""
+    value = parse_qs(urlsplit(path).query).get('last_seq', [None])[0]
+    try:
+        return max(int(value), 0) if value is not None else None
+    except ValueError:
+        return None
+
+
+def parse_listen_path(path):
+    """解析听众连接路径 /ws/listen/<listen_id>?channels=en,source，返回 (listen_id, 频道列表)
+
+    不是听众路径时返回 None；未指定频道时频道列表为空，表示订阅全部频道。
+    """
+    parts = urlsplit(path)
+    segments = parts.path.strip('/').split('/')
+    if len(segments) != 3 or segments[:2] != ['ws', 'listen']:
+        return None
+    channels = []
+    for value in parse_qs(parts.query).get('channels', []):
+        channels.extend(channel for channel in value.split(',') if channel and channel not in channels)
+    return segments[2], channels
+
+
+def subprotocols():
+    """服务端可以协商的子协议，未安装 msgpack 时为空（只使用 JSON 文本帧）"""
+    return [SUBPROTOCOL_MSGPACK] if msgpack is not None else []
+
+
+class JsonCodec:
+    """默认编码：JSON 文本帧"""
+
+    name = "json"
+
+    def encode(self, message):
+        return json.dumps(message)
+
+
+class MsgpackCodec:
+    """MessagePack 二进制帧，字段名、状态和语言替换为整数编码"""
+
+    name = "msgpack"
+
+    def __init__(self):
+        self._packer = msgpack.Packer()
+
+    def encode(self, message):
+        return self._packer.pack(compact(message))
+
+
+def compact(value, field=None):
+    """按编码表替换消息中的字段名、状态值及 translations 的语言键"""
+    if isinstance(value, dict):
+        if field == "translations":
+            return {LANGUAGE_CODES.get(lang, lang): compact(item) for lang, item in value.items()}
+        return {FIELD_CODES.get(key, key): compact(item, key) for key, item in value.items()}
+    if field == "status":
+        return STATUS_CODES.get(value, value)
+    if isinstance(value, list):
+        return [compact(item) for item in value]
+    return value
+
+
+def codec_for(subprotocol):
+    """按握手时协商出的子协议选择编码"""
+    if subprotocol == SUBPROTOCOL_MSGPACK and msgpack is not None:
+        return MsgpackCodec()
+    return JsonCodec()
+
+
+def sentence_key(result):
+    """结果所属句子的标识，用于按句合并中间结果"""
+    transcription = result.get("transcription")
+    if transcription:
+        return transcription.get("sentence_id")
+    for trans in result.get("translations", {}).values():
+        return trans.get("sentence_id")
+    return None
+
+
+class DeltaEncoder:
+    """把完整结果消息编码为增量消息
+
+    每个 (sentence_id, 语言) 记录上次发送的文本，之后只发送公共前缀之后的部分：
+    {"sentence_id", "offset", "append", "is_sentence_end"}，客户端用
+    text[:offset] + append 还原。句末结果和每 snapshot_interval 条中间结果
+    发送一次带 "text" 的完整快照，用于客户端重新同步。
+    """
+
+    def __init__(self, snapshot_interval=20):
+        self.snapshot_interval = snapshot_interval
+        self._sent = {}
+        self._since_snapshot = {}
+
+    def encode(self, result):
+        if "status" in result:
+            return result
+
+        key = sentence_key(result)
+        count = self._since_snapshot.get(key, 0) + 1
+        snapshot = result.get("is_sentence_end") or count >= self.snapshot_interval
+        self._since_snapshot[key] = 0 if snapshot else count
+
+        encoded = dict(result)
+        if result.get("transcription"):
+            encoded["transcription"] = self._encode_part(None, result["transcription"], snapshot)
+        if result.get("translations"):
+            encoded["translations"] = {
+                lang: self._encode_part(lang, trans, snapshot)
+                for lang, trans in result["translations"].items()
+            }
+
+        if result.get("is_sentence_end"):
+            self._since_snapshot.pop(key, None)
+        return encoded
+
+    def _encode_part(self, lang, part, snapshot):
+        state_key = (part.get("sentence_id"), lang)
+        text = part.get("text") or ""
+        previous = self._sent.get(state_key)
+
+        if part.get("is_sentence_end"):
+            self._sent.pop(state_key, None)
+        else:
+            self._sent[state_key] = text
+
+        if snapshot or previous is None:
+            return part
+
+        offset = len(os.path.commonprefix([previous, text]))
+        encoded = {
+            "sentence_id": part.get("sentence_id"),
+            "offset": offset,
+            "append": text[offset:],
+            "is_sentence_end": part.get("is_sentence_end")
+        }
+        if "stash" in part:
+            encoded["stash"] = part["stash"]
+        return encoded
+
+
+class PartialCoalescer:
+    """按句子把中间结果合并到最大频率 max_rate（Hz）
+
+    同一句子在间隔内到达的中间结果只保留最新一条，到期后发送；
+    句末结果立即发送，并替换该句尚未发出的中间结果。
+    """
+
+    def __init__(self, max_rate):
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self._last_sent = {}
+        self._pending = {}
+
+    def offer(self, message, now=None):
+        """提交一条消息，返回现在应当发送的消息列表"""
+        if "status" in message or self.interval <= 0:
+            return [message]
+
+        now = time.monotonic() if now is None else now
+        key = sentence_key(message)
+
+        if message.get("is_sentence_end"):
+            self._pending.pop(key, None)
+            self._last_sent.pop(key, None)
+            return [message]
+
+        if now - self._last_sent.get(key, float('-inf')) >= self.interval:
+            self._pending.pop(key, None)
+            self._last_sent[key] = now
+            return [message]
+
+        self._pending[key] = message
+        return []
+
+    def due(self, now=None):
+        """取出已到期的合并消息"""
+        now = time.monotonic() if now is None else now
+        ready = []
+        for key in list(self._pending):
+            if now - self._last_sent.get(key, float('-inf')) >= self.interval:
+                ready.append(self._pending.pop(key))
+                self._last_sent[key] = now
+        return ready
+
+    def next_deadline(self):
+        """最近一条待发送消息的到期时间，没有待发送消息时返回 None"""
+        if not self._pending:
+            return None
+        return min(self._last_sent[key] for key in self._pending) + self.interval
@@ -0,0 +1,262 @@
+import threading
+import time
+from collections import deque
+
+from translator import TranslatorCallback, start_recognizer
+
+
+def parse_pool_keys(spec):
+    """解析预热配置，如 "zh:en,ja;en:zh" -> [("zh", ["en", "ja"]), ("en", ["zh"])]"""
+    keys = []
+    for item in (spec or "").split(";"):
+        if ":" not in item:
+            continue
+        source, targets = item.split(":", 1)
+        targets = [t.strip() for t in targets.split(",") if t.strip()]
+        if source.strip() and targets:
+            keys.append((source.strip(), targets))
+    return keys
+
+
+class PooledRecognizer:
+    """连接池中已建立连接、等待取用的识别器"""
+
+    def __init__(self, key, recognizer, callback, ready_seconds, idle_audio_ms):
+        self.key = key
+        self.recognizer = recognizer
+        self.callback = callback
+        self.ready_seconds = ready_seconds
+        self.idle_audio_ms = idle_audio_ms   # 已发送的探测及保活音频时长
+        self.created_at = time.monotonic()
+        self.busy = False   # 正在发送保活帧，此时不能被取用；只在持有连接池的锁时修改
+
+    def keepalive(self, frame, frame_ms):
+        """发送保活静音帧兼健康检查，连接已断开或报告过错误时返回 False"""
+        if self.callback.error:
+            return False
+        try:
+            self.recognizer.send_audio_frame(frame)
+        except Exception:
+            return False
+        self.idle_audio_ms += frame_ms
+        return True
+
+    def close(self):
+        try:
+            self.recognizer.stop()
+        except Exception:
+            pass
+
+
+class RecognizerPool:
+    """预热的实时识别器连接池，按（API Key，源语言，目标语言集合，格式，采样率）分组
+
+    每个活跃的分组保持至少 min_warm 个已建立连接的识别器，后台线程每隔 keepalive_interval 秒
+    发送一帧 keepalive_ms 的静音保活（识别器超过 23 秒收不到音频会自动断开），
+    保活失败的识别器被丢弃并补充。分组超过 idle_timeout 秒无人使用后不再预热（配置中固定预热的分组除外），
+    识别器在池中闲置超过 idle_timeout 秒后也会换新。
+    预热的连接以分组的 API Key 计费，api_keys 不为 None 时只为其中的 Key 按需预热，
+    其他 Key 的会话用完即关闭，服务器不保留其 Key。
+    """
+
+    def __init__(self, min_warm=1, max_idle=8, idle_timeout=300, keepalive_interval=5.0,
+                 keepalive_ms=100, sample_rate=16000, opener=None, api_keys=None):
+        self.min_warm = min_warm
+        self.api_keys = api_keys
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_ms = keepalive_ms
+        self.keepalive_frame = b'\x00' * (sample_rate * keepalive_ms // 1000 * 2)
+        self._opener = opener or _open_recognizer
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._idle = {}        # key -> deque[PooledRecognizer]
+        self._demand = {}      # key -> 最近一次使用时间，None 表示固定预热
+        self._starting = {}    # key -> 正在建立连接的数量
+        self._ready = {"warm": deque(maxlen=1000), "cold": deque(maxlen=1000)}
+        self._counters = {"warm_hits": 0, "misses": 0, "started": 0, "start_failures": 0,
+                          "health_failures": 0, "recycled": 0}
+
+        worker = threading.Thread(target=self._maintain, name="recognizer-pool")
+        worker.daemon = True
+        worker.start()
+
+    @staticmethod
+    def key(api_key, source_language, target_languages, format="pcm", sample_rate=16000):
+        return (api_key, source_language, tuple(sorted(target_languages)), format, sample_rate)
+
+    def pin(self, key):
+        """固定预热某个分组，不会因闲置而停止预热"""
+        with self._lock:
+            self._demand[key] = None
+        self._wake.set()
+
+    def acquire(self, key):
+        """取出一个预热的识别器，没有时返回 None；分组的 API Key 允许按需预热时登记为需要预热"""
+        with self._lock:
+            if self._demand.get(key, 0) is not None and (self.api_keys is None or key[0] in self.api_keys):
+                self._demand[key] = time.monotonic()
+            # 正在保活的识别器不能交给会话，否则保活帧会混入会话音频
+            entry = next((entry for entry in self._idle.get(key, ()) if not entry.busy), None)
+            if entry is not None:
+                self._idle[key].remove(entry)
+            self._counters["warm_hits" if entry else "misses"] += 1
+        # 唤醒后台线程补充预热
+        self._wake.set()
+        return entry
+
+    def record_ready(self, kind, seconds):
+        with self._lock:
+            self._ready[kind].append(seconds)
+
+    def stats(self):
+        with self._lock:
+            groups = []
+            for key in set(self._idle) | set(self._demand):
+                api_key, source, targets, format, sample_rate = key
+                groups.append({
+                    "source_language": source,
+                    "target_languages": list(targets),
+                    "format": format,
+                    "sample_rate": sample_rate,
+                    "idle": len(self._idle.get(key, ())),
+                    "starting": self._starting.get(key, 0),
+                    "pinned": key in self._demand and self._demand[key] is None
+                })
+            return {
+                "min_warm": self.min_warm,
+                "max_idle": self.max_idle,
+                "groups": groups,
+                "counters": dict(self._counters),
+                "time_to_ready_ms": {kind: _summary(values) for kind, values in self._ready.items()}
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            entries = [entry for idle in self._idle.values() for entry in idle]
+            self._idle.clear()
+        self._wake.set()
+        for entry in entries:
+            entry.close()
+
+    def _maintain(self):
+        while not self._closed:
+            self._wake.wait(self.keepalive_interval)
+            self._wake.clear()
+            if self._closed:
+                break
+            try:
+                self._tick()
+            except Exception as e:
+                print(f"识别器连接池维护失败: {e}")
+
+    def _tick(self):
+        now = time.monotonic()
+        to_close = []
+        with self._lock:
+            # 闲置过久的分组不再预热
+            for key, last_used in list(self._demand.items()):
+                if last_used is not None and now - last_used > self.idle_timeout:
+                    del self._demand[key]
+            for key in list(self._idle):
+                idle = self._idle[key]
+                if key not in self._demand:
+                    to_close.extend(idle)
+                    idle.clear()
+                else:
+                    stale = [entry for entry in idle if now - entry.created_at > self.idle_timeout]
+                    for entry in stale:
+                        idle.remove(entry)
+                    to_close.extend(stale)
+                    self._counters["recycled"] += len(stale)
+                if not idle:
+                    del self._idle[key]
+            # 保活在锁外进行，期间标记为忙碌，acquire 不会取走
+            entries = [entry for idle in self._idle.values() for entry in idle]
+            for entry in entries:
+                entry.busy = True
+
+        for entry in to_close:
+            entry.close()
+
+        # 保活兼健康检查
+        for entry in entries:
+            healthy = entry.keepalive(self.keepalive_frame, self.keepalive_ms)
+            with self._lock:
+                entry.busy = False
+                if healthy:
+                    continue
+                idle = self._idle.get(entry.key)
+                if idle is None or entry not in idle:
+                    # 已被 close() 移出连接池并关闭
+                    continue
+                idle.remove(entry)
+                self._counters["health_failures"] += 1
+            entry.close()
+
+        # 补足每个分组的预热数量，总数不超过 max_idle
+        with self._lock:
+            total = sum(len(idle) for idle in self._idle.values()) + sum(self._starting.values())
+            launches = []
+            for key in self._demand:
+                shortfall = self.min_warm - len(self._idle.get(key, ())) - self._starting.get(key, 0)
+                while shortfall > 0 and total < self.max_idle:
+                    launches.append(key)
+                    self._starting[key] = self._starting.get(key, 0) + 1
+                    shortfall -= 1
+                    total += 1
+        for key in launches:
+            threading.Thread(target=self._warm_one, args=(key,), daemon=True).start()
+
+    def _warm_one(self, key):
+        started = time.monotonic()
+        entry = None
+        try:
+            recognizer, callback, probe_ms = self._opener(key)
+            entry = PooledRecognizer(key, recognizer, callback, time.monotonic() - started, probe_ms)
+        except Exception as e:
+            print(f"预热识别器失败: {e}")
+        with self._lock:
+            self._starting[key] -= 1
+            if not self._starting[key]:
+                del self._starting[key]
+            if entry is None:
+                self._counters["start_failures"] += 1
+            elif not self._closed and key in self._demand:
+                self._idle.setdefault(key, deque()).append(entry)
+                self._counters["started"] += 1
+                entry = None
+        if entry is not None:
+            entry.close()
+
+
+def _open_recognizer(key):
+    # 建立连接，返回 (识别器, 回调, 已发送的音频毫秒数)；连接随后失败时由保活的健康检查发现并丢弃
+    api_key, source_language, targets, format, sample_rate = key
+    callback = TranslatorCallback()
+    recognizer = start_recognizer(callback, source_language, list(targets), format, sample_rate, api_key=api_key)
+    if callback.error:
+        try:
+            recognizer.stop()
+        except Exception:
+            pass
+        raise RuntimeError(callback.error)
+    return recognizer, callback, 0
+
+
+def _summary(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    count = len(ordered)
+    return {
+        "count": count,
+        "mean": round(sum(ordered) / count * 1000, 1),
+        "p50": round(ordered[count // 2] * 1000, 1),
+        "p95": round(ordered[min(count - 1, int(count * 0.95))] * 1000, 1),
+        "max": round(ordered[-1] * 1000, 1)
+    }
@@ -0,0 +1,286 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# 缓存结果的识别方式：plain 为一个识别会话处理整个文件，long 为长音频模式切分后并发识别，两者结果不通用
+MODE_PLAIN = "plain"
+MODE_LONG = "long"
+
+
+def hash_file(path, block_size=1024 * 1024):
+    """音频内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TieredStore:
+    """内存 LRU + 磁盘两级键值存储，值为可 JSON 序列化的对象
+
+    内存层最多保存 memory_entries 项；磁盘层按文件总大小淘汰最久未访问的项，上限 disk_bytes。
+    """
+
+    def __init__(self, directory, memory_entries=256, disk_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()   # 文件名 -> 大小，按访问顺序排列
+        self._disk_total = 0
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return self._memory[key]
+            name = self._name(key)
+            if name not in self._disk:
+                self.counters["misses"] += 1
+                return None
+            self._disk.move_to_end(name)
+
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._forget(name)
+                self.counters["misses"] += 1
+            return None
+
+        with self._lock:
+            self.counters["disk_hits"] += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._remember(key, value)
+            self._forget(name)
+            self._disk[name] = len(data)
+            self._disk_total += len(data)
+            victims = []
+            while self._disk_total > self.disk_bytes and len(self._disk) > 1:
+                victim, size = self._disk.popitem(last=False)
+                self._disk_total -= size
+                self.counters["evictions"] += 1
+                victims.append(victim)
+        for victim in victims:
+            try:
+                os.remove(os.path.join(self.directory, victim))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, memory_entries=len(self._memory),
+                        disk_entries=len(self._disk), disk_bytes=self._disk_total)
+
+    def _remember(self, key, value):
+        # 调用方需持有锁
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _forget(self, name):
+        # 调用方需持有锁
+        size = self._disk.pop(name, None)
+        if size is not None:
+            self._disk_total -= size
+
+    def _scan(self):
+        # 启动时按修改时间恢复磁盘层的访问顺序
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.tmp'):
+                os.remove(path)
+                continue
+            if name.endswith('.json'):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._disk[name] = size
+            self._disk_total += size
+
+    @staticmethod
+    def _name(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json'
+
+
+class _Flight:
+    """一次进行中的上游翻译调用，相同内容的并发请求等待它的结果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.values = {}
+        self.error = None
+
+
+class ResultCache:
+    """按音频内容寻址的文件翻译结果缓存
+
+    识别结果按（识别方式，音频哈希，源语言）缓存，每种目标语言的翻译按（识别方式，音频哈希，源语言，目标语言）
+    单独缓存，因此增加一种目标语言时只需向上游请求缺失的语言。相同内容、相同语言的并发请求合并为一次上游调用。
+    只缓存专用识别器（call_sync、长音频模式或流式翻译）对整个文件的结果，不缓存实时会话中混入其他音频的结果。
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.counters = {"full_hits": 0, "partial_hits": 0, "fetches": 0, "collapsed": 0}
+
+    def lookup(self, audio_hash, source_language, target_languages, mode=MODE_PLAIN):
+        """全部命中时返回合并后的结果，否则返回 None"""
+        values, missing = self._read(audio_hash, source_language, target_languages, mode)
+        if missing:
+            return None
+        with self._lock:
+            self.counters["full_hits"] += 1
+        return self._merge(values, audio_hash, source_language, target_languages, mode, None)
+
+    def translate(self, audio_hash, source_language, target_languages, fetch, mode=MODE_PLAIN):
+        """返回与 call_sync 相同结构的结果，缺失部分调用 fetch(languages) 获取
+
+        fetch 返回 call_sync 结构的结果；只有识别结果缺失时以第一个目标语言调用 fetch。
+        """
+        values, missing = self._read(audio_hash, source_language, target_languages, mode)
+        if not missing:
+            with self._lock:
+                self.counters["full_hits"] += 1
+            return self._merge(values, audio_hash, source_language, target_languages, mode, None)
+
+        with self._lock:
+            waiting = {key: self._flights[key] for key in missing if key in self._flights}
+            own = [key for key in missing if key not in self._flights]
+            flight = None
+            if own:
+                flight = _Flight()
+                for key in own:
+                    self._flights[key] = flight
+                self.counters["fetches"] += 1
+                if len(missing) < len(target_languages) + 1:
+                    self.counters["partial_hits"] += 1
+            if waiting:
+                self.counters["collapsed"] += 1
+
+        request_id = None
+        if flight is not None:
+            lang_keys = {self._lang_key(mode, audio_hash, source_language, lang): lang for lang in target_languages}
+            languages = [lang_keys[key] for key in own if key in lang_keys] or list(target_languages[:1])
+            try:
+                result = fetch(languages)
+                if result.get("success"):
+                    request_id = result.get("request_id")
+                    # 已缓存的识别结果保持不变，只补充缺失的部分
+                    with_text = self._text_key(mode, audio_hash, source_language) in own
+                    flight.values = self._store(audio_hash, source_language, languages, result, mode, with_text)
+                else:
+                    flight.error = result
+            except Exception as e:
+                flight.error = {"success": False, "error": str(e)}
+            finally:
+                with self._lock:
+                    for key in own:
+                        if self._flights.get(key) is flight:
+                            del self._flights[key]
+                flight.done.set()
+            if flight.error:
+                return flight.error
+            values.update(flight.values)
+
+        for key, other in waiting.items():
+            other.done.wait()
+            if other.error:
+                return other.error
+            values[key] = other.values.get(key)
+
+        return self._merge(values, audio_hash, source_language, target_languages, mode, request_id)
+
+    def save(self, audio_hash, source_language, result, mode=MODE_PLAIN):
+        """写入一次完整翻译的结果（call_sync 结构）"""
+        self._store(audio_hash, source_language, list(result.get("translations", {})), result, mode)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return dict(counters, store=self.store.stats())
+
+    def _read(self, audio_hash, source_language, target_languages, mode):
+        values = {}
+        missing = []
+        keys = [self._text_key(mode, audio_hash, source_language)]
+        keys += [self._lang_key(mode, audio_hash, source_language, lang) for lang in target_languages]
+        for key in keys:
+            value = self.store.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                values[key] = value
+        return values, missing
+
+    def _store(self, audio_hash, source_language, languages, result, mode, with_text=True):
+        values = {}
+        if with_text:
+            transcription = {"transcriptions": result.get("transcriptions", [])}
+            if "timestamps" in result:
+                transcription["timestamps"] = result["timestamps"]
+            values[self._text_key(mode, audio_hash, source_language)] = transcription
+        translations = result.get("translations", {})
+        for lang in languages:
+            values[self._lang_key(mode, audio_hash, source_language, lang)] = translations.get(lang, [])
+        for key, value in values.items():
+            try:
+                self.store.put(key, value)
+            except OSError as e:
+                print(f"写入结果缓存失败: {e}")
+        return values
+
+    def _merge(self, values, audio_hash, source_language, target_languages, mode, request_id):
+        transcription = values[self._text_key(mode, audio_hash, source_language)]
+        result = {
+            "success": True,
+            "request_id": request_id,
+            "transcriptions": transcription["transcriptions"],
+            "translations": {
+                lang: values[self._lang_key(mode, audio_hash, source_language, lang)] for lang in target_languages
+            },
+            "cached": request_id is None
+        }
+        if "timestamps" in transcription:
+            result["timestamps"] = transcription["timestamps"]
+        return result
+
+    @staticmethod
+    def _text_key(mode, audio_hash, source_language):
+        return f"transcription:{mode}:{audio_hash}:{source_language}"
+
+    @staticmethod
+    def _lang_key(mode, audio_hash, source_language, lang):
+        return f"translation:{mode}:{audio_hash}:{source_language}:{lang}"
+
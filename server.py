@@ -0,0 +1,243 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import ClientError, ClientSession, WSMsgType, web
+
+import app as flask_app
+from config import Config
+from protocol import subprotocols
+
+
+class WebSocketAdapter:
+    """把 aiohttp 的 WebSocketResponse 包装成 websocket_handler 使用的 websockets 接口"""
+
+    def __init__(self, ws):
+        self._ws = ws
+
+    @property
+    def subprotocol(self):
+        """握手时协商出的子协议，没有时为 None"""
+        return self._ws.ws_protocol
+
+    async def send(self, message):
+        if isinstance(message, bytes):
+            await self._ws.send_bytes(message)
+        else:
+            await self._ws.send_str(message)
+
+    async def close(self, code=1000, reason=""):
+        await self._ws.close(code=code, message=reason.encode('utf-8'))
+
+    def __aiter__(self):
+        return self._messages()
+
+    async def _messages(self):
+        async for msg in self._ws:
+            if msg.type in (WSMsgType.TEXT, WSMsgType.BINARY):
+                yield msg.data
+            elif msg.type == WSMsgType.ERROR:
+                break
+
+
+class _BodyReader:
+    """WSGI 的 wsgi.input：在线程池中按需从 aiohttp 请求流读取，不把请求体整个读入内存"""
+
+    def __init__(self, content, loop):
+        self._content = content
+        self._loop = loop
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self._run(self._content.read())
+        return self._run(self._content.read(size))
+
+    def readline(self, size=-1):
+        line = self._run(self._content.readline())
+        return line if size is None or size < 0 else line[:size]
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+
+class WsgiBridge:
+    """在有界线程池中运行 Flask（WSGI）应用，响应体按块流式返回
+
+    流式响应（如逐句返回的文件翻译）每取一块都可能阻塞较长时间，因此在单独的 stream_executor 中迭代响应体，
+    长时间的流式请求不会占满 executor，不影响其他路由及 WebSocket 处理中的阻塞调用。
+    """
+
+    def __init__(self, wsgi_app, executor, stream_executor=None):
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+        self.stream_executor = stream_executor or executor
+
+    async def handle(self, request):
+        """aiohttp 的请求处理协程"""
+        loop = asyncio.get_running_loop()
+        environ = self._environ(request, loop)
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = status
+            started["headers"] = headers
+            return lambda data: None
+
+        def call_app():
+            result = self.wsgi_app(environ, start_response)
+            return result, iter(result)
+
+        result, body = await loop.run_in_executor(self.executor, call_app)
+        try:
+            first = await loop.run_in_executor(self.stream_executor, next, body, None)
+            status, _, reason = started["status"].partition(' ')
+            response = web.StreamResponse(status=int(status), reason=reason or None)
+            for name, value in started["headers"]:
+                response.headers.add(name, value)
+            await response.prepare(request)
+            chunk = first
+            while chunk is not None:
+                if chunk:
+                    await response.write(chunk)
+                chunk = await loop.run_in_executor(self.stream_executor, next, body, None)
+            await response.write_eof()
+            return response
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                await loop.run_in_executor(self.executor, close)
+
+    @staticmethod
+    def _environ(request, loop):
+        host, _, port = (request.host or "localhost").partition(':')
+        environ = {
+            "REQUEST_METHOD": request.method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": request.path,
+            "QUERY_STRING": request.query_string,
+            "SERVER_NAME": host,
+            "SERVER_PORT": port or ("443" if request.secure else "80"),
+            "SERVER_PROTOCOL": f"HTTP/{request.version.major}.{request.version.minor}",
+            "REMOTE_ADDR": request.remote or "",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": request.scheme,
+            "wsgi.input": _BodyReader(request.content, loop),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in request.headers.items():
+            key = name.upper().replace('-', '_')
+            if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                environ[key] = value
+            else:
+                key = "HTTP_" + key
+                if key not in environ:
+                    environ[key] = value
+                else:
+                    # 重复的请求头按 RFC 7230 以逗号合并；Cookie 的分隔符是分号（RFC 6265）
+                    separator = "; " if key == "HTTP_COOKIE" else ","
+                    environ[key] = f"{environ[key]}{separator}{value}"
+        return environ
+
+
+async def proxy_websocket(ws, owner, path_qs):
+    """会话由其他 worker 持有时，把客户端连接双向转发到该 worker 的 /ws/<session_id>"""
+    url = owner.address.replace('http', 'ws', 1) + path_qs
+    async with ClientSession() as client:
+        try:
+            upstream = await client.ws_connect(
+                url, headers={flask_app.FORWARDED_HEADER: flask_app.worker.worker_id},
+                protocols=(ws.ws_protocol,) if ws.ws_protocol else (),
+                heartbeat=30, max_msg_size=4 * 1024 * 1024
+            )
+        except (ClientError, OSError) as e:
+            print(f"连接会话所在的服务进程 {owner.worker_id} 失败: {e}")
+            await ws.close(code=1011, message="会话所在的服务进程不可用".encode('utf-8'))
+            return
+
+        async def pump(source, target):
+            async for msg in source:
+                if msg.type == WSMsgType.TEXT:
+                    await target.send_str(msg.data)
+                elif msg.type == WSMsgType.BINARY:
+                    await target.send_bytes(msg.data)
+                elif msg.type == WSMsgType.ERROR:
+                    break
+
+        tasks = [asyncio.create_task(pump(ws, upstream)), asyncio.create_task(pump(upstream, ws))]
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in tasks:
+            task.cancel()
+        if not ws.closed:
+            await ws.close(code=upstream.close_code or 1000)
+        await upstream.close()
+
+
+async def serve_websocket(request, key, find_owner, handler):
+    """建立 WebSocket 连接；key 由其他 worker 持有时代理到该 worker，否则交给本进程的 handler"""
+    ws = web.WebSocketResponse(heartbeat=30, max_msg_size=4 * 1024 * 1024, protocols=subprotocols())
+    await ws.prepare(request)
+    owner = None
+    if not request.headers.get(flask_app.FORWARDED_HEADER):
+        owner = await asyncio.get_running_loop().run_in_executor(None, find_owner, key)
+    if owner is not None:
+        await proxy_websocket(ws, owner, request.path_qs)
+        return ws
+    await handler(WebSocketAdapter(ws), request.path_qs)
+    if not ws.closed:
+        await ws.close()
+    return ws
+
+
+async def websocket_endpoint(request):
+    return await serve_websocket(
+        request, request.match_info['session_id'], flask_app.remote_owner, flask_app.websocket_handler
+    )
+
+
+async def listener_endpoint(request):
+    return await serve_websocket(
+        request, request.match_info['listen_id'], flask_app.remote_listen_owner, flask_app.listener_handler
+    )
+
+
+def create_app(executor=None, stream_executor=None):
+    """在同一个事件循环和端口上提供 REST 接口、/ws/<session_id> 及听众连接 /ws/listen/<listen_id>"""
+    executor = executor or ThreadPoolExecutor(
+        max_workers=Config.SERVER_EXECUTOR_WORKERS, thread_name_prefix="blocking"
+    )
+    stream_executor = stream_executor or ThreadPoolExecutor(
+        max_workers=Config.SERVER_STREAM_WORKERS, thread_name_prefix="wsgi-stream"
+    )
+    # WebSocket 与 HTTP 共用端口，生成的 WebSocket 地址不再带独立端口
+    flask_app.websocket_port = None
+
+    async def on_startup(application):
+        # websocket_handler 中 run_in_executor(None, ...) 的阻塞调用也使用同一个有界线程池
+        asyncio.get_running_loop().set_default_executor(executor)
+
+    async def on_cleanup(application):
+        executor.shutdown(wait=False)
+        stream_executor.shutdown(wait=False)
+
+    application = web.Application()
+    application.router.add_get('/ws/listen/{listen_id}', listener_endpoint)
+    application.router.add_get('/ws/{session_id}', websocket_endpoint)
+    application.router.add_route('*', '/{path_info:.*}', WsgiBridge(flask_app.app, executor, stream_executor).handle)
+    application.on_startup.append(on_startup)
+    application.on_cleanup.append(on_cleanup)
+    return application
+
+
+if __name__ == '__main__':
+    print(f"服务已启动在 http://{Config.SERVER_HOST}:{Config.SERVER_PORT}（HTTP 与 WebSocket 共用端口）")
+    web.run_app(create_app(), host=Config.SERVER_HOST, port=Config.SERVER_PORT, print=None)
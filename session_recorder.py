@@ -0,0 +1,262 @@
+import bisect
+import json
+import struct
+import threading
+import time
+from types import SimpleNamespace
+
+# 日志文件头及记录类型
+MAGIC = b"SIREC1\n"
+RECORD_META = 0
+RECORD_AUDIO = 1
+RECORD_EVENT = 2
+RECORD_ERROR = 3
+RECORD_COMPLETE = 4
+
+# 记录头：类型（1 字节）、相对录制开始的单调时钟秒数（double）、数据长度（uint32），小端
+_HEADER = struct.Struct("<BdI")
+
+
+class SessionRecorder:
+    """把会话发送给识别器的音频帧和识别器返回的事件写入只追加的二进制日志
+
+    音频以原始 PCM 保存，事件以 JSON 保存；时间戳为相对录制开始的 time.monotonic() 秒数。
+    事件中的音频时间已减去会话交接前的保活音频（audio_offset_ms），与日志中的音频对齐。
+    """
+
+    def __init__(self, path, meta=None):
+        self.path = path
+        self._file = open(path, "ab", buffering=64 * 1024)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._closed = False
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._write(RECORD_META, json.dumps(dict(meta or {}, started_at=time.time())).encode('utf-8'))
+
+    def audio(self, data):
+        self._write(RECORD_AUDIO, bytes(data))
+
+    def event(self, request_id, transcription_result, translation_result, audio_offset_ms=0):
+        payload = {
+            "request_id": request_id,
+            "transcription": _sentence_dict(transcription_result, audio_offset_ms),
+            "translations": None
+        }
+        if translation_result is not None:
+            payload["translations"] = {
+                lang: _sentence_dict(translation_result.get_translation(lang), audio_offset_ms)
+                for lang in translation_result.get_language_list()
+            }
+        self._write(RECORD_EVENT, json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+    def error(self, message):
+        self._write(RECORD_ERROR, str(message).encode('utf-8'))
+
+    def complete(self):
+        self._write(RECORD_COMPLETE, b"")
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._file.close()
+
+    def _write(self, kind, payload):
+        header = _HEADER.pack(kind, time.monotonic() - self._started, len(payload))
+        with self._lock:
+            if self._closed:
+                return
+            self._file.write(header)
+            self._file.write(payload)
+
+
+def _sentence_dict(result, audio_offset_ms):
+    if result is None:
+        return None
+    data = {
+        "sentence_id": result.sentence_id,
+        "text": result.text,
+        "is_sentence_end": result.is_sentence_end
+    }
+    for name in ("begin_time", "end_time"):
+        value = getattr(result, name, None)
+        data[name] = value - audio_offset_ms if value is not None else None
+    stash = getattr(result, 'stash', None)
+    if stash is not None:
+        data["stash"] = {"text": stash.text}
+    return data
+
+
+def read_log(path):
+    """逐条读取日志，产出 (类型, 时间戳, 数据)；音频为 bytes，事件和元数据为 dict，错误为 str
+
+    一个文件中可以有多次录制（每次以元数据记录开始）；末尾写了一半的记录被忽略。
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"不是会话录制文件: {path}")
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            kind, timestamp, length = _HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            if kind in (RECORD_META, RECORD_EVENT):
+                payload = json.loads(payload.decode('utf-8'))
+            elif kind == RECORD_ERROR:
+                payload = payload.decode('utf-8')
+            yield kind, timestamp, payload
+
+
+class ReplayScript:
+    """一次录制的内容：音频帧列表和事件列表
+
+    每个事件记下它之前已发送的音频字节数及距离最后一帧音频的时间，
+    回放时在假识别器收到同样多的音频后，经过同样的间隔再产出该事件。
+    """
+
+    def __init__(self, meta, frames, events):
+        self.meta = meta
+        self.frames = frames    # [(时间戳, bytes)]
+        self.events = events    # [(时间戳, 之前的音频字节数, 距最后一帧音频的秒数, 类型, 数据)]
+
+    @property
+    def duration(self):
+        times = [t for t, _ in self.frames] + [event[0] for event in self.events]
+        return max(times) if times else 0.0
+
+    @classmethod
+    def load(cls, path, index=0):
+        """读取文件中第 index 次录制"""
+        recordings = -1
+        meta, frames, events = {}, [], []
+        audio_bytes = 0
+        last_audio_at = 0.0
+        for kind, timestamp, payload in read_log(path):
+            if kind == RECORD_META:
+                recordings += 1
+                if recordings > index:
+                    break
+                meta = payload
+                continue
+            if recordings != index:
+                continue
+            if kind == RECORD_AUDIO:
+                frames.append((timestamp, payload))
+                audio_bytes += len(payload)
+                last_audio_at = timestamp
+            else:
+                events.append((timestamp, audio_bytes, max(timestamp - last_audio_at, 0.0), kind, payload))
+        if recordings < index:
+            raise ValueError(f"录制文件中没有第 {index} 次录制: {path}")
+        return cls(meta, frames, events)
+
+
+class _ReplayTranslation:
+    """模拟 TranslationResult 的 get_language_list / get_translation"""
+
+    def __init__(self, translations):
+        self._translations = {lang: _namespace(value) for lang, value in translations.items()}
+
+    def get_language_list(self):
+        return list(self._translations)
+
+    def get_translation(self, lang):
+        return self._translations.get(lang)
+
+
+def _namespace(data):
+    if data is None:
+        return None
+    data = dict(data)
+    data["stash"] = SimpleNamespace(**data["stash"]) if data.get("stash") else None
+    return SimpleNamespace(**data)
+
+
+class ReplayRecognizer:
+    """按录制日志回放事件的假识别器，接口与 TranslationRecognizerRealtime 的 start/send_audio_frame/stop 相同
+
+    pace="audio" 时每个事件要等收到录制时它之前的音频量，再经过录制时的间隔才产出，
+    从而复现识别服务的处理延迟；pace="clock" 时按录制时间表产出，不依赖是否收到音频。
+    speed 为回放倍速。
+    """
+
+    def __init__(self, script, callback, speed=1.0, pace="audio"):
+        self.script = script
+        self.callback = callback
+        self.speed = speed
+        self.pace = pace
+        self.received_bytes = 0
+        self._cond = threading.Condition()
+        self._received = []      # 每帧收到后的累计字节数
+        self._received_at = []   # 对应的收到时间
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="replay-recognizer")
+        self._thread.daemon = True
+        self._thread.start()
+        self.callback.on_open()
+
+    def send_audio_frame(self, data):
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("识别器已停止")
+            self.received_bytes += len(data)
+            self._received.append(self.received_bytes)
+            self._received_at.append(time.monotonic())
+            self._cond.notify_all()
+
+    def stop(self):
+        with self._cond:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.callback.on_close()
+
+    def _due(self, event):
+        # 调用方需持有锁；返回事件应产出的时间，所需音频尚未收到时返回 None
+        timestamp, audio_bytes, since_audio, _, _ = event
+        if self.pace == "clock" or audio_bytes == 0:
+            return self._started + timestamp / self.speed
+        index = bisect.bisect_left(self._received, audio_bytes)
+        if index >= len(self._received):
+            return None
+        return self._received_at[index] + since_audio / self.speed
+
+    def _run(self):
+        for event in self.script.events:
+            with self._cond:
+                while not self._stopped:
+                    due = self._due(event)
+                    delay = None if due is None else due - time.monotonic()
+                    if delay is not None and delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                if self._stopped:
+                    return
+            _, _, _, kind, payload = event
+            try:
+                if kind == RECORD_EVENT:
+                    translations = payload.get("translations")
+                    self.callback.on_event(
+                        payload.get("request_id"),
+                        _namespace(payload.get("transcription")),
+                        _ReplayTranslation(translations) if translations is not None else None,
+                        None
+                    )
+                elif kind == RECORD_ERROR:
+                    self.callback.on_error(payload)
+                elif kind == RECORD_COMPLETE:
+                    self.callback.on_complete()
+            except Exception as e:
+                print(f"回放事件失败: {e}")
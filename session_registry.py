@@ -0,0 +1,193 @@
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+
+
+class WorkerInfo:
+    """服务进程（worker）的标识及其供其他 worker 转发请求的地址"""
+
+    def __init__(self, worker_id, address):
+        self.worker_id = worker_id
+        self.address = address.rstrip('/')
+
+    def to_dict(self):
+        return {"worker_id": self.worker_id, "address": self.address}
+
+
+class SessionRegistry(ABC):
+    """会话归属登记：记录每个会话（以及属于会话的上传、文件任务）由哪个 worker 持有
+
+    键为会话ID、上传ID或任务ID，session_id 指明该键属于哪个会话，会话结束时一并注销。
+    worker 定期 heartbeat()，超过 worker_ttl 秒没有心跳的 worker 视为已下线，其会话不再可用。
+    网络存储（如 Redis）的后端继承本类并实现各抽象方法即可接入。
+    """
+
+    # 是否跨进程共享；仅进程内登记时无需转发
+    shared = False
+
+    @abstractmethod
+    def register(self, key, worker, session_id=None):
+        """登记键由 worker 持有"""
+
+    @abstractmethod
+    def owner(self, key):
+        """返回持有该键的在线 worker（WorkerInfo），不存在或已下线时返回 None"""
+
+    @abstractmethod
+    def unregister(self, session_id):
+        """注销会话及属于它的所有键"""
+
+    @abstractmethod
+    def heartbeat(self, worker):
+        """记录 worker 仍在线"""
+
+    @abstractmethod
+    def stats(self):
+        """返回登记的统计信息"""
+
+    def start_heartbeat(self, worker, interval=10.0):
+        """在后台线程中定期发送心跳"""
+        def beat():
+            while True:
+                try:
+                    self.heartbeat(worker)
+                except Exception as e:
+                    print(f"会话登记心跳失败: {e}")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=beat, name="session-registry-heartbeat")
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+class InProcessRegistry(SessionRegistry):
+    """进程内登记，单进程运行时使用"""
+
+    def __init__(self):
+        self._entries = {}   # key -> (WorkerInfo, session_id)
+        self._lock = threading.Lock()
+
+    def register(self, key, worker, session_id=None):
+        with self._lock:
+            self._entries[key] = (worker, session_id or key)
+
+    def owner(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def unregister(self, session_id):
+        with self._lock:
+            for key in [key for key, (_, owner_session) in self._entries.items() if owner_session == session_id]:
+                del self._entries[key]
+
+    def heartbeat(self, worker):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries)}
+
+
+class SqliteSessionRegistry(SessionRegistry):
+    """基于 SQLite 文件的共享登记，同一台机器上的多个 worker 共用一个数据库文件"""
+
+    shared = True
+
+    def __init__(self, path, worker_ttl=30.0):
+        self.path = path
+        self.worker_ttl = worker_ttl
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS workers ("
+                "worker_id TEXT PRIMARY KEY, address TEXT NOT NULL, heartbeat_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, session_id TEXT NOT NULL, worker_id TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_session ON entries (session_id)")
+
+    def register(self, key, worker, session_id=None):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, address, heartbeat_at) VALUES (?, ?, ?)",
+                (worker.worker_id, worker.address, now)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, session_id, worker_id, created_at) VALUES (?, ?, ?, ?)",
+                (key, session_id or key, worker.worker_id, now)
+            )
+
+    def owner(self, key):
+        row = self._conn().execute(
+            "SELECT w.worker_id, w.address FROM entries e JOIN workers w ON e.worker_id = w.worker_id "
+            "WHERE e.key = ? AND w.heartbeat_at > ?",
+            (key, time.time() - self.worker_ttl)
+        ).fetchone()
+        return WorkerInfo(row[0], row[1]) if row else None
+
+    def unregister(self, session_id):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM entries WHERE session_id = ?", (session_id,))
+
+    def heartbeat(self, worker):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, address, heartbeat_at) VALUES (?, ?, ?)",
+                (worker.worker_id, worker.address, now)
+            )
+            # 清理下线已久的 worker 留下的登记
+            expired = now - self.worker_ttl * 10
+            conn.execute(
+                "DELETE FROM entries WHERE worker_id IN (SELECT worker_id FROM workers WHERE heartbeat_at < ?)",
+                (expired,)
+            )
+            conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (expired,))
+
+    def stats(self):
+        conn = self._conn()
+        alive = time.time() - self.worker_ttl
+        workers = conn.execute(
+            "SELECT w.worker_id, w.address, w.heartbeat_at > ?, COUNT(e.key) FROM workers w "
+            "LEFT JOIN entries e ON e.worker_id = w.worker_id GROUP BY w.worker_id",
+            (alive,)
+        ).fetchall()
+        return {
+            "backend": "sqlite",
+            "workers": [
+                {"worker_id": worker_id, "address": address, "alive": bool(is_alive), "entries": entries}
+                for worker_id, address, is_alive, entries in workers
+            ]
+        }
+
+    def _conn(self):
+        # sqlite3 连接不能跨线程使用，每个线程各自打开一个
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            self._local.conn = conn
+        return conn
+
+
+def create_registry(url, worker_ttl=30.0):
+    """按配置创建会话登记：memory 或 sqlite:///路径
+
+    与 SQLAlchemy 的写法一致：sqlite:///sessions.db 为相对当前目录的路径，sqlite:////var/lib/sessions.db 为绝对路径
+    """
+    if not url or url == "memory":
+        return InProcessRegistry()
+    if url.startswith("sqlite:"):
+        if not url.startswith("sqlite:///") or len(url) == len("sqlite:///"):
+            raise ValueError(f"SQLite 会话登记的地址应为 sqlite:///路径: {url}")
+        return SqliteSessionRegistry(url[len("sqlite:///"):], worker_ttl=worker_ttl)
+    raise ValueError(f"不支持的会话登记后端: {url}")
@@ -9,12 +9,15 @@ document.addEventListener('DOMContentLoaded', function() {
     const resumeBtn = document.getElementById('resumeBtn');
     const stopBtn = document.getElementById('stopBtn');
     const exportBtn = document.getElementById('exportBtn');
+    const exportFormatSelect = document.getElementById('exportFormat');
+    const exportLanguageSelect = document.getElementById('exportLanguage');
     const transcriptionResult = document.getElementById('transcriptionResult');
     const translationResults = document.getElementById('translationResults');
     const statusBadge = document.getElementById('statusBadge');
     const systemLog = document.getElementById('systemLog');
     const clearLogBtn = document.getElementById('clearLogBtn');
     const inputMicrophone = document.getElementById('inputMicrophone');
+    const inputBrowserMic = document.getElementById('inputBrowserMic');
     const inputFile = document.getElementById('inputFile');
     const fileUploadArea = document.getElementById('fileUploadArea');
     const audioFileInput = document.getElementById('audioFile');
@@ -22,8 +25,14 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // 翻译会话状态
     let sessionId = null;
+    let transcriptSessionId = null;  // 可导出、可分页读取转写记录的会话（停止后仍保留到下次开始）；服务器未保存转写记录时为 null
     let websocket = null;
+    let websocketUrl = null;   // 会话 WebSocket 地址，断线后用于重连
+    let lastSeq = 0;           // 已收到的最大消息序号，重连时服务器补发其后的消息
+    let reconnectTimer = null;
+    let reconnectAttempts = 0;
     let isPaused = false;
+    let audioCapture = null;
     let translationData = {
         transcription: [],
         translations: {}
@@ -59,6 +68,13 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
     
+    inputBrowserMic.addEventListener('change', function() {
+        if (this.checked) {
+            fileUploadArea.classList.add('d-none');
+            addLog('已选择浏览器麦克风输入模式', 'info');
+        }
+    });
+    
     inputFile.addEventListener('change', function() {
         if (this.checked) {
             fileUploadArea.classList.remove('d-none');
@@ -120,6 +136,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // 获取输入方式
         const useMicrophone = document.getElementById('inputMicrophone').checked;
+        const useBrowserMic = inputBrowserMic.checked;
         
         // 禁用开始按钮，防止重复点击
         startBtn.disabled = true;
@@ -144,7 +161,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 api_key: apiKey,  // 直接在请求中包含 API Key
                 source_language: sourceLanguage,
                 target_languages: targetLanguages,
-                use_microphone: useMicrophone
+                use_microphone: useMicrophone,
+                audio_source: useBrowserMic ? 'browser' : (useMicrophone ? 'microphone' : 'file')
             })
         })
         .then(response => {
@@ -159,8 +177,12 @@ document.addEventListener('DOMContentLoaded', function() {
             if (data.success) {
                 addLog('翻译已启动', 'success');
                 
-                // 保存会话ID
+                // 保存会话ID，清空上一个会话的结果
                 sessionId = data.session_id;
+                // 服务器未配置转写记录目录时不保存记录，导出由页面根据已收到的结果生成，且不丢弃旧句子
+                transcriptSessionId = data.transcript ? data.session_id : null;
+                resetTranslationData();
+                updateExportLanguages(targetLanguages);
                 
                 // 更新UI状态
                 startBtn.disabled = true;
@@ -170,12 +192,18 @@ document.addEventListener('DOMContentLoaded', function() {
                 statusBadge.textContent = '翻译中';
                 statusBadge.className = 'badge bg-success';
                 
-                if (useMicrophone) {
+                if (useMicrophone || useBrowserMic) {
                     statusBadge.classList.add('recording');
                 }
                 
-                // 连接WebSocket
-                connectWebSocket(data.websocket_url);
+                // 连接WebSocket（使用增量协议，减少长句中间结果的传输量）
+                lastSeq = 0;
+                connectWebSocket(`${data.websocket_url}?protocol=delta`);
+                
+                // 浏览器麦克风模式：采集音频并通过 WebSocket 上传
+                if (useBrowserMic) {
+                    startBrowserCapture();
+                }
                 
                 // 如果是文件输入模式，处理文件上传
                 if (!useMicrophone && document.getElementById('inputFile').checked) {
@@ -199,6 +227,9 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
+    // 超过该大小的文件使用分块上传
+    const LARGE_FILE_THRESHOLD = 20 * 1024 * 1024;
+    
     // 文件上传处理
     function uploadAudioFile(file, sessionId) {
         if (!file) {
@@ -228,6 +259,12 @@ document.addEventListener('DOMContentLoaded', function() {
             : `${(file.size / 1024).toFixed(2)} KB`;
         addLog(`文件大小: ${fileSizeDisplay}`, 'info');
         
+        // 大文件使用并行、可续传的分块上传
+        if (file.size > LARGE_FILE_THRESHOLD) {
+            uploadLargeFile(file, sessionId, { log: addLog }).catch(() => {});
+            return;
+        }
+        
         const formData = new FormData();
         formData.append('audio_file', file);
         formData.append('session_id', sessionId);
@@ -236,7 +273,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // 添加上传进度显示
         const xhr = new XMLHttpRequest();
-        xhr.open('POST', '/upload_audio', true);
+        xhr.open('POST', `/upload_audio?session_id=${encodeURIComponent(sessionId)}`, true);
         
         // 进度监听
         xhr.upload.onprogress = function(e) {
@@ -252,7 +289,7 @@ document.addEventListener('DOMContentLoaded', function() {
             if (xhr.status === 200) {
                 const response = JSON.parse(xhr.responseText);
                 if (response.success) {
-                    addLog('文件上传并处理成功', 'success');
+                    addLog(`文件上传成功，已加入处理队列 (任务: ${response.job_id})`, 'success');
                 } else {
                     addLog(`文件处理失败: ${response.message || '未知错误'}`, 'error');
                 }
@@ -346,7 +383,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 statusBadge.textContent = '翻译中';
                 statusBadge.className = 'badge bg-success';
                 
-                if (inputMicrophone.checked) {
+                if (inputMicrophone.checked || inputBrowserMic.checked) {
                     statusBadge.classList.add('recording');
                 }
                 
@@ -444,8 +481,26 @@ document.addEventListener('DOMContentLoaded', function() {
         stopTranslation();
     });
     
-    // 导出结果
+    // 导出结果：由服务器从转写记录流式生成文件（TXT 含全部语言，字幕格式为所选的一种语言）；
+    // 服务器没有保存转写记录时，导出页面上的结果（JSON）
     exportBtn.addEventListener('click', function() {
+        if (!transcriptSessionId) {
+            exportLocalResults();
+            return;
+        }
+        
+        const format = exportFormatSelect.value;
+        const params = new URLSearchParams({ format: format, language: exportLanguageSelect.value });
+        const downloadLink = document.createElement('a');
+        downloadLink.href = `/api/transcripts/${transcriptSessionId}/export?${params}`;
+        document.body.appendChild(downloadLink);
+        downloadLink.click();
+        document.body.removeChild(downloadLink);
+        
+        addLog(`正在导出翻译结果 (${format.toUpperCase()})`, 'success');
+    });
+    
+    function exportLocalResults() {
         if (Object.keys(translationData.translations).length === 0 && translationData.transcription.length === 0) {
             addLog('没有可导出的翻译结果', 'warning');
             return;
@@ -474,14 +529,84 @@ document.addEventListener('DOMContentLoaded', function() {
         document.body.appendChild(downloadLink);
         downloadLink.click();
         document.body.removeChild(downloadLink);
+        URL.revokeObjectURL(url);
         
+        if (exportFormatSelect.value !== 'json') {
+            addLog('服务器未保存转写记录，已导出页面上的结果 (JSON)', 'info');
+        }
         addLog('翻译结果已导出', 'success');
-    });
+    }
+    
+    // 字幕导出可选的语言：原文及本次会话的目标语言
+    function updateExportLanguages(targetLanguages) {
+        exportLanguageSelect.innerHTML = '<option value="source">原文</option>';
+        targetLanguages.forEach(lang => {
+            const option = document.createElement('option');
+            option.value = lang;
+            option.textContent = getLanguageName(lang);
+            exportLanguageSelect.appendChild(option);
+        });
+    }
+    
+    // 开始浏览器麦克风采集：AudioWorklet 降采样为 16kHz 16 位 PCM，以二进制帧发送
+    function startBrowserCapture() {
+        if (!navigator.mediaDevices || !window.AudioWorkletNode) {
+            addLog('当前浏览器不支持麦克风采集', 'error');
+            return;
+        }
+        
+        navigator.mediaDevices.getUserMedia({
+            audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true }
+        })
+        .then(mediaStream => {
+            let context;
+            try {
+                // 优先直接以 16kHz 采集，不支持时由 worklet 降采样
+                context = new AudioContext({ sampleRate: 16000 });
+            } catch (e) {
+                context = new AudioContext();
+            }
+            
+            return context.audioWorklet.addModule('/static/js/pcm-worklet.js').then(() => {
+                const source = context.createMediaStreamSource(mediaStream);
+                const node = new AudioWorkletNode(context, 'pcm-downsampler');
+                
+                node.port.onmessage = function(event) {
+                    if (!isPaused && websocket && websocket.readyState === WebSocket.OPEN) {
+                        websocket.send(event.data);
+                    }
+                };
+                source.connect(node);
+                // 连接到输出端以保证处理器被持续调度（处理器不产生输出，不会回放声音）
+                node.connect(context.destination);
+                
+                audioCapture = { context: context, stream: mediaStream, node: node };
+                addLog(`浏览器麦克风已开启 (采样率: ${context.sampleRate} Hz)`, 'success');
+            });
+        })
+        .catch(error => {
+            addLog(`开启浏览器麦克风失败: ${error.message}`, 'error');
+        });
+    }
+    
+    // 停止浏览器麦克风采集
+    function stopBrowserCapture() {
+        if (!audioCapture) return;
+        
+        audioCapture.node.port.onmessage = null;
+        audioCapture.stream.getTracks().forEach(track => track.stop());
+        audioCapture.context.close();
+        audioCapture = null;
+        addLog('浏览器麦克风已关闭', 'info');
+    }
     
     // 重置翻译会话状态
     function resetTranslationSession() {
         sessionId = null;
         isPaused = false;
+        clearTimeout(reconnectTimer);
+        reconnectTimer = null;
+        stopBrowserCapture();
         
         // 重置 UI
         startBtn.disabled = false;
@@ -489,7 +614,7 @@ document.addEventListener('DOMContentLoaded', function() {
         pauseBtn.disabled = true;
         resumeBtn.disabled = true;
         stopBtn.disabled = true;
-        exportBtn.disabled = true;
+        exportBtn.disabled = !transcriptSessionId && translationData.transcription.length === 0;
         
         statusBadge.textContent = '就绪';
         statusBadge.className = 'badge bg-light text-primary';
@@ -508,14 +633,19 @@ document.addEventListener('DOMContentLoaded', function() {
             transcription: [],
             translations: {}
         };
+        historyStart = 0;
         
-        // 清空结果显示
+        // 清空结果显示及视图索引
+        sentenceViews.clear();
         transcriptionResult.innerHTML = '';
         translationResults.innerHTML = '';
     }
     
-    // 连接 WebSocket
+    // 连接 WebSocket；带上已收到的最大序号，重连时服务器补发断线期间的消息
     function connectWebSocket(url) {
+        websocketUrl = url;
+        reconnectTimer = null;
+        url = `${url}${url.includes('?') ? '&' : '?'}last_seq=${lastSeq}`;
         console.log(`尝试连接 WebSocket: ${url}`);
         
         // 关闭现有连接
@@ -529,8 +659,10 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         
         try {
-            // 创建新连接
-            websocket = new WebSocket(url);
+            // 创建新连接；提议 MessagePack 子协议，服务器不支持时仍使用 JSON 文本帧
+            const socket = new WebSocket(url, [MSGPACK_SUBPROTOCOL]);
+            socket.binaryType = 'arraybuffer';
+            websocket = socket;
             
             websocket.onopen = function(event) {
                 console.log('WebSocket 连接已打开');
@@ -538,9 +670,11 @@ document.addEventListener('DOMContentLoaded', function() {
             };
             
             websocket.onmessage = function(event) {
-                console.log('收到 WebSocket 消息:', event.data);
                 try {
-                    const data = JSON.parse(event.data);
+                    const data = typeof event.data === 'string' ? JSON.parse(event.data) : decodeResultFrame(event.data);
+                    if (typeof data.seq === 'number' && data.seq > lastSeq) {
+                        lastSeq = data.seq;
+                    }
                     
                     // 处理错误
                     if (data.status === 'error') {
@@ -556,7 +690,14 @@ document.addEventListener('DOMContentLoaded', function() {
                     
                     // 处理连接状态
                     if (data.status === 'connected') {
-                        addLog('WebSocket 连接已确认', 'success');
+                        addLog(`WebSocket 连接已确认 (协议: ${data.protocol || 'full'}, 编码: ${data.encoding || 'json'})`, 'success');
+                        reconnectAttempts = 0;
+                        if (data.replayed) {
+                            addLog(`已补发断线期间的 ${data.replayed} 条消息`, 'info');
+                        }
+                        if (data.gap) {
+                            addLog('断线时间过长，部分结果已无法补发', 'warning');
+                        }
                         return;
                     }
                     
@@ -576,6 +717,19 @@ document.addEventListener('DOMContentLoaded', function() {
                         return;
                     }
                     
+                    // 会话因空闲、超过最长时间或断线过久被服务器回收
+                    if (data.status === 'expired') {
+                        addLog(`会话已被服务器结束 (原因: ${data.reason})`, 'warning');
+                        resetTranslationSession();
+                        return;
+                    }
+                    
+                    // 处理文件翻译任务状态
+                    if (data.status === 'job_update') {
+                        logJobUpdate(data.job);
+                        return;
+                    }
+                    
                     // 处理识别结果
                     if (data.transcription) {
                         updateTranscription(data.transcription);
@@ -596,7 +750,18 @@ document.addEventListener('DOMContentLoaded', function() {
             websocket.onclose = function(event) {
                 console.log('WebSocket 连接已关闭', event.code, event.reason);
                 addLog(`WebSocket 连接已关闭${event.code ? ` (代码: ${event.code})` : ''}`, 'info');
+                // 主动关闭或已被新连接替换时不重连
+                if (websocket !== socket) {
+                    return;
+                }
                 websocket = null;
+                // 会话仍在进行且不是无效会话（1008）时，按指数退避重连
+                if (sessionId && event.code !== 1008) {
+                    const delay = Math.min(1000 * 2 ** reconnectAttempts, 10000);
+                    reconnectAttempts++;
+                    addLog(`${delay / 1000} 秒后重新连接 WebSocket...`, 'warning');
+                    reconnectTimer = setTimeout(() => connectWebSocket(websocketUrl), delay);
+                }
             };
             
             websocket.onerror = function(event) {
@@ -609,82 +774,325 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
-    // 更新识别结果
-    function updateTranscription(result) {
-        if (!result) return;
-        
-        // 查找或创建当前句子
-        let currentSentence = translationData.transcription.find(s => s.sentence_id === result.sentence_id);
+    // 显示文件翻译任务的状态和进度
+    function logJobUpdate(job) {
+        const progress = job.progress;
+        if (job.status === 'running' && progress.total_seconds) {
+            const percent = Math.min(100, progress.sent_seconds / progress.total_seconds * 100);
+            addLog(`文件处理进度: ${progress.sent_seconds.toFixed(1)}/${progress.total_seconds.toFixed(1)} 秒 (${percent.toFixed(1)}%)`, 'info');
+        } else if (job.status === 'completed') {
+            addLog('文件处理完成', 'success');
+        } else if (job.status === 'failed') {
+            addLog(`文件处理失败: ${job.error || '未知错误'}`, 'error');
+        } else if (job.status === 'cancelled') {
+            addLog('文件处理任务已取消', 'warning');
+        } else {
+            addLog(`文件处理任务状态: ${job.status}`, 'info');
+        }
+    }
+    
+    // 还原句子文本：完整快照带 text，增量消息带 offset/append
+    // offset 按 Unicode 码点计算，与服务端 Python 字符串下标一致
+    function resolveText(previousText, result) {
+        if (typeof result.text === 'string') {
+            return result.text;
+        }
+        if (typeof result.offset !== 'number') {
+            return previousText;
+        }
+        const chars = Array.from(previousText);
+        if (result.offset === chars.length) {
+            return previousText + result.append;
+        }
+        return chars.slice(0, result.offset).join('') + result.append;
+    }
+    
+    // 句子列表视图
+    // 每个结果容器对应一个视图：sentence_id 通过 Map 索引，只原地更新变化的节点，
+    // DOM 写入合并到每个动画帧一次，长列表只渲染可见窗口（上下用占位元素撑开滚动高度）
+    const VIEW_OVERSCAN = 10;        // 可见区域上下额外渲染的句子数
+    const DEFAULT_ROW_HEIGHT = 40;   // 尚未测量时估计的句子高度（像素）
+    const sentenceViews = new Map(); // 容器元素 -> 视图
+    const scrollWatched = new WeakSet(); // 已注册滚动监听的容器，重置视图后不再重复注册
+    let renderScheduled = false;
+    
+    // 已结束的句子保存在服务器的转写记录中（/api/transcripts），页面只保留最近的句子，
+    // 滚动到顶部时按页加载更早的历史
+    const MAX_LOADED_SENTENCES = 300;  // 停留在底部时最多保留的句子数
+    const HISTORY_PAGE_SIZE = 100;     // 每次丢弃或加载的句子数
+    let historyStart = 0;              // 已加载的第一句在转写记录中的序号
+    let historyLoading = false;
+    
+    function getSentenceView(container, sentences) {
+        let view = sentenceViews.get(container);
+        if (!view) {
+            view = {
+                container: container,
+                sentences: sentences,   // 与 translationData 共用同一个数组
+                positions: new Map(),   // sentence_id -> 在 sentences 中的位置
+                nodes: new Map(),       // sentence_id -> 已渲染的 DOM 节点（仅可见窗口）
+                dirty: new Set(),       // 内容有变化、待更新的 sentence_id
+                topSpacer: document.createElement('div'),
+                bottomSpacer: document.createElement('div'),
+                rowHeight: DEFAULT_ROW_HEIGHT,
+                stickToBottom: true,
+                scrollAdjust: 0,        // 在开头插入历史后待补偿的滚动距离
+                needsLayout: true
+            };
+            if (!scrollWatched.has(container)) {
+                // 监听函数按容器查找当前的视图，resetTranslationData 清空视图后仍然有效
+                scrollWatched.add(container);
+                container.addEventListener('scroll', function() {
+                    const current = sentenceViews.get(container);
+                    if (!current) {
+                        return;
+                    }
+                    current.stickToBottom = container.scrollTop + container.clientHeight >= container.scrollHeight - 5;
+                    current.needsLayout = true;
+                    scheduleRender();
+                    if (container.scrollTop === 0) {
+                        loadHistory();
+                    }
+                });
+            }
+            sentenceViews.set(container, view);
+        }
+        return view;
+    }
+    
+    // 插入或更新一个句子，实际的 DOM 写入在下一个动画帧完成
+    function upsertSentence(view, result) {
+        const position = view.positions.get(result.sentence_id);
         
-        if (!currentSentence) {
-            currentSentence = {
+        if (position === undefined) {
+            view.positions.set(result.sentence_id, view.sentences.length);
+            view.sentences.push({
                 sentence_id: result.sentence_id,
-                text: result.text,
+                text: resolveText('', result),
                 is_complete: result.is_sentence_end
-            };
-            translationData.transcription.push(currentSentence);
+            });
+            view.needsLayout = true;
         } else {
-            currentSentence.text = result.text;
-            currentSentence.is_complete = result.is_sentence_end;
+            const sentence = view.sentences[position];
+            sentence.text = resolveText(sentence.text, result);
+            sentence.is_complete = result.is_sentence_end;
         }
         
-        // 更新显示
-        updateTranscriptionDisplay();
+        view.dirty.add(result.sentence_id);
+        scheduleRender();
     }
     
-    // 更新翻译结果
-    function updateTranslation(language, result) {
-        if (!result) return;
-        
-        // 确保语言存在
-        if (!translationData.translations[language]) {
-            translationData.translations[language] = [];
+    function reindexView(view) {
+        view.positions.clear();
+        view.sentences.forEach((sentence, i) => view.positions.set(sentence.sentence_id, i));
+        view.needsLayout = true;
+    }
+    
+    // 所有视图都停留在底部且句子过多时，丢弃最早的一页已结束的句子（可从服务器重新加载）；
+    // 服务器没有保存转写记录时丢弃的句子无法找回，全部保留
+    function trimHistory() {
+        if (!transcriptSessionId) return;
+        const sentences = translationData.transcription;
+        const views = Array.from(sentenceViews.values());
+        if (sentences.length < MAX_LOADED_SENTENCES + HISTORY_PAGE_SIZE || !views.every(view => view.stickToBottom)) {
+            return;
         }
+        const cutoff = sentences[HISTORY_PAGE_SIZE].sentence_id;
+        // 转写记录中每个已结束的句子一行
+        const trimmed = sentences.filter(sentence => sentence.sentence_id < cutoff && sentence.is_complete).length;
+        views.forEach(view => {
+            let count = 0;
+            while (count < view.sentences.length && view.sentences[count].sentence_id < cutoff) {
+                const node = view.nodes.get(view.sentences[count].sentence_id);
+                if (node) {
+                    node.remove();
+                    view.nodes.delete(view.sentences[count].sentence_id);
+                }
+                count++;
+            }
+            view.sentences.splice(0, count);
+            reindexView(view);
+        });
+        historyStart += trimmed;
+    }
+    
+    // 从服务器加载已丢弃的上一页句子，插入各视图开头并保持当前滚动位置
+    function loadHistory() {
+        if (historyLoading || historyStart === 0 || !transcriptSessionId) return;
+        historyLoading = true;
+        const start = Math.max(0, historyStart - HISTORY_PAGE_SIZE);
+        fetch(`/api/transcripts/${transcriptSessionId}?start=${start}&count=${historyStart - start}`)
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    throw new Error(data.message || '读取转写记录失败');
+                }
+                const page = part => data.sentences
+                    .filter(entry => part(entry))
+                    .map(entry => ({ sentence_id: entry.sentence_id, text: part(entry), is_complete: true }));
+                prependSentences(getSentenceView(transcriptionResult, translationData.transcription), page(entry => entry.transcription));
+                for (const lang in translationData.translations) {
+                    prependSentences(
+                        getSentenceView(getTranslationContainer(lang), translationData.translations[lang]),
+                        page(entry => (entry.translations || {})[lang])
+                    );
+                }
+                historyStart = start;
+                scheduleRender();
+            })
+            .catch(error => addLog(`加载历史记录失败: ${error.message}`, 'error'))
+            .finally(() => {
+                historyLoading = false;
+            });
+    }
+    
+    function prependSentences(view, sentences) {
+        if (sentences.length === 0) return;
+        view.sentences.unshift(...sentences);
+        reindexView(view);
+        view.stickToBottom = false;
+        view.scrollAdjust += sentences.length * view.rowHeight;
+    }
+    
+    function scheduleRender() {
+        if (renderScheduled) return;
+        renderScheduled = true;
+        requestAnimationFrame(flushRender);
+    }
+    
+    function flushRender() {
+        renderScheduled = false;
+        const pending = [];
+        sentenceViews.forEach(view => {
+            if (view.needsLayout || view.dirty.size > 0) {
+                pending.push(view);
+            }
+        });
         
-        // 查找或创建当前句子
-        let currentSentence = translationData.translations[language].find(s => s.sentence_id === result.sentence_id);
+        // 先集中读取布局，再集中写入，避免读写交替导致多次重排
+        pending.forEach(measureRowHeight);
+        pending.forEach(renderView);
+    }
+    
+    function measureRowHeight(view) {
+        if (view.nodes.size < 2 || view.topSpacer.parentNode !== view.container) return;
         
-        if (!currentSentence) {
-            currentSentence = {
-                sentence_id: result.sentence_id,
-                text: result.text,
-                is_complete: result.is_sentence_end
-            };
-            translationData.translations[language].push(currentSentence);
-        } else {
-            currentSentence.text = result.text;
-            currentSentence.is_complete = result.is_sentence_end;
+        const first = view.topSpacer.nextSibling;
+        const last = view.bottomSpacer.previousSibling;
+        const height = (last.offsetTop - first.offsetTop) / (view.nodes.size - 1);
+        if (height > 0) {
+            view.rowHeight = height;
         }
-        
-        // 更新显示
-        updateTranslationDisplay(language);
     }
     
-    // 更新识别结果显示
-    function updateTranscriptionDisplay() {
-        transcriptionResult.innerHTML = '';
+    function patchSentenceNode(node, sentence) {
+        node.className = sentence.is_complete ? 'sentence complete' : 'sentence current';
+        node.textContent = sentence.text;
+    }
+    
+    function renderView(view) {
+        const container = view.container;
         
-        translationData.transcription.forEach(sentence => {
-            const div = document.createElement('div');
-            div.className = 'sentence';
-            
-            if (sentence.is_complete) {
-                div.classList.add('complete');
-            } else {
-                div.classList.add('current');
+        // 容器被其他逻辑清空时重新挂载占位元素
+        if (view.topSpacer.parentNode !== container) {
+            container.innerHTML = '';
+            container.appendChild(view.topSpacer);
+            container.appendChild(view.bottomSpacer);
+            view.nodes.clear();
+            view.needsLayout = true;
+        }
+        
+        if (!view.needsLayout) {
+            // 只有内容变化：原地更新窗口内的节点
+            view.dirty.forEach(id => {
+                const node = view.nodes.get(id);
+                if (node) {
+                    patchSentenceNode(node, view.sentences[view.positions.get(id)]);
+                }
+            });
+            view.dirty.clear();
+            if (view.stickToBottom) {
+                container.scrollTop = container.scrollHeight;
+            }
+            return;
+        }
+        
+        // 计算可见窗口
+        const total = view.sentences.length;
+        const windowSize = Math.ceil(container.clientHeight / view.rowHeight) + 2 * VIEW_OVERSCAN;
+        const start = view.stickToBottom
+            ? Math.max(0, total - windowSize)
+            : Math.max(0, Math.min(total - windowSize, Math.floor(container.scrollTop / view.rowHeight) - VIEW_OVERSCAN));
+        const end = Math.min(total, start + windowSize);
+        
+        // 移除窗口外的节点
+        view.nodes.forEach((node, id) => {
+            const position = view.positions.get(id);
+            if (position < start || position >= end) {
+                node.remove();
+                view.nodes.delete(id);
             }
-            
-            div.textContent = sentence.text;
-            transcriptionResult.appendChild(div);
         });
         
-        // 滚动到底部
-        transcriptionResult.scrollTop = transcriptionResult.scrollHeight;
+        // 按顺序补齐窗口内的节点，已存在且未变化的节点不做改动
+        let previous = view.topSpacer;
+        for (let i = start; i < end; i++) {
+            const sentence = view.sentences[i];
+            let node = view.nodes.get(sentence.sentence_id);
+            if (!node) {
+                node = document.createElement('div');
+                patchSentenceNode(node, sentence);
+                view.nodes.set(sentence.sentence_id, node);
+            } else if (view.dirty.has(sentence.sentence_id)) {
+                patchSentenceNode(node, sentence);
+            }
+            if (previous.nextSibling !== node) {
+                container.insertBefore(node, previous.nextSibling);
+            }
+            previous = node;
+        }
+        
+        view.topSpacer.style.height = `${start * view.rowHeight}px`;
+        view.bottomSpacer.style.height = `${(total - end) * view.rowHeight}px`;
+        view.dirty.clear();
+        view.needsLayout = false;
+        
+        // 占位高度更新后再补偿滚动位置，滚动事件会按新位置重新计算窗口
+        if (view.scrollAdjust) {
+            container.scrollTop += view.scrollAdjust;
+            view.scrollAdjust = 0;
+        }
+        
+        if (view.stickToBottom) {
+            container.scrollTop = container.scrollHeight;
+        }
+    }
+    
+    // 更新识别结果
+    function updateTranscription(result) {
+        if (!result) return;
+        
+        upsertSentence(getSentenceView(transcriptionResult, translationData.transcription), result);
+        if (result.is_sentence_end) {
+            trimHistory();
+        }
     }
     
-    // 更新翻译结果显示
-    function updateTranslationDisplay(language) {
-        // 查找或创建语言容器
+    // 更新翻译结果
+    function updateTranslation(language, result) {
+        if (!result) return;
+        
+        // 确保语言存在
+        if (!translationData.translations[language]) {
+            translationData.translations[language] = [];
+        }
+        
+        const langContainer = getTranslationContainer(language);
+        upsertSentence(getSentenceView(langContainer, translationData.translations[language]), result);
+    }
+    
+    // 查找或创建语言容器
+    function getTranslationContainer(language) {
         let langContainer = document.getElementById(`translation-${language}`);
         
         if (!langContainer) {
@@ -710,26 +1118,7 @@ document.addEventListener('DOMContentLoaded', function() {
             translationResults.appendChild(langDiv);
         }
         
-        // 清空并重新填充
-        langContainer.innerHTML = '';
-        
-        if (translationData.translations[language]) {
-            translationData.translations[language].forEach(sentence => {
-                const div = document.createElement('div');
-                div.className = 'sentence';
-                
-                if (sentence.is_complete) {
-                    div.classList.add('complete');
-                } else {
-                    div.classList.add('current');
-                }
-                div.textContent = sentence.text;
-                langContainer.appendChild(div);
-            });
-        }
-        
-        // 滚动到底部
-        langContainer.scrollTop = langContainer.scrollHeight;
+        return langContainer;
     }
     
     // 获取语言名称
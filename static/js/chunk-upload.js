@@ -1,81 +1,109 @@
 // 分块上传大文件
-function uploadLargeFile(file, sessionId) {
-    const CHUNK_SIZE = 5 * 1024 * 1024; // 5MB 每块
-    const totalChunks = Math.ceil(file.size / CHUNK_SIZE);
-    let currentChunk = 0;
-    
-    addLog(`准备分块上传文件: ${file.name}, 总大小: ${(file.size / (1024 * 1024)).toFixed(2)} MB, 分为 ${totalChunks} 块`, 'info');
-    
-    function uploadNextChunk() {
-        if (currentChunk >= totalChunks) {
-            // 所有块上传完成
-            addLog('所有分块上传完成，正在处理文件...', 'info');
-            
-            // 通知服务器所有块已上传完成
-            fetch('/api/complete_upload', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    session_id: sessionId,
-                    filename: file.name,
-                    total_chunks: totalChunks
-                })
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    addLog('文件处理成功', 'success');
-                } else {
-                    addLog(`文件处理失败: ${data.message}`, 'error');
-                }
-            })
-            .catch(error => {
-                addLog(`完成上传请求失败: ${error.message}`, 'error');
-            });
-            
-            return;
-        }
-        
-        // 计算当前块的范围
-        const start = currentChunk * CHUNK_SIZE;
-        const end = Math.min(file.size, start + CHUNK_SIZE);
-        const chunk = file.slice(start, end);
-        
-        // 创建表单数据
-        const formData = new FormData();
-        formData.append('chunk', chunk);
-        formData.append('session_id', sessionId);
-        formData.append('filename', file.name);
-        formData.append('chunk_index', currentChunk);
-        formData.append('total_chunks', totalChunks);
-        
-        // 上传当前块
-        addLog(`上传分块 ${currentChunk + 1}/${totalChunks}...`, 'info');
-        
-        fetch('/api/upload_chunk', {
+// 分块乱序、并行上传（默认 4 路），服务器把每块直接写到目标文件的偏移位置；
+// 中断后再次调用会先查询服务器已收到的分块，只补传缺失部分
+function uploadLargeFile(file, sessionId, options = {}) {
+    const CHUNK_SIZE = options.chunkSize || 5 * 1024 * 1024; // 5MB 每块
+    const concurrency = options.concurrency || 4;
+    const maxRetries = options.maxRetries || 3;
+    const log = options.log || ((message) => console.log(message));
+
+    log(`准备分块上传文件: ${file.name}, 总大小: ${(file.size / (1024 * 1024)).toFixed(2)} MB, 并发数: ${concurrency}`, 'info');
+
+    function postJson(url, body) {
+        return fetch(url, {
             method: 'POST',
-            body: formData
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(body)
+        }).then(response => response.json());
+    }
+
+    // 上传单个分块，失败时按指数退避重试
+    function uploadChunk(uploadId, index, attempt = 0) {
+        const start = index * CHUNK_SIZE;
+        const end = Math.min(file.size, start + CHUNK_SIZE);
+
+        return fetch(`/api/upload_chunk?upload_id=${encodeURIComponent(uploadId)}&chunk_index=${index}`, {
+            method: 'PUT',
+            headers: {
+                'Content-Type': 'application/octet-stream'
+            },
+            body: file.slice(start, end)
         })
         .then(response => response.json())
         .then(data => {
-            if (data.success) {
-                currentChunk++;
-                const progress = (currentChunk / totalChunks) * 100;
-                addLog(`分块 ${currentChunk}/${totalChunks} 上传成功 (${progress.toFixed(2)}%)`, 'info');
-                
-                // 上传下一块
-                uploadNextChunk();
-            } else {
-                addLog(`分块上传失败: ${data.message}`, 'error');
+            if (!data.success) {
+                throw new Error(data.message || '分块上传失败');
             }
+            return data;
         })
         .catch(error => {
-            addLog(`分块上传出错: ${error.message}`, 'error');
+            if (attempt >= maxRetries) {
+                throw error;
+            }
+            const delay = 500 * Math.pow(2, attempt);
+            log(`分块 ${index + 1} 上传失败，${delay}ms 后重试: ${error.message}`, 'warning');
+            return new Promise(resolve => setTimeout(resolve, delay))
+                .then(() => uploadChunk(uploadId, index, attempt + 1));
         });
     }
-    
-    // 开始上传第一块
-    uploadNextChunk();
-} 
\ No newline at end of file
+
+    // 以固定并发数上传缺失的分块
+    function uploadMissing(uploadId, missing, totalChunks) {
+        const pending = missing.slice();
+        let uploaded = totalChunks - missing.length;
+
+        function worker() {
+            if (pending.length === 0) {
+                return Promise.resolve();
+            }
+            const index = pending.shift();
+            return uploadChunk(uploadId, index).then(data => {
+                uploaded = data.received_chunks;
+                const progress = (uploaded / totalChunks) * 100;
+                log(`分块 ${index + 1}/${totalChunks} 上传成功 (${progress.toFixed(2)}%)`, 'info');
+                return worker();
+            });
+        }
+
+        const workers = [];
+        for (let i = 0; i < Math.min(concurrency, pending.length); i++) {
+            workers.push(worker());
+        }
+        return Promise.all(workers);
+    }
+
+    return postJson('/api/upload_init', {
+        session_id: sessionId,
+        filename: file.name,
+        file_size: file.size,
+        chunk_size: CHUNK_SIZE
+    })
+    .then(data => {
+        if (!data.success) {
+            throw new Error(data.message || '初始化上传失败');
+        }
+
+        const uploadId = data.upload_id;
+        if (data.received_chunks > 0) {
+            log(`继续上次的上传：已有 ${data.received_chunks}/${data.total_chunks} 块，补传 ${data.missing_chunks.length} 块`, 'info');
+        }
+        log(`翻译任务已创建 (任务: ${data.job_id})，将边上传边处理`, 'info');
+
+        return uploadMissing(uploadId, data.missing_chunks, data.total_chunks)
+            .then(() => postJson('/api/complete_upload', { upload_id: uploadId }));
+    })
+    .then(data => {
+        if (data.success) {
+            log('所有分块上传完成', 'success');
+        } else {
+            log(`完成上传失败: ${data.message}`, 'error');
+        }
+        return data;
+    })
+    .catch(error => {
+        log(`分块上传出错: ${error.message}，重新开始上传将只补传缺失的分块`, 'error');
+        throw error;
+    });
+}
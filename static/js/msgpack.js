@@ -0,0 +1,122 @@
+// 结果帧的 MessagePack 解码
+// 与服务器协商子协议 si.msgpack.v1 后，结果以二进制帧发送，字段名、状态和语言为小整数编码，
+// 编码表与 protocol.py 中的 FIELD_CODES / STATUS_CODES / LANGUAGE_CODES 一致
+const MSGPACK_SUBPROTOCOL = 'si.msgpack.v1';
+
+const MSGPACK_FIELDS = [
+    'status', 'request_id', 'transcription', 'translations', 'is_sentence_end',
+    'text', 'sentence_id', 'stash', 'offset', 'append',
+    'protocol', 'encoding', 'reason', 'message', 'job', 'channel',
+    'seq', 'replayed', 'gap'
+];
+const MSGPACK_STATUSES = [
+    'connected', 'paused', 'resumed', 'stopped',
+    'complete', 'error', 'expired', 'job_update'
+];
+const MSGPACK_LANGUAGES = ['zh', 'en', 'ja', 'yue', 'ko', 'de', 'fr', 'ru', 'it', 'es'];
+
+const msgpackTextDecoder = new TextDecoder('utf-8');
+
+// 解码一个 MessagePack 值（支持服务器会发送的 nil、布尔、整数、浮点、字符串、二进制、数组和映射）
+function decodeMsgpack(buffer) {
+    const view = new DataView(buffer);
+    const bytes = new Uint8Array(buffer);
+    let offset = 0;
+
+    function text(length) {
+        const value = msgpackTextDecoder.decode(bytes.subarray(offset, offset + length));
+        offset += length;
+        return value;
+    }
+
+    function binary(length) {
+        const value = bytes.slice(offset, offset + length);
+        offset += length;
+        return value;
+    }
+
+    function array(length) {
+        const value = new Array(length);
+        for (let i = 0; i < length; i++) {
+            value[i] = read();
+        }
+        return value;
+    }
+
+    // 映射的键可能是整数编码，使用 Map 保留键的类型
+    function map(length) {
+        const value = new Map();
+        for (let i = 0; i < length; i++) {
+            const key = read();
+            value.set(key, read());
+        }
+        return value;
+    }
+
+    function read() {
+        const type = bytes[offset++];
+        if (type <= 0x7f) return type;
+        if (type >= 0xe0) return type - 0x100;
+        if ((type & 0xf0) === 0x80) return map(type & 0x0f);
+        if ((type & 0xf0) === 0x90) return array(type & 0x0f);
+        if ((type & 0xe0) === 0xa0) return text(type & 0x1f);
+
+        let value;
+        switch (type) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: value = view.getUint8(offset); offset += 1; return binary(value);
+            case 0xc5: value = view.getUint16(offset); offset += 2; return binary(value);
+            case 0xc6: value = view.getUint32(offset); offset += 4; return binary(value);
+            case 0xca: value = view.getFloat32(offset); offset += 4; return value;
+            case 0xcb: value = view.getFloat64(offset); offset += 8; return value;
+            case 0xcc: value = view.getUint8(offset); offset += 1; return value;
+            case 0xcd: value = view.getUint16(offset); offset += 2; return value;
+            case 0xce: value = view.getUint32(offset); offset += 4; return value;
+            case 0xcf: value = Number(view.getBigUint64(offset)); offset += 8; return value;
+            case 0xd0: value = view.getInt8(offset); offset += 1; return value;
+            case 0xd1: value = view.getInt16(offset); offset += 2; return value;
+            case 0xd2: value = view.getInt32(offset); offset += 4; return value;
+            case 0xd3: value = Number(view.getBigInt64(offset)); offset += 8; return value;
+            case 0xd9: value = view.getUint8(offset); offset += 1; return text(value);
+            case 0xda: value = view.getUint16(offset); offset += 2; return text(value);
+            case 0xdb: value = view.getUint32(offset); offset += 4; return text(value);
+            case 0xdc: value = view.getUint16(offset); offset += 2; return array(value);
+            case 0xdd: value = view.getUint32(offset); offset += 4; return array(value);
+            case 0xde: value = view.getUint16(offset); offset += 2; return map(value);
+            case 0xdf: value = view.getUint32(offset); offset += 4; return map(value);
+        }
+        throw new Error(`不支持的 MessagePack 类型: 0x${type.toString(16)}`);
+    }
+
+    return read();
+}
+
+// 把整数编码还原为与 JSON 消息相同的对象
+function expandResultCodes(value, field = null) {
+    if (value instanceof Map) {
+        const result = {};
+        for (const [key, item] of value) {
+            if (field === 'translations') {
+                result[typeof key === 'number' ? MSGPACK_LANGUAGES[key] : key] = expandResultCodes(item);
+            } else {
+                const name = typeof key === 'number' ? MSGPACK_FIELDS[key] : key;
+                result[name] = expandResultCodes(item, name);
+            }
+        }
+        return result;
+    }
+    if (field === 'status' && typeof value === 'number') {
+        return MSGPACK_STATUSES[value];
+    }
+    if (Array.isArray(value)) {
+        return value.map(item => expandResultCodes(item));
+    }
+    return value;
+}
+
+// 解码一个二进制结果帧
+function decodeResultFrame(buffer) {
+    return expandResultCodes(decodeMsgpack(buffer));
+}
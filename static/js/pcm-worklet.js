@@ -0,0 +1,59 @@
+// 浏览器麦克风采集处理器
+// 把 AudioContext 采样率下的浮点音频混为单声道、降采样到 16kHz 并转为 16 位 PCM，
+// 每 100ms 通过 port 向主线程发送一帧
+const TARGET_SAMPLE_RATE = 16000;
+const FRAME_SAMPLES = 1600;
+
+class PcmDownsampler extends AudioWorkletProcessor {
+    constructor() {
+        super();
+        this.ratio = Math.max(1, sampleRate / TARGET_SAMPLE_RATE);
+        this.frame = new Int16Array(FRAME_SAMPLES);
+        this.frameLength = 0;
+        // 按输出采样窗口求平均，相当于降采样前的简单低通滤波
+        this.sum = 0;
+        this.count = 0;
+        this.position = 0;
+    }
+
+    process(inputs) {
+        const input = inputs[0];
+        if (!input || input.length === 0) {
+            return true;
+        }
+
+        const channels = input.length;
+        const length = input[0].length;
+        for (let i = 0; i < length; i++) {
+            let sample = 0;
+            for (let c = 0; c < channels; c++) {
+                sample += input[c][i];
+            }
+            this.sum += sample / channels;
+            this.count++;
+            this.position++;
+
+            if (this.position >= this.ratio) {
+                this.position -= this.ratio;
+                this.push(this.sum / this.count);
+                this.sum = 0;
+                this.count = 0;
+            }
+        }
+        return true;
+    }
+
+    push(sample) {
+        const s = Math.max(-1, Math.min(1, sample));
+        this.frame[this.frameLength++] = s < 0 ? s * 0x8000 : s * 0x7fff;
+
+        if (this.frameLength === FRAME_SAMPLES) {
+            // 转移缓冲区所有权，避免复制
+            this.port.postMessage(this.frame.buffer, [this.frame.buffer]);
+            this.frame = new Int16Array(FRAME_SAMPLES);
+            this.frameLength = 0;
+        }
+    }
+}
+
+registerProcessor('pcm-downsampler', PcmDownsampler);
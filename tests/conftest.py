@@ -0,0 +1,11 @@
+import os
+import sys
+
+# 测试使用本地假识别器，不连接识别服务，也不写会话录制、转写记录和结果缓存
+os.environ.setdefault("RECOGNIZER_BACKEND", "fake")
+os.environ.setdefault("RECOGNIZER_POOL_ENABLED", "false")
+os.environ["SESSION_RECORD_DIR"] = ""
+os.environ["TRANSCRIPT_DIR"] = ""
+os.environ["RESULT_CACHE_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,148 @@
+"""浏览器音频上行：本地 WebSocket 客户端发送合成 PCM，经 AudioRingBuffer 送到识别器的 send_audio_frame"""
+import asyncio
+import math
+import struct
+import threading
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+import app as flask_app
+import server
+import translator as translator_module
+from config import Config
+
+
+class RecordingRecognizer:
+    """记录收到的音频帧；gate 未打开时 send_audio_frame 阻塞，用于模拟识别器变慢"""
+
+    instances = []
+
+    def __init__(self, callback=None, **kwargs):
+        self.callback = callback
+        self.frames = []
+        self.gate = threading.Event()
+        self.gate.set()
+        RecordingRecognizer.instances.append(self)
+
+    def start(self):
+        self.callback.on_open()
+
+    def send_audio_frame(self, data):
+        self.gate.wait()
+        self.frames.append(bytes(data))
+
+    def stop(self):
+        self.gate.set()
+
+    def received(self):
+        return b"".join(self.frames)
+
+
+def synthetic_pcm(seconds, sample_rate=16000):
+    """440Hz 正弦波，16 位单声道 PCM；每个采样的值不同，便于比对顺序"""
+    count = int(seconds * sample_rate)
+    return b"".join(
+        struct.pack("<h", int(12000 * math.sin(2 * math.pi * 440 * i / sample_rate)) + i % 7)
+        for i in range(count)
+    )
+
+
+@pytest.fixture
+def recognizer(monkeypatch):
+    RecordingRecognizer.instances = []
+    monkeypatch.setattr(translator_module, "recognizer_factory", RecordingRecognizer)
+    return RecordingRecognizer
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+async def run_session(scenario):
+    """启动 server.py 的应用和一个浏览器音频会话，连接 /ws/<session_id> 后执行 scenario(ws, translator)"""
+    runner = web.AppRunner(server.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        async with aiohttp.ClientSession() as client:
+            async with client.post(f"http://127.0.0.1:{port}/api/start_translation", json={
+                "api_key": "test", "source_language": "zh", "target_languages": ["en"], "audio_source": "browser"
+            }) as response:
+                started = await response.json()
+            assert started["success"], started
+            session_id = started["session_id"]
+            ws = await client.ws_connect(f"ws://127.0.0.1:{port}/ws/{session_id}")
+            connected = await ws.receive_json(timeout=5)
+            assert connected["status"] == "connected"
+            translator = flask_app.active_translators[session_id]
+            try:
+                await scenario(ws, translator)
+            finally:
+                await ws.close()
+                async with client.post(f"http://127.0.0.1:{port}/api/stop_translation",
+                                       json={"session_id": session_id}) as response:
+                    assert (await response.json())["success"]
+    finally:
+        await runner.cleanup()
+
+
+def test_pcm_frames_reach_recognizer(recognizer):
+    pcm = synthetic_pcm(1.0)
+    frame_bytes = int(32000 * Config.UPLINK_FRAME_MS / 1000)
+
+    async def scenario(ws, translator):
+        # 浏览器每 20 毫秒发送一帧
+        for offset in range(0, len(pcm), 640):
+            await ws.send_bytes(pcm[offset:offset + 640])
+        sent = recognizer.instances[0]
+        assert await asyncio.to_thread(wait_until, lambda: len(sent.received()) == len(pcm))
+        assert translator.uplink_buffer.written_bytes == len(pcm)
+        assert translator.uplink_buffer.overrun_bytes == 0
+
+    asyncio.run(run_session(scenario))
+    sent = recognizer.instances[0]
+    # 音频原样、按顺序到达识别器，按上行帧长重新分帧
+    assert sent.received() == pcm
+    assert all(len(frame) == frame_bytes for frame in sent.frames)
+
+
+def test_slow_recognizer_overruns_oldest_audio(recognizer, monkeypatch):
+    monkeypatch.setattr(Config, "UPLINK_BUFFER_SECONDS", 0.25)
+    capacity = 8000
+    pcm = synthetic_pcm(1.0)
+    buffered = {}
+
+    async def scenario(ws, translator):
+        sent = recognizer.instances[0]
+        # 识别器卡住：发送线程取出一帧后阻塞，其余音频留在缓冲区中，超出容量的最旧音频被覆盖
+        sent.gate.clear()
+        for offset in range(0, len(pcm), 640):
+            await ws.send_bytes(pcm[offset:offset + 640])
+        buffer = translator.uplink_buffer
+        assert await asyncio.to_thread(wait_until, lambda: buffer.written_bytes == len(pcm))
+        assert buffer.overrun_bytes >= len(pcm) - capacity - 3200
+        buffered["bytes"] = len(buffer)
+        buffered["overrun"] = buffer.overrun_bytes
+        sent.gate.set()
+        assert await asyncio.to_thread(
+            wait_until, lambda: len(sent.received()) + buffer.overrun_bytes == len(pcm)
+        )
+
+    asyncio.run(run_session(scenario))
+    received = recognizer.instances[0].received()
+    # 阻塞期间没有再取出音频，溢出只发生在识别器卡住时
+    assert buffered["overrun"] == len(pcm) - len(received)
+    # 恢复后发出的是缓冲区中保留的最新音频，之前是阻塞时已取出的一段连续音频
+    tail = buffered["bytes"]
+    assert received.endswith(pcm[-tail:])
+    assert received[:-tail] in pcm
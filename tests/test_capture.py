@@ -0,0 +1,150 @@
+"""服务器麦克风采集：用假的 PyAudio 模块驱动采集回调，检查分帧、暂停丢弃及溢出、欠载统计"""
+import threading
+import time
+from types import SimpleNamespace
+
+from capture import CaptureHub, CaptureSender
+
+BLOCK_BYTES = 320   # 10 毫秒的 16kHz 16 位单声道音频
+
+
+class FakeStream:
+    def __init__(self, callback):
+        self.callback = callback
+        self.active = True
+
+    def start_stream(self):
+        pass
+
+    def stop_stream(self):
+        self.active = False
+
+    def close(self):
+        pass
+
+
+class FakePyAudio:
+    """替代 pyaudio.PyAudio：open() 只保存回调，由测试调用 push() 模拟 PortAudio 的回调线程"""
+
+    streams = []
+
+    def open(self, stream_callback=None, **kwargs):
+        stream = FakeStream(stream_callback)
+        FakePyAudio.streams.append(stream)
+        return stream
+
+    def terminate(self):
+        pass
+
+
+def fake_pyaudio_module():
+    FakePyAudio.streams = []
+    return SimpleNamespace(PyAudio=FakePyAudio, paInt16=8, paContinue=0, paInputOverflow=2)
+
+
+def push(stream, blocks, start=0, status=0):
+    """送入 blocks 个 10 毫秒的音频块，块内容按序号递增，返回送入的数据"""
+    data = []
+    for i in range(start, start + blocks):
+        block = bytes([i % 256]) * BLOCK_BYTES
+        assert stream.callback(block, BLOCK_BYTES // 2, None, status) == (None, 0)
+        data.append(block)
+    return b"".join(data)
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class Sink:
+    def __init__(self):
+        self.frames = []
+        self.lock = threading.Lock()
+
+    def __call__(self, frame):
+        with self.lock:
+            self.frames.append(bytes(frame))
+
+    def data(self):
+        with self.lock:
+            return b"".join(self.frames)
+
+
+def test_frames_pause_and_counters():
+    hub = CaptureHub(pyaudio_module=fake_pyaudio_module())
+    subscription = hub.subscribe(32000)
+    stream = FakePyAudio.streams[0]
+    sink = Sink()
+    sender = CaptureSender(subscription.buffer, sink, frame_ms=20)
+    sender.start()
+    try:
+        # 两个 10 毫秒的块拼成一个 20 毫秒的帧，按顺序送出
+        sent = push(stream, 10)
+        assert wait_until(lambda: len(sink.data()) == len(sent))
+        assert sink.data() == sent
+        assert all(len(frame) == 640 for frame in sink.frames)
+
+        # 暂停：回调直接丢弃该订阅的音频，发送线程不发送
+        subscription.paused = True
+        sender.pause()
+        frames_before = len(sink.frames)
+        push(stream, 10, start=10)
+        time.sleep(0.1)
+        assert len(sink.frames) == frames_before
+        assert subscription.discarded_bytes == 10 * BLOCK_BYTES
+
+        # 恢复后发送线程在下一个节拍丢弃残留音频，之后只发送恢复之后的音频
+        sender.resume()
+        subscription.paused = False
+        assert wait_until(lambda: not sender._skip)
+        resumed = push(stream, 4, start=20)
+        assert wait_until(lambda: len(sink.data()) == len(sent) + len(resumed))
+        assert sink.data() == sent + resumed
+
+        # 没有新音频时每个节拍计一次欠载
+        underruns = sender.underruns
+        time.sleep(0.1)
+        assert sender.underruns > underruns
+    finally:
+        sender.stop()
+        hub.unsubscribe(subscription)
+
+    stats = subscription.stats()
+    assert stats["captured_bytes"] == len(sent) + len(resumed)
+    assert stats["overrun_bytes"] == 0
+    assert stats["discarded_bytes"] == 10 * BLOCK_BYTES
+    assert not stream.active
+
+
+def test_overrun_and_device_overflow():
+    hub = CaptureHub(pyaudio_module=fake_pyaudio_module())
+    # 缓冲区只能放下 3 个块，发送线程未启动，之后到达的块被丢弃
+    subscription = hub.subscribe(3 * BLOCK_BYTES)
+    stream = FakePyAudio.streams[0]
+    kept = push(stream, 3)
+    push(stream, 7, start=3, status=2)
+    stats = subscription.stats()
+    assert stats["overrun_bytes"] == 7 * BLOCK_BYTES
+    assert stats["device_overflows"] == 7
+    assert subscription.buffer.read(len(kept)) == kept
+    hub.unsubscribe(subscription)
+
+
+def test_shared_device_opened_once():
+    hub = CaptureHub(pyaudio_module=fake_pyaudio_module())
+    first = hub.subscribe(32000)
+    second = hub.subscribe(32000)
+    assert len(FakePyAudio.streams) == 1
+    stream = FakePyAudio.streams[0]
+    push(stream, 2)
+    # 同一个块按引用交给每个订阅
+    assert first.buffer.read(BLOCK_BYTES) is second.buffer.read(BLOCK_BYTES)
+    hub.unsubscribe(first)
+    assert stream.active and hub.stats()[0]["subscribers"] == 1
+    hub.unsubscribe(second)
+    assert not stream.active and hub.stats() == []
@@ -0,0 +1,169 @@
+"""长音频模式：静音切分后用注入的假识别器并发翻译，结果按分段顺序合并"""
+import threading
+import time
+import wave
+from types import SimpleNamespace
+
+import numpy as np
+
+from long_audio import translate_long_file
+
+SAMPLE_RATE = 16000
+TONE_SECONDS = 1.0
+SILENCE_SECONDS = 0.6
+
+
+def write_test_audio(path, tones):
+    """tones 段 1 秒的正弦波，第 i 段振幅为 1000 * (i + 1)，段之间是 0.6 秒静音"""
+    t = np.arange(int(SAMPLE_RATE * TONE_SECONDS)) / SAMPLE_RATE
+    silence = np.zeros(int(SAMPLE_RATE * SILENCE_SECONDS), dtype='<i2')
+    parts = []
+    for i in range(tones):
+        if i:
+            parts.append(silence)
+        parts.append((1000 * (i + 1) * np.sin(2 * np.pi * 440 * t)).astype('<i2'))
+    with wave.open(path, 'wb') as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(SAMPLE_RATE)
+        writer.writeframes(np.concatenate(parts).tobytes())
+
+
+def read_segment(path):
+    """读取分段的采样，按振幅认出是第几段"""
+    with wave.open(path, 'rb') as reader:
+        samples = np.frombuffer(reader.readframes(reader.getnframes()), dtype='<i2')
+    return samples, int(round(np.abs(samples).max() / 1000)) - 1
+
+
+class SegmentRecognizer:
+    """按分段的振幅认出是第几段；后面的分段先完成，并记录同时进行的调用数"""
+
+    lock = threading.Lock()
+    active = 0
+    max_active = 0
+    calls = []
+
+    def __init__(self, translation_target_languages=None, **kwargs):
+        self.target_languages = translation_target_languages
+
+    def call(self, path):
+        cls = SegmentRecognizer
+        samples, index = read_segment(path)
+        duration_ms = int(len(samples) * 1000 / SAMPLE_RATE)
+        with cls.lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+            cls.calls.append(index)
+        time.sleep(0.02 * (8 - index))
+        with cls.lock:
+            cls.active -= 1
+
+        # 时间戳相对于分段开头：句子从 100 毫秒开始，持续到分段结束
+        sentence = SimpleNamespace(text=f"s{index}", begin_time=100, end_time=duration_ms)
+        translations = {
+            lang: SimpleNamespace(text=f"{lang}{index}", begin_time=100, end_time=duration_ms)
+            for lang in self.target_languages
+        }
+        translation = SimpleNamespace(get_language_list=lambda: list(translations),
+                                      get_translation=translations.get)
+        return SimpleNamespace(error_message=None, request_id=f"request-{index}",
+                               transcription_result_list=[sentence], translation_result_list=[translation])
+
+
+def test_segments_merged_in_order_with_offsets(tmp_path):
+    SegmentRecognizer.active = SegmentRecognizer.max_active = 0
+    SegmentRecognizer.calls = []
+    path = str(tmp_path / "long.wav")
+    tones = 6
+    write_test_audio(path, tones)
+
+    result = translate_long_file(
+        path, "zh", ["en", "ja"],
+        recognizer_factory=SegmentRecognizer,
+        concurrency=3,
+        splitter_options={"target_seconds": 1.0, "min_silence": 0.3, "max_seconds": 5.0},
+        work_dir=str(tmp_path)
+    )
+
+    assert result["success"]
+    assert len(result["segments"]) == tones
+    # 每个分段都调用了一次识别，并发数不超过 concurrency
+    assert sorted(SegmentRecognizer.calls) == list(range(tones))
+    assert 1 < SegmentRecognizer.max_active <= 3
+
+    # 后面的分段先完成，合并结果仍按分段顺序
+    assert result["transcriptions"] == [f"s{i}" for i in range(tones)]
+    assert result["translations"] == {lang: [f"{lang}{i}" for i in range(tones)] for lang in ("en", "ja")}
+    assert result["request_ids"] == [f"request-{i}" for i in range(tones)]
+
+    # 时间戳加上分段在原始音频中的偏移，分段从上一段之后的静音中切开
+    for i, (segment, timing) in enumerate(zip(result["segments"], result["timestamps"])):
+        offset_ms = int(round(segment["offset"] * 1000))
+        assert timing["begin_time"] == offset_ms + 100
+        assert timing["end_time"] == offset_ms + int(segment["duration"] * 1000)
+        assert segment["offset"] <= i * (TONE_SECONDS + SILENCE_SECONDS) < segment["offset"] + segment["duration"]
+    # 分段首尾相接，覆盖整个文件
+    ends = [s["offset"] + s["duration"] for s in result["segments"]]
+    assert all(abs(end - s["offset"]) < 1e-6 for end, s in zip(ends, result["segments"][1:]))
+    assert abs(ends[-1] - (tones * (TONE_SECONDS + SILENCE_SECONDS) - SILENCE_SECONDS)) < 0.05
+    # 分段的临时文件已删除
+    assert not list(tmp_path.glob("segments_*"))
+
+
+class FlakyRecognizer(SegmentRecognizer):
+    """每个分段的第一次调用抛出异常（如网络错误），重试时正常返回"""
+
+    failed = set()
+
+    def call(self, path):
+        _, index = read_segment(path)
+        with SegmentRecognizer.lock:
+            first = index not in FlakyRecognizer.failed
+            FlakyRecognizer.failed.add(index)
+        if first:
+            raise ConnectionError(f"分段 {index} 连接中断")
+        return super().call(path)
+
+
+def test_segment_retried_after_exception(tmp_path):
+    SegmentRecognizer.calls = []
+    FlakyRecognizer.failed = set()
+    path = str(tmp_path / "long.wav")
+    write_test_audio(path, 3)
+
+    result = translate_long_file(
+        path, "zh", ["en"],
+        recognizer_factory=FlakyRecognizer,
+        concurrency=2,
+        splitter_options={"target_seconds": 1.0, "min_silence": 0.3, "max_seconds": 5.0},
+        work_dir=str(tmp_path)
+    )
+
+    assert result["success"]
+    assert result["transcriptions"] == ["s0", "s1", "s2"]
+    assert FlakyRecognizer.failed == {0, 1, 2}
+
+
+def test_cancelled_run_is_not_successful(tmp_path):
+    SegmentRecognizer.calls = []
+    path = str(tmp_path / "long.wav")
+    write_test_audio(path, 6)
+    cancel_event = threading.Event()
+
+    # 第一段完成后取消，之后的分段不再翻译
+    result = translate_long_file(
+        path, "zh", ["en"],
+        recognizer_factory=SegmentRecognizer,
+        concurrency=1,
+        splitter_options={"target_seconds": 1.0, "min_silence": 0.3, "max_seconds": 5.0},
+        work_dir=str(tmp_path),
+        progress=lambda done_seconds: cancel_event.set(),
+        cancel_event=cancel_event
+    )
+
+    assert not result["success"]
+    assert result["cancelled"]
+    assert 0 < len(result["transcriptions"]) < 6
+    assert len(SegmentRecognizer.calls) == len(result["transcriptions"])
+    assert not list(tmp_path.glob("segments_*"))
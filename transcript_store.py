@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+import time
+from array import array
+from collections import deque
+from itertools import islice
+
+# 导出格式及其 Content-Type
+EXPORT_FORMATS = {
+    "txt": "text/plain; charset=utf-8",
+    "srt": "application/x-subrip; charset=utf-8",
+    "vtt": "text/vtt; charset=utf-8",
+    "json": "application/json; charset=utf-8"
+}
+# 字幕导出中选择源语言识别文本
+LANGUAGE_SOURCE = "source"
+
+
+class TranscriptStore:
+    """会话转写记录：每句一行追加写入磁盘（JSON Lines），内存中只保留最近 tail_size 句及每句的文件偏移
+
+    每行为 {"index", "sentence_id", "time", "begin_time", "end_time", "transcription", "translations"}，
+    time 为写入时的 Unix 时间，begin_time/end_time 为该句在会话音频中的毫秒数（未知时为 null）。
+    较早的句子按偏移从文件读取，导出时逐行读取，内存占用与记录长度无关。
+    readonly=True 时只读打开已有的记录（如已结束的会话）。
+    """
+
+    def __init__(self, path, tail_size=100, readonly=False):
+        self.path = path
+        self._offsets = array('q')
+        self._tail = deque(maxlen=tail_size)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._file = None
+        if os.path.exists(path):
+            self._scan()
+        if not readonly:
+            self._file = open(path, "ab")
+            # 丢弃上次异常退出时未写完的最后一行
+            self._file.truncate(self._size)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def append(self, sentence_id, transcription, translations, begin_time=None, end_time=None):
+        """记录一句已合并的句末结果（translations 为 语言 -> 译文），返回该句的序号"""
+        with self._lock:
+            if self._file is None:
+                return None
+            index = len(self._offsets)
+            line = (json.dumps({
+                "index": index,
+                "sentence_id": sentence_id,
+                "time": round(time.time(), 3),
+                "begin_time": begin_time,
+                "end_time": end_time,
+                "transcription": transcription,
+                "translations": translations
+            }, ensure_ascii=False) + "\n").encode('utf-8')
+            self._file.write(line)
+            self._file.flush()
+            self._offsets.append(self._size)
+            self._size += len(line)
+            self._tail.append(line)
+        return index
+
+    def read(self, start, count):
+        """读取从 start 开始的最多 count 句，返回 (句子列表, 总句数)；落在内存尾部的不读文件"""
+        with self._lock:
+            total = len(self._offsets)
+            start = max(0, min(start, total))
+            end = min(total, start + max(count, 0))
+            tail_start = total - len(self._tail)
+            if start >= tail_start:
+                lines = list(islice(self._tail, start - tail_start, end - tail_start))
+                return [json.loads(line) for line in lines], total
+            offset = self._offsets[start]
+            stop = self._offsets[end] if end < total else self._size
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read(stop - offset)
+        return [json.loads(line) for line in data.splitlines()], total
+
+    def entries(self):
+        """逐句读取全部记录（生成器），只读到调用时已写入的部分"""
+        with self._lock:
+            stop = self._size
+        position = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                position += len(line)
+                if position > stop:
+                    return
+                yield json.loads(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _scan(self):
+        # 打开已有记录时重建每句的偏移和内存尾部，末尾未写完的行不计入
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._offsets.append(offset)
+                self._tail.append(line)
+                offset += len(line)
+        self._size = offset
+
+
+def remove_expired(directory, max_age, keep=()):
+    """删除目录中超过 max_age 秒未修改的转写记录（*.jsonl），keep 中的文件名除外，返回删除的文件数"""
+    removed = 0
+    now = time.time()
+    for name in os.listdir(directory):
+        if not name.endswith(".jsonl") or name in keep:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def _timestamp(ms, separator):
+    ms = max(int(ms), 0)
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{ms:03d}"
+
+
+def _sentence_text(entry, language):
+    if language == LANGUAGE_SOURCE:
+        return entry.get("transcription")
+    return (entry.get("translations") or {}).get(language)
+
+
+def _cues(entries, language):
+    """字幕时间轴：优先使用句子的音频时间，缺失时按写入时间相对第一句换算"""
+    origin = None
+    previous_end = 0
+    for entry in entries:
+        if origin is None:
+            origin = entry["time"]
+        begin, end = entry.get("begin_time"), entry.get("end_time")
+        if begin is None or end is None:
+            end = (entry["time"] - origin) * 1000
+            begin = min(previous_end, end)
+        previous_end = end
+        text = _sentence_text(entry, language)
+        if text:
+            yield begin, end, text
+
+
+def export(entries, format, language=LANGUAGE_SOURCE):
+    """把记录逐句转换为导出格式的文本块（生成器）
+
+    txt 每句一段，包含写入时间、源语言文本及全部翻译；srt / vtt 只包含 language 一种语言
+    （source 为源语言）；json 为全部记录组成的数组。
+    """
+    if format == "txt":
+        for entry in entries:
+            lines = [f"[{time.strftime('%H:%M:%S', time.localtime(entry['time']))}] {entry.get('transcription') or ''}"]
+            for lang, text in (entry.get("translations") or {}).items():
+                lines.append(f"    [{lang}] {text or ''}")
+            yield "\n".join(lines) + "\n\n"
+    elif format == "srt":
+        for number, (begin, end, text) in enumerate(_cues(entries, language), 1):
+            yield f"{number}\n{_timestamp(begin, ',')} --> {_timestamp(end, ',')}\n{text}\n\n"
+    elif format == "vtt":
+        yield "WEBVTT\n\n"
+        for begin, end, text in _cues(entries, language):
+            yield f"{_timestamp(begin, '.')} --> {_timestamp(end, '.')}\n{text}\n\n"
+    elif format == "json":
+        separator = "[\n"
+        for entry in entries:
+            yield separator + json.dumps(entry, ensure_ascii=False)
+            separator = ",\n"
+        yield "[]\n" if separator == "[\n" else "\n]\n"
+    else:
+        raise ValueError(f"未知的导出格式: {format}")
@@ -1,9 +1,20 @@
-import asyncio
 import dashscope
+import itertools
 import threading
 import time
-import json
 import os
+import queue
+
+from audio_buffer import AudioRingBuffer
+from capture import CaptureHub, CaptureSender
+from pacing import FilePacer, PACING_SPEEDUP, PACING_FASTEST
+from audio_decode import PcmStream
+from long_audio import translate_long_file
+from vad import VadStats, VoiceActivityGate
+from outbound import ReplayBuffer
+from metrics import AUDIO_SECONDS, RECOGNIZER_EVENTS, UPSTREAM_ERRORS, SessionLatency
+from session_recorder import SessionRecorder
+from transcript_store import TranscriptStore
 
 # 根据测试结果，正确导入相关类
 try:
@@ -14,59 +25,150 @@ except ImportError as e:
     print(f"导入 Gummy API 相关类失败: {e}")
     raise ImportError("无法导入必要的 dashscope 类，请确保安装了最新版本的 dashscope 库")
 
-# 全局变量用于麦克风
-mic = None
-stream = None
+# 创建实时识别器的工厂，参数与 TranslationRecognizerRealtime 相同；app.py 按 RECOGNIZER_BACKEND 替换
+recognizer_factory = TranslationRecognizerRealtime
+
+# 服务器麦克风的共享采集：每个输入设备只打开一次，所有使用麦克风的会话订阅同一个设备
+capture_hub = CaptureHub()
+
+# 会话在指标中的序号
+_metrics_ids = itertools.count(1)
+
+def sentence_message(sentence):
+    """识别或翻译结果中一句话的消息内容"""
+    message = {
+        "text": sentence.text,
+        "sentence_id": sentence.sentence_id,
+        "is_sentence_end": sentence.is_sentence_end
+    }
+    stash = getattr(sentence, 'stash', None)
+    if stash is not None:
+        message["stash"] = {"text": stash.text}
+    return message
+
+class SentenceMerger:
+    """按 sentence_id 合并同一句的句末识别文本和各目标语言译文，它们可能分在多个事件中到达
+
+    识别文本和全部目标语言的译文都到齐的句子按 sentence_id 顺序输出，前面的句子未到齐时后面的句子等待；
+    某句之后已有 max_waiting 句到齐而它仍不完整时（如某种语言始终没有句末译文），不再等待，按不完整输出，
+    缺失的语言不出现在 translations 中。每句只输出一次，已输出的句子再收到的结果被忽略。
+    """
+
+    def __init__(self, target_languages, max_waiting=3):
+        self.target_languages = list(target_languages)
+        self.max_waiting = max_waiting
+        self._pending = {}
+        self._emitted = None   # 已输出的最大 sentence_id
+        self._lock = threading.Lock()
+
+    def add(self, transcription_result, translation_result):
+        """合并一个识别事件中的句末结果，返回可以按顺序输出的句子"""
+        with self._lock:
+            if transcription_result is not None and transcription_result.is_sentence_end:
+                sentence = self._sentence(transcription_result.sentence_id)
+                if sentence is not None:
+                    sentence["transcription"] = transcription_result.text
+                    sentence["begin_time"] = getattr(transcription_result, 'begin_time', None)
+                    sentence["end_time"] = getattr(transcription_result, 'end_time', None)
+            if translation_result is not None:
+                for lang in translation_result.get_language_list():
+                    trans = translation_result.get_translation(lang)
+                    if trans is not None and trans.is_sentence_end:
+                        sentence = self._sentence(trans.sentence_id)
+                        if sentence is not None:
+                            sentence["translations"][lang] = trans.text
+            return self._ready()
+
+    def flush(self):
+        """按顺序取出所有尚未输出的句子（可能不完整）"""
+        with self._lock:
+            remaining = [self._pending[i] for i in sorted(self._pending)]
+            self._pending.clear()
+            if remaining:
+                self._emitted = remaining[-1]["sentence_id"]
+            return remaining
+
+    def is_complete(self, sentence):
+        return sentence["transcription"] is not None and \
+            all(lang in sentence["translations"] for lang in self.target_languages)
+
+    def _sentence(self, sentence_id):
+        # 调用方需持有锁
+        if self._emitted is not None and sentence_id <= self._emitted:
+            return None
+        if sentence_id not in self._pending:
+            self._pending[sentence_id] = {
+                "sentence_id": sentence_id,
+                "transcription": None,
+                "begin_time": None,
+                "end_time": None,
+                "translations": {}
+            }
+        return self._pending[sentence_id]
+
+    def _ready(self):
+        # 调用方需持有锁
+        ready = []
+        ids = sorted(self._pending)
+        complete = [self.is_complete(self._pending[i]) for i in ids]
+        for position, sentence_id in enumerate(ids):
+            if not complete[position] and sum(complete[position + 1:]) < self.max_waiting:
+                break
+            ready.append(self._pending.pop(sentence_id))
+            self._emitted = sentence_id
+        return ready
 
 class TranslatorCallback(TranslationRecognizerCallback):
     def __init__(self, websocket=None):
         self.websocket = websocket
+        # 会话发送队列，由 WebSocket 服务器在连接建立时挂载
+        self.outbox = None
+        # 最近一条识别结果对应的音频时间（毫秒），用于估计识别滞后
+        self.last_result_audio_ms = None
+        # 会话交给用户之前已发送的保活音频时长（毫秒），预热的识别器不为 0
+        self.audio_offset_ms = 0
+        # 识别器报告的最近一次错误，用于连接池健康检查
+        self.error = None
+        # 最近一次收到识别事件的时间（time.monotonic()），用于判断会话是否空闲
+        self.last_event_at = None
+        # 音频发送时刻及识别延迟直方图
+        self.latency = SessionLatency()
+        # 会话录制器（SessionRecorder），启用录制时由 Translator 挂载
+        self.recorder = None
+        # 听众广播（Broadcaster），由 app.py 在会话启动时挂载
+        self.broadcast = None
+        # 会话转写记录（TranscriptStore），启用时由 Translator 挂载；句末结果按句合并后每句写入一行
+        self.transcript = None
+        self.transcript_merger = None
+        # 消息编号及重放缓冲区（ReplayBuffer），启用后断线期间的消息在重连时补发
+        self.replay = None
+        # 保护 outbox 的切换与消息编号、入队的顺序
+        self._outbox_lock = threading.Lock()
         
     def on_open(self) -> None:
-        global mic, stream
         print("连接已打开")
-        
-        # 如果使用麦克风，则初始化麦克风
-        if hasattr(self, 'use_microphone') and self.use_microphone:
-            try:
-                import pyaudio
-                mic = pyaudio.PyAudio()
-                stream = mic.open(
-                    format=pyaudio.paInt16,
-                    channels=1,
-                    rate=16000,
-                    input=True
-                )
-                print("麦克风已初始化")
-            except Exception as e:
-                print(f"初始化麦克风失败: {e}")
     
     def on_close(self) -> None:
-        global mic, stream
+        # 麦克风由 Translator 通过共享采集订阅和退订，识别器连接关闭不影响其他会话的麦克风
         print("连接已关闭")
-        
-        # 关闭麦克风
-        if stream:
-            stream.stop_stream()
-            stream.close()
-        if mic:
-            mic.terminate()
-        stream = None
-        mic = None
     
     def on_error(self, message) -> None:
         print(f"错误: {message}")
-        # 发送错误消息到 WebSocket
-        if self.websocket:
-            error_msg = {"status": "error", "message": message}
-            self._send_result_to_websocket(error_msg)
+        self.error = message
+        UPSTREAM_ERRORS.inc(labels=("recognizer",))
+        if self.recorder is not None:
+            self.recorder.error(message)
+        # 发送错误消息到 WebSocket 及听众
+        error_msg = {"status": "error", "message": message}
+        self._send_result_to_websocket(error_msg, final=True)
     
     def on_complete(self) -> None:
         print("处理完成")
-        # 发送完成消息到 WebSocket
-        if self.websocket:
-            complete_msg = {"status": "complete"}
-            self._send_result_to_websocket(complete_msg)
+        if self.recorder is not None:
+            self.recorder.complete()
+        # 发送完成消息到 WebSocket 及听众
+        complete_msg = {"status": "complete"}
+        self._send_result_to_websocket(complete_msg, final=True)
     
     def on_event(
         self,
@@ -76,6 +178,9 @@ class TranslatorCallback(TranslationRecognizerCallback):
         usage,
     ) -> None:
         print(f"收到事件: {request_id}")
+        self.last_event_at = time.monotonic()
+        if self.recorder is not None:
+            self.recorder.event(request_id, transcription_result, translation_result, self.audio_offset_ms)
         result = {
             "request_id": request_id,
             "transcription": None,
@@ -84,142 +189,405 @@ class TranslatorCallback(TranslationRecognizerCallback):
         }
         
         if transcription_result is not None:
-            result["transcription"] = {
-                "text": transcription_result.text,
-                "sentence_id": transcription_result.sentence_id,
-                "is_sentence_end": transcription_result.is_sentence_end
-            }
+            result["transcription"] = sentence_message(transcription_result)
             if transcription_result.is_sentence_end:
                 result["is_sentence_end"] = True
+            begin_time = getattr(transcription_result, 'begin_time', None)
+            end_time = getattr(transcription_result, 'end_time', None)
+            if end_time is not None:
+                self.last_result_audio_ms = end_time - self.audio_offset_ms
+            self.latency.result(
+                transcription_result.sentence_id,
+                begin_time - self.audio_offset_ms if begin_time is not None else None,
+                self.last_result_audio_ms if end_time is not None else None,
+                transcription_result.is_sentence_end
+            )
+            RECOGNIZER_EVENTS.inc(labels=("sentence_end" if transcription_result.is_sentence_end else "partial",))
             print(f"识别结果: {transcription_result.text}")
-            
-            # 处理 stash 数据（如果有）
-            if hasattr(transcription_result, 'stash') and transcription_result.stash is not None:
-                result["transcription"]["stash"] = {
-                    "text": transcription_result.stash.text
-                }
-                print(f"识别缓存: {transcription_result.stash.text}")
                 
         if translation_result is not None:
+            translations = result["translations"]
             for lang in translation_result.get_language_list():
                 trans = translation_result.get_translation(lang)
-                result["translations"][lang] = {
-                    "text": trans.text,
-                    "sentence_id": trans.sentence_id,
-                    "is_sentence_end": trans.is_sentence_end
-                }
+                translations[lang] = sentence_message(trans)
                 if trans.is_sentence_end:
                     result["is_sentence_end"] = True
                 print(f"翻译结果 ({lang}): {trans.text}")
-                
-                # 处理 stash 数据（如果有）
-                if hasattr(trans, 'stash') and trans.stash is not None:
-                    result["translations"][lang]["stash"] = {
-                        "text": trans.stash.text
-                    }
-                    print(f"翻译缓存 ({lang}): {trans.stash.text}")
         
-        self._send_result_to_websocket(result)
+        merger = self.transcript_merger
+        if merger is not None and result["is_sentence_end"]:
+            self._write_transcript(merger.add(transcription_result, translation_result))
+        
+        self._send_result_to_websocket(result, final=result["is_sentence_end"])
     
-    def _send_result_to_websocket(self, result):
-        # 发送结果到 WebSocket
-        if self.websocket:
-            try:
-                asyncio.run(self.send_result(result))
-            except RuntimeError:
-                # 处理"事件循环已运行"错误
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(self.send_result(result))
-                loop.close()
+    def open_transcript(self, transcript, target_languages):
+        """开始把句末结果写入转写记录：同一句的识别文本和各语言译文到齐后写入一行"""
+        self.transcript_merger = SentenceMerger(target_languages)
+        self.transcript = transcript
+    
+    def flush_transcript(self):
+        """识别器停止后写入尚未到齐的句子"""
+        if self.transcript_merger is not None:
+            self._write_transcript(self.transcript_merger.flush())
     
-    async def send_result(self, result):
-        if self.websocket:
+    def _write_transcript(self, sentences):
+        for sentence in sentences:
+            begin_time, end_time = sentence["begin_time"], sentence["end_time"]
+            self.transcript.append(
+                sentence["sentence_id"],
+                sentence["transcription"],
+                sentence["translations"],
+                begin_time - self.audio_offset_ms if begin_time is not None else None,
+                end_time - self.audio_offset_ms if end_time is not None else None
+            )
+    
+    def notify(self, message, final=True):
+        """向客户端推送非识别结果类消息（如任务进度）"""
+        self._send_result_to_websocket(message, final=final)
+    
+    def attach(self, websocket, outbox, connected, last_seq=None):
+        """挂载新连接的发送队列，返回补发的消息条数
+
+        connected 为连接确认消息，先于补发的消息入队；给出 last_seq 时补发重放缓冲区中其后的消息，
+        部分消息已被淘汰时确认消息带 "gap": true。与编号入队在同一把锁内完成，补发与实时消息之间不重不漏。
+        """
+        with self._outbox_lock:
+            replayed, complete = [], True
+            if self.replay is not None and last_seq is not None:
+                replayed, complete = self.replay.since(last_seq)
+            connected["replayed"] = len(replayed)
+            if not complete:
+                connected["gap"] = True
+            outbox.put(connected, final=True)
+            for message, final in replayed:
+                outbox.put(message, final=final)
+            self.websocket = websocket
+            self.outbox = outbox
+        return len(replayed)
+    
+    def detach(self, outbox):
+        """连接断开：卸下其发送队列，之后的消息只进入重放缓冲区"""
+        with self._outbox_lock:
+            if self.outbox is outbox:
+                self.websocket = None
+                self.outbox = None
+    
+    def _send_result_to_websocket(self, result, final=False):
+        # 只入队，实际发送由 WebSocket 服务器事件循环中的发送任务完成
+        with self._outbox_lock:
+            if self.replay is not None:
+                self.replay.append(result, final)
+            outbox = self.outbox
+            if outbox is not None:
+                outbox.put(result, final=final)
+        broadcast = self.broadcast
+        if broadcast is not None:
+            broadcast.publish(result, final=final)
+
+class SentenceStreamCallback(TranslationRecognizerCallback):
+    """把句末结果按句合并后放入有界队列，供文件流式翻译逐句读取
+
+    同一句的识别文本和各目标语言译文都到齐后按 sentence_id 顺序入队（见 SentenceMerger）；
+    队列满时阻塞识别器的接收线程，服务器内存占用与文件长度无关。消费者放弃读取后调用 close()，不再阻塞。
+    """
+
+    def __init__(self, target_languages, maxsize=64):
+        self.target_languages = list(target_languages)
+        self.events = queue.Queue(maxsize)
+        self.last_result_audio_ms = None
+        self.request_id = None
+        self.sentences = 0
+        self._merger = SentenceMerger(target_languages)
+        self._finished = False
+        self._closed = threading.Event()
+        # 合并与入队在同一把锁内完成，句子按输出顺序入队
+        self._lock = threading.Lock()
+
+    def on_event(self, request_id, transcription_result, translation_result, usage) -> None:
+        self.request_id = request_id
+        if transcription_result is not None and transcription_result.is_sentence_end:
+            end_time = getattr(transcription_result, 'end_time', None)
+            if end_time is not None:
+                self.last_result_audio_ms = end_time
+        with self._lock:
+            for sentence in self._merger.add(transcription_result, translation_result):
+                self._put("sentence", sentence)
+
+    def on_error(self, message) -> None:
+        print(f"流式翻译错误: {message}")
+        UPSTREAM_ERRORS.inc(labels=("recognizer",))
+        self._put("error", message)
+
+    def on_complete(self) -> None:
+        self.finish()
+
+    def finish(self):
+        """输出尚未到齐的句子并结束队列，只生效一次"""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            for sentence in self._merger.flush():
+                self._put("sentence", sentence)
+        self._put("complete", None)
+
+    def close(self):
+        self._closed.set()
+
+    def _put(self, kind, payload):
+        if kind == "sentence":
+            self.sentences += 1
+        while not self._closed.is_set():
             try:
-                await self.websocket.send(json.dumps(result))
-            except Exception as e:
-                print(f"发送 WebSocket 消息失败: {e}")
+                self.events.put((kind, payload), timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+def start_recognizer(callback, source_language, target_languages, format="pcm", sample_rate=16000, api_key=None):
+    """创建并启动实时识别器；指定 api_key 时不依赖全局的 dashscope.api_key"""
+    kwargs = {"api_key": api_key} if api_key else {}
+    recognizer = recognizer_factory(
+        model="gummy-realtime-v1",
+        format=format,
+        sample_rate=sample_rate,
+        source_language=source_language,
+        transcription_enabled=True,
+        translation_enabled=True,
+        translation_target_languages=target_languages,
+        callback=callback,
+        **kwargs
+    )
+    recognizer.start()
+    return recognizer
 
 class Translator:
     def __init__(self, api_key, websocket=None):
         dashscope.api_key = api_key
+        self.api_key = api_key
         self.callback = TranslatorCallback(websocket)
         self.translator = None
         self.is_running = False
         self.is_paused = False
-        self.audio_thread = None
+        self.uplink_thread = None
         self.use_microphone = False  # 默认禁用麦克风
+        # 服务器麦克风：订阅共享采集，发送线程每 mic_frame_ms 从订阅的块队列取帧发送
+        self.mic_frame_ms = 20
+        self.mic_buffer_seconds = 2
+        self.mic_device_index = None # 输入设备序号，None 为默认设备
+        self.microphone = None       # CaptureSubscription
+        self.capture_sender = None   # CaptureSender
+        self.uplink_buffer = None    # 浏览器音频上行缓冲区
         
         # 用于同步调用的翻译器实例
         self.sync_translator = None
+        
+        # 最近一次文件处理的发送统计
+        self.last_file_stats = None
+        
+        # 会话的语言设置
+        self.source_language = None
+        self.target_languages = []
+        
+        # 启动方式（warm 取自预热连接池 / cold 新建连接）及就绪耗时（秒）
+        self.start_kind = None
+        self.ready_seconds = None
+        
+        # 语音活动检测：未启用时所有音频原样发送
+        self.vad_options = None
+        self.vad_stats = VadStats()
+        
+        # 会话录制：设置 record_path 后，start() 时开始把发送的音频和收到的事件写入该文件
+        self.record_path = None
+        self.recorder = None
+        # 转写记录：设置 transcript_path 后，start() 时开始把句末结果追加写入该文件
+        self.transcript_path = None
+        self.transcript = None
+        # 听众收听ID，由 app.py 在会话启动后分配
+        self.listen_id = None
+        # 指标标签中代替会话ID的序号：会话ID是控制会话的凭据，不能出现在不需认证的 /metrics 中
+        self.metrics_id = str(next(_metrics_ids))
 
-    def start(self, source_language, target_languages, format="pcm", sample_rate=16000):
-        """启动翻译服务"""
+    def start(self, source_language, target_languages, format="pcm", sample_rate=16000, pool=None):
+        """启动翻译服务
+        
+        传入 pool（RecognizerPool）时优先取用参数相同的预热识别器，没有时新建连接
+        """
         try:
             print(f"启动翻译: 源语言={source_language}, 目标语言={target_languages}")
-            print("创建翻译器实例...")
+            started = time.monotonic()
+            self.source_language = source_language
+            self.target_languages = list(target_languages)
             
-            # 设置回调的麦克风使用标志
-            self.callback.use_microphone = self.use_microphone
+            # 订阅共享麦克风：设备已被其他会话打开时直接复用
+            if self.use_microphone:
+                try:
+                    self.microphone = capture_hub.subscribe(
+                        int(32000 * self.mic_buffer_seconds), device_index=self.mic_device_index
+                    )
+                except Exception as e:
+                    print(f"初始化麦克风失败: {e}")
             
-            # 创建翻译器实例
-            self.translator = TranslationRecognizerRealtime(
-                model="gummy-realtime-v1",
-                format=format,
-                sample_rate=sample_rate,
-                source_language=source_language,
-                transcription_enabled=True,
-                translation_enabled=True,
-                translation_target_languages=target_languages,
-                callback=self.callback
-            )
+            entry = None
+            if pool is not None:
+                entry = pool.acquire(pool.key(self.api_key, source_language, target_languages, format, sample_rate))
             
-            print("启动翻译服务...")
-            self.translator.start()
+            if entry is not None:
+                print("使用预热的翻译器实例")
+                entry.callback.websocket = self.callback.websocket
+                entry.callback.audio_offset_ms = entry.idle_audio_ms
+                self.callback = entry.callback
+                self.translator = entry.recognizer
+                self.start_kind = "warm"
+                self.ready_seconds = time.monotonic() - started
+                pool.record_ready(self.start_kind, self.ready_seconds)
+            else:
+                print("创建翻译器实例并启动翻译服务...")
+                self.translator = start_recognizer(
+                    self.callback, source_language, target_languages, format, sample_rate, api_key=self.api_key
+                )
+                self.start_kind = "cold"
+                # SDK 没有公开连接建立的时刻，冷启动记录 start() 返回的耗时
+                self.ready_seconds = time.monotonic() - started
+                if pool is not None:
+                    pool.record_ready(self.start_kind, self.ready_seconds)
+            if self.record_path:
+                self.recorder = SessionRecorder(self.record_path, meta={
+                    "source_language": source_language,
+                    "target_languages": list(target_languages),
+                    "format": format,
+                    "sample_rate": sample_rate,
+                    "start_kind": self.start_kind
+                })
+                self.callback.recorder = self.recorder
+            if self.transcript_path:
+                self.transcript = TranscriptStore(self.transcript_path)
+                self.callback.open_transcript(self.transcript, target_languages)
             self.is_running = True
             
-            # 如果使用麦克风，启动麦克风线程
-            if self.use_microphone:
-                self._start_microphone_thread()
+            # 如果使用麦克风，启动按节拍取帧的发送线程
+            if self.microphone is not None:
+                self._start_capture_sender()
             
             return True
         except Exception as e:
             print(f"启动翻译服务失败: {e}")
             import traceback
             traceback.print_exc()
+            self._release_microphone()
             return False
 
-    def _start_microphone_thread(self):
-        """启动麦克风采集线程"""
-        import threading
+    def enable_vad(self, **options):
+        """启用语音活动检测，options 为 VoiceActivityGate 的参数"""
+        VoiceActivityGate(**options)  # 提前校验参数
+        self.vad_options = options
+        return True
+    
+    def _new_vad_gate(self):
+        # 每条音频路径各用一个检测器，统计汇总到会话
+        if self.vad_options is None:
+            return None
+        return VoiceActivityGate(stats=self.vad_stats, **self.vad_options)
+    
+    def _send_frame(self, recognizer, data, source):
+        # 发送音频并记录发送时刻，用于计算识别延迟；source 为 microphone / browser / file
+        try:
+            recognizer.send_audio_frame(data)
+        except Exception:
+            UPSTREAM_ERRORS.inc(labels=("send",))
+            raise
+        self.callback.latency.audio_sent(len(data), source)
+        if self.recorder is not None:
+            self.recorder.audio(data)
+    
+    def _start_capture_sender(self):
+        """启动麦克风音频的发送线程：与采集回调解耦，按单调时钟节拍发送固定长度的帧"""
+        gate = self._new_vad_gate()
+        
+        def send(data):
+            if gate:
+                data = gate.process(data)
+            translator = self.translator
+            if data and translator:
+                self._send_frame(translator, data, "microphone")
         
-        def mic_thread():
-            global stream
-            print("开始从麦克风采集音频...")
-            while self.is_running and not self.is_paused:
-                if stream:
+        self.capture_sender = CaptureSender(self.microphone.buffer, send, frame_ms=self.mic_frame_ms)
+        self.capture_sender.start()
+        print(f"开始从麦克风采集音频，帧长 {self.mic_frame_ms} 毫秒")
+    
+    def _release_microphone(self):
+        # 停止发送线程并退订共享麦克风，最后一个订阅退订时设备才关闭
+        if self.capture_sender is not None:
+            self.capture_sender.stop()
+            self.capture_sender = None
+        if self.microphone is not None:
+            capture_hub.unsubscribe(self.microphone)
+            self.microphone = None
+    
+    def configure_microphone(self, frame_ms=20, buffer_seconds=2, device_index=None):
+        """设置麦克风音频的发送帧长（20~100 毫秒）、采集缓冲区时长及输入设备，需在 start() 之前调用"""
+        self.mic_frame_ms = min(max(int(frame_ms), 20), 100)
+        self.mic_buffer_seconds = buffer_seconds
+        self.mic_device_index = device_index
+    
+    def capture_stats(self):
+        """麦克风采集与发送统计（溢出丢弃、暂停丢弃、设备溢出、欠载次数），未使用麦克风时为 None"""
+        if self.microphone is None:
+            return None
+        stats = self.microphone.stats()
+        if self.capture_sender is not None:
+            stats.update(self.capture_sender.stats())
+        return stats
+    
+    def enable_replay(self, max_messages=500, max_bytes=1024 * 1024):
+        """给发往客户端的消息编号并保留最近的消息，客户端断线重连后补发"""
+        self.callback.replay = ReplayBuffer(max_messages, max_bytes)
+    
+    def enable_audio_uplink(self, buffer_seconds=5, frame_ms=100, sample_rate=16000):
+        """启用浏览器音频上行：WebSocket 收到的 PCM 帧经环形缓冲区送入识别器"""
+        bytes_per_second = sample_rate * 2
+        self.uplink_buffer = AudioRingBuffer(int(bytes_per_second * buffer_seconds))
+        frame_bytes = int(bytes_per_second * frame_ms / 1000)
+        
+        def uplink_thread():
+            buffer = self.uplink_buffer
+            print("开始发送浏览器上行音频...")
+            gate = self._new_vad_gate()
+            while self.is_running:
+                data = buffer.read(frame_bytes, timeout=frame_ms / 1000)
+                if data is None:
+                    break
+                if data and gate:
+                    data = gate.process(data)
+                translator = self.translator
+                if data and translator:
                     try:
-                        data = stream.read(3200, exception_on_overflow=False)
-                        if self.translator:
-                            self.translator.send_audio_frame(data)
-                        time.sleep(0.05)  # 控制采样率
+                        self._send_frame(translator, data, "browser")
                     except Exception as e:
-                        print(f"从麦克风读取数据失败: {e}")
-                        break
-                else:
-                    print("麦克风流未初始化")
-                    break
-            print("麦克风采集线程结束")
+                        print(f"发送上行音频失败: {e}")
+            print(f"上行音频线程结束，溢出丢弃 {buffer.overrun_bytes} 字节")
         
-        self.audio_thread = threading.Thread(target=mic_thread)
-        self.audio_thread.daemon = True
-        self.audio_thread.start()
+        self.uplink_thread = threading.Thread(target=uplink_thread)
+        self.uplink_thread.daemon = True
+        self.uplink_thread.start()
+        return True
+    
+    def feed_audio(self, data):
+        """写入一帧上行音频（16kHz 单声道 16 位 PCM），不会阻塞；暂停时丢弃"""
+        if self.uplink_buffer is None or not self.is_running or self.is_paused:
+            return False
+        self.uplink_buffer.write(data)
+        return True
     
     def pause(self):
         if not self.is_running or self.is_paused:
             return False
             
         self.is_paused = True
+        # 暂停期间采集回调直接丢弃音频，设备缓冲区不会溢出
+        if self.microphone is not None:
+            self.microphone.paused = True
+            self.capture_sender.pause()
         return True
         
     def resume(self):
@@ -228,9 +596,10 @@ class Translator:
             
         self.is_paused = False
         
-        # 如果使用麦克风，重新启动麦克风线程
-        if self.use_microphone:
-            self._start_microphone_thread()
+        # 发送线程丢弃暂停前残留的音频后继续按节拍发送
+        if self.microphone is not None:
+            self.capture_sender.resume()
+            self.microphone.paused = False
             
         return True
         
@@ -239,73 +608,132 @@ class Translator:
             return False
             
         self.is_running = False
+        self._release_microphone()
+        if self.uplink_buffer:
+            self.uplink_buffer.close()
         if self.translator:
             self.translator.stop()
             self.translator = None
+        if self.recorder is not None:
+            # 识别器停止时会回调剩余的结果，之后再关闭录制文件
+            self.recorder.close()
+        if self.transcript is not None:
+            self.callback.flush_transcript()
+            self.transcript.close()
             
         return True
 
-    def process_audio_file(self, file_path, chunk_size=3200):
-        """处理音频文件并发送到翻译服务"""
+    def process_audio_file(self, file_path, chunk_size=3200, pacing=PACING_SPEEDUP, speed=2.0,
+                           progress=None, cancel_event=None, stream=None, start_seconds=0.0):
+        """处理音频文件并发送到翻译服务
+        
+        pacing 为发送节奏：realtime（实时）、speedup（按 speed 倍速）或 fastest（尽可能快，自适应降速）；
+        progress(sent_seconds, total_seconds) 约每秒回调一次，cancel_event 被设置时提前结束。
+        传入 stream（如仍在上传中的文件读取器）时从该流读取，file_path 仅用于判断格式和日志。
+        start_seconds 大于 0 时跳过开头已发送过的音频（如停滞的上传续传后），sent_seconds 包含跳过的部分
+        """
         if not self.is_running:
             print("翻译服务未启动")
             return False
         
-        if not os.path.exists(file_path):
+        if stream is None and not os.path.exists(file_path):
             print(f"文件不存在: {file_path}")
             return False
         
         try:
-            # 检查文件大小
-            file_size = os.path.getsize(file_path)
-            if file_size == 0:
-                print(f"文件为空: {file_path}")
-                return False
-            
-            print(f"开始处理音频文件: {file_path}, 大小: {file_size} 字节")
-            
-            # 检查文件格式
-            import wave
-            try:
-                with wave.open(file_path, 'rb') as wf:
-                    # 获取音频文件信息
-                    channels = wf.getnchannels()
-                    sample_width = wf.getsampwidth()
-                    frame_rate = wf.getframerate()
-                    frames = wf.getnframes()
-                    
-                    print(f"音频信息: 通道数={channels}, 采样宽度={sample_width}, 采样率={frame_rate}, 帧数={frames}")
-                    
-                    # 如果不是16kHz单声道16位PCM，可能需要转换
-                    if channels != 1 or frame_rate != 16000 or sample_width != 2:
-                        print(f"警告: 音频格式不是标准的16kHz单声道16位PCM，可能需要转换")
-            except:
-                # 不是WAV文件，继续尝试处理
-                print(f"警告: 不是标准WAV文件，将尝试直接处理")
+            if stream is None:
+                # 检查文件大小
+                file_size = os.path.getsize(file_path)
+                if file_size == 0:
+                    print(f"文件为空: {file_path}")
+                    return False
+                
+                print(f"开始处理音频文件: {file_path}, 大小: {file_size} 字节")
+            else:
+                print(f"开始处理音频流: {file_path}")
             
-            with open(file_path, 'rb') as f:
+            # 解析容器并按需解码、混音、重采样为 16kHz 单声道 16 位 PCM
+            with PcmStream(file_path if stream is None else stream, filename=file_path) as audio:
+                print(f"音频信息: {audio.info}, 直接透传: {audio.passthrough}")
+                chunks = audio.chunks(chunk_size)
+                
                 # 发送一些空白音频帧以初始化流
                 blank_audio = b'\x00' * 6400
                 if self.translator:
-                    self.translator.send_audio_frame(blank_audio)
+                    self._send_frame(self.translator, blank_audio, "file")
                     time.sleep(0.1)
                 
-                # 读取并发送实际音频数据
+                # 按单调时钟排定的节奏读取并发送实际音频数据
+                bytes_per_second = 16000 * 2
+                total_seconds = audio.info.duration
+                pacer = FilePacer(pacing, speed=speed)
+                gate = self._new_vad_gate()
+                self.callback.last_result_audio_ms = None
+                pacer.start()
                 sent_bytes = 0
-                while True:
-                    chunk = f.read(chunk_size)
-                    if not chunk:
+                # 实际发送给识别器的字节数（启用语音活动检测时少于 sent_bytes）
+                forwarded_bytes = 0
+                last_progress = 0.0
+                chunk = next(chunks, None)
+                skip_bytes = int(start_seconds * bytes_per_second) // 2 * 2
+                while chunk and skip_bytes:
+                    dropped = min(len(chunk), skip_bytes)
+                    skip_bytes -= dropped
+                    chunk = chunk[dropped:] or next(chunks, None)
+                while chunk and self.is_running:
+                    if cancel_event is not None and cancel_event.is_set():
+                        print(f"音频文件处理已取消: {file_path}")
                         break
-                    if self.translator and not self.is_paused:
-                        self.translator.send_audio_frame(chunk)
-                        sent_bytes += len(chunk)
-                    time.sleep(0.05)  # 控制发送速率
+                    if self.is_paused:
+                        pacer.hold(0.1)
+                        continue
+                    translator = self.translator
+                    if not translator:
+                        break
+                    
+                    pacer.wait()
+                    payload = gate.process(chunk) if gate else chunk
+                    send_start = time.monotonic()
+                    if payload:
+                        try:
+                            self._send_frame(translator, payload, "file")
+                        except Exception as e:
+                            print(f"发送音频帧失败: {e}")
+                            pacer.failed()
+                            if pacer.errors > 5:
+                                raise
+                            continue
+                    sent_bytes += len(chunk)
+                    forwarded_bytes += len(payload)
+                    pacer.sent(len(chunk) / bytes_per_second, time.monotonic() - send_start)
+                    
+                    # 识别结果滞后于已发送音频时降速（识别器的时间轴只包含实际发送的音频）
+                    last_result_ms = self.callback.last_result_audio_ms
+                    if last_result_ms is not None:
+                        pacer.observe_lag(forwarded_bytes / bytes_per_second - last_result_ms / 1000)
+                    
+                    if progress is not None and time.monotonic() - last_progress >= 1.0:
+                        last_progress = time.monotonic()
+                        progress(start_seconds + sent_bytes / bytes_per_second, total_seconds)
+                    
+                    chunk = next(chunks, None)
+                
+                if progress is not None:
+                    progress(start_seconds + sent_bytes / bytes_per_second, total_seconds)
+                
+                self.last_file_stats = pacer.stats()
+                if gate:
+                    self.last_file_stats["vad"] = self.vad_stats.to_dict()
+                print(f"音频文件处理完成: {file_path}, 已发送 {sent_bytes} 字节, 发送统计: {self.last_file_stats}")
                 
-                print(f"音频文件处理完成: {file_path}, 已发送 {sent_bytes} 字节")
+                if gate and self.translator:
+                    tail = gate.flush()
+                    if tail:
+                        self._send_frame(self.translator, tail, "file")
                 
                 # 发送一些空白音频帧以结束流
                 if self.translator:
-                    self.translator.send_audio_frame(blank_audio)
+                    self._send_frame(self.translator, blank_audio, "file")
                     time.sleep(0.1)
                 
                 return True
@@ -315,6 +743,27 @@ class Translator:
             traceback.print_exc()
             return False
     
+    def replay_results(self, result, prefix):
+        """把缓存的文件翻译结果按句推送给客户端，sentence_id 加上 prefix 避免与实时结果冲突"""
+        for i, text in enumerate(result["transcriptions"]):
+            sentence_id = f"{prefix}-{i}"
+            translations = {}
+            for lang, texts in result["translations"].items():
+                if i < len(texts):
+                    translations[lang] = {"text": texts[i], "sentence_id": sentence_id, "is_sentence_end": True}
+            if self.transcript is not None:
+                # 与页面显示的句子一一对应，页面按序号分页加载历史
+                self.transcript.append(
+                    sentence_id, text, {lang: part["text"] for lang, part in translations.items()}
+                )
+            self.callback.notify({
+                "request_id": None,
+                "transcription": {"text": text, "sentence_id": sentence_id, "is_sentence_end": True},
+                "translations": translations,
+                "is_sentence_end": True,
+                "cached": True
+            }, final=True)
+    
     def set_use_microphone(self, use_mic):
         """设置是否使用麦克风"""
         self.use_microphone = use_mic
@@ -326,7 +775,7 @@ class Translator:
             print(f"同步调用翻译: 源语言={source_language}, 目标语言={target_languages}, 文件={file_path}")
             
             # 创建用于同步调用的翻译器实例
-            sync_translator = TranslationRecognizerRealtime(
+            sync_translator = recognizer_factory(
                 model="gummy-realtime-v1",
                 format=format,
                 sample_rate=sample_rate,
@@ -385,4 +834,97 @@ class Translator:
             return {
                 "success": False,
                 "error": str(e)
-            } 
\ No newline at end of file
+            }
+
+    def translate_file_stream(self, file_path, source_language, target_languages,
+                              chunk_size=3200, pacing=PACING_FASTEST, speed=2.0):
+        """流式翻译文件：逐句产出识别完成的句子，最后产出汇总
+        
+        产出 {"type": "sentence", ...}，结束时产出 {"type": "done", ...} 或 {"type": "error", ...}。
+        音频在后台线程中解码并发送，调用方停止迭代（如客户端断开）时停止发送并关闭识别器。
+        """
+        print(f"流式翻译文件: 源语言={source_language}, 目标语言={target_languages}, 文件={file_path}")
+        callback = SentenceStreamCallback(target_languages)
+        recognizer = start_recognizer(callback, source_language, target_languages, "pcm", 16000, api_key=self.api_key)
+        stop_event = threading.Event()
+        bytes_per_second = 16000 * 2
+        stats = {}
+        
+        def feed():
+            try:
+                with PcmStream(file_path) as audio:
+                    pacer = FilePacer(pacing, speed=speed)
+                    pacer.start()
+                    sent_bytes = 0
+                    for chunk in audio.chunks(chunk_size):
+                        if stop_event.is_set():
+                            break
+                        pacer.wait()
+                        send_start = time.monotonic()
+                        recognizer.send_audio_frame(chunk)
+                        AUDIO_SECONDS.inc(len(chunk) / bytes_per_second, ("file_stream",))
+                        sent_bytes += len(chunk)
+                        pacer.sent(len(chunk) / bytes_per_second, time.monotonic() - send_start)
+                        if callback.last_result_audio_ms is not None:
+                            pacer.observe_lag(sent_bytes / bytes_per_second - callback.last_result_audio_ms / 1000)
+                    stats.update(pacer.stats())
+                # stop() 等待服务端返回剩余结果
+                recognizer.stop()
+            except Exception as e:
+                print(f"流式翻译发送音频失败: {e}")
+                callback.on_error(str(e))
+                try:
+                    recognizer.stop()
+                except Exception:
+                    pass
+            finally:
+                callback.finish()
+        
+        sender = threading.Thread(target=feed)
+        sender.daemon = True
+        sender.start()
+        
+        try:
+            while True:
+                kind, payload = callback.events.get()
+                if kind == "sentence":
+                    yield dict(payload, type="sentence")
+                elif kind == "error":
+                    yield {"type": "error", "error": payload}
+                    return
+                else:
+                    yield {
+                        "type": "done",
+                        "request_id": callback.request_id,
+                        "sentences": callback.sentences,
+                        "stats": stats
+                    }
+                    return
+        finally:
+            stop_event.set()
+            callback.close()
+    
+    def call_sync_long(self, file_path, source_language, target_languages, concurrency=4,
+                       splitter_options=None, progress=None, cancel_event=None):
+        """长音频模式的同步翻译：在静音处切分后并发调用多个识别会话，结果按顺序合并"""
+        try:
+            print(f"长音频同步翻译: 源语言={source_language}, 目标语言={target_languages}, 文件={file_path}, 并发数={concurrency}")
+            return translate_long_file(
+                file_path,
+                source_language,
+                target_languages,
+                recognizer_factory=recognizer_factory,
+                concurrency=concurrency,
+                splitter_options=splitter_options,
+                work_dir=os.path.dirname(file_path) or None,
+                progress=progress,
+                cancel_event=cancel_event
+            )
+        except Exception as e:
+            print(f"长音频同步翻译失败: {e}")
+            import traceback
+            traceback.print_exc()
+            return {
+                "success": False,
+                "error": str(e)
+            }
\ No newline at end of file
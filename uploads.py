@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+
+
+class UploadError(Exception):
+    """分块上传参数或数据不合法"""
+
+
+class UploadStalled(UploadError):
+    """上传超过停滞时限没有进展"""
+
+
+class UploadAssembly:
+    """分块上传的组装文件
+
+    目标文件按总大小预先分配，每个分块直接写到自己的偏移位置，分块可以乱序、并行到达。
+    已收到的分块序号追加记录在旁路文件中，客户端断线重连后只需补传缺失的分块。
+    已连续到达的前缀可以通过 open_reader() 边上传边读取。
+    """
+
+    def __init__(self, path, total_size, chunk_size):
+        if total_size <= 0 or chunk_size <= 0:
+            raise UploadError("文件大小和分块大小必须大于 0")
+        self.path = path
+        self.total_size = total_size
+        self.chunk_size = chunk_size
+        self.total_chunks = (total_size + chunk_size - 1) // chunk_size
+        self.received = set()
+        self.contiguous_bytes = 0
+        self.aborted = False
+        self.updated_at = time.time()
+        self._cond = threading.Condition()
+        self._parts_path = path + ".parts"
+
+        self._restore()
+        if not os.path.exists(path) or os.path.getsize(path) != total_size:
+            self.received.clear()
+            with open(path, 'wb') as f:
+                _preallocate(f, total_size)
+            # 清空旧的分块记录
+            open(self._parts_path, 'w').close()
+        self._update_contiguous()
+
+    @property
+    def complete(self):
+        return len(self.received) == self.total_chunks
+
+    def missing(self):
+        return [i for i in range(self.total_chunks) if i not in self.received]
+
+    def chunk_length(self, index):
+        if index == self.total_chunks - 1:
+            return self.total_size - index * self.chunk_size
+        return self.chunk_size
+
+    def write_part(self, index, stream, copy_size=1024 * 1024):
+        """把分块数据从请求流直接写入目标文件的对应偏移"""
+        if not 0 <= index < self.total_chunks:
+            raise UploadError(f"分块序号超出范围: {index}")
+        if self.aborted:
+            raise UploadError("上传已中止")
+
+        expected = self.chunk_length(index)
+        written = 0
+        with open(self.path, 'r+b') as f:
+            f.seek(index * self.chunk_size)
+            while written < expected:
+                data = stream.read(min(copy_size, expected - written))
+                if not data:
+                    break
+                f.write(data)
+                written += len(data)
+            if written != expected or stream.read(1):
+                raise UploadError(f"分块 {index} 大小不正确，应为 {expected} 字节")
+            f.flush()
+            os.fsync(f.fileno())
+
+        with self._cond:
+            if index not in self.received:
+                self.received.add(index)
+                with open(self._parts_path, 'a') as parts:
+                    parts.write(f"{index}\n")
+            self.updated_at = time.time()
+            self._update_contiguous()
+            self._cond.notify_all()
+
+    def abort(self):
+        with self._cond:
+            self.aborted = True
+            self._cond.notify_all()
+
+    def remove(self):
+        """删除组装文件及分块记录"""
+        self.abort()
+        for path in (self.path, self._parts_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def status(self):
+        return {
+            "total_size": self.total_size,
+            "chunk_size": self.chunk_size,
+            "total_chunks": self.total_chunks,
+            "received_chunks": len(self.received),
+            "contiguous_bytes": self.contiguous_bytes,
+            "missing_chunks": self.missing(),
+            "complete": self.complete
+        }
+
+    def open_reader(self, stall_timeout=300):
+        """返回只读取已连续到达前缀的阻塞式读取器"""
+        return _PrefixReader(self, stall_timeout)
+
+    def _wait_for(self, offset, stall_timeout):
+        # 等待 offset 之后有可读数据，返回可读的上界
+        with self._cond:
+            while self.contiguous_bytes <= offset and not self.aborted and offset < self.total_size:
+                if not self._cond.wait(timeout=stall_timeout):
+                    raise UploadStalled(f"上传超过 {stall_timeout} 秒没有进展")
+            if self.aborted:
+                return offset
+            return self.contiguous_bytes
+
+    def _update_contiguous(self):
+        index = self.contiguous_bytes // self.chunk_size
+        while index in self.received:
+            index += 1
+        self.contiguous_bytes = min(index * self.chunk_size, self.total_size)
+
+    def _restore(self):
+        if not os.path.exists(self._parts_path):
+            return
+        with open(self._parts_path) as parts:
+            for line in parts:
+                line = line.strip()
+                if line.isdigit() and int(line) < self.total_chunks:
+                    self.received.add(int(line))
+
+
+class _PrefixReader:
+    """顺序读取上传文件中已连续到达的部分，数据未到达时阻塞等待
+
+    超过 stall_timeout 秒没有新数据时不再等待：置 stalled 并按文件结束返回，读取方可以处理完已到达的部分后
+    释放线程，上传文件保留，续传后可用新的读取器从头读取。
+    """
+
+    def __init__(self, assembly, stall_timeout):
+        self._assembly = assembly
+        self._stall_timeout = stall_timeout
+        self._file = open(assembly.path, 'rb')
+        self._offset = 0
+        self.stalled = False
+
+    def read(self, size=-1):
+        if self.stalled:
+            return b''
+        try:
+            limit = self._assembly._wait_for(self._offset, self._stall_timeout)
+        except UploadStalled:
+            self.stalled = True
+            return b''
+        available = limit - self._offset
+        if available <= 0:
+            return b''
+        if size is None or size < 0 or size > available:
+            size = available
+        self._file.seek(self._offset)
+        data = self._file.read(size)
+        self._offset += len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+def _preallocate(f, size):
+    # 优先真正分配磁盘空间，避免上传中途空间不足；不支持时退化为稀疏文件
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError:
+            pass
+    f.truncate(size)
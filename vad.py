@@ -0,0 +1,148 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+# 持续静音时的处理方式
+SILENCE_KEEPALIVE = "keepalive"   # 用短的静音保活帧代替，保持识别会话不超时
+SILENCE_DROP = "drop"             # 直接丢弃
+SILENCE_MODES = (SILENCE_KEEPALIVE, SILENCE_DROP)
+
+
+class VadStats:
+    """会话级语音活动检测统计，多个采集线程共享，线程安全"""
+
+    def __init__(self, sample_rate=16000, sample_width=2):
+        self.bytes_per_second = sample_rate * sample_width
+        self.input_bytes = 0
+        self.speech_bytes = 0
+        self.suppressed_bytes = 0
+        self.keepalive_bytes = 0
+        self.speech_segments = 0
+        self._lock = threading.Lock()
+
+    def add(self, input_bytes=0, speech_bytes=0, suppressed_bytes=0, keepalive_bytes=0, segments=0):
+        with self._lock:
+            self.input_bytes += input_bytes
+            self.speech_bytes += speech_bytes
+            self.suppressed_bytes += suppressed_bytes
+            self.keepalive_bytes += keepalive_bytes
+            self.speech_segments += segments
+
+    def to_dict(self):
+        with self._lock:
+            bps = self.bytes_per_second
+            return {
+                "input_seconds": round(self.input_bytes / bps, 3),
+                "sent_seconds": round((self.speech_bytes + self.keepalive_bytes) / bps, 3),
+                "suppressed_seconds": round(self.suppressed_bytes / bps, 3),
+                "keepalive_seconds": round(self.keepalive_bytes / bps, 3),
+                "suppressed_ratio": round(self.suppressed_bytes / self.input_bytes, 4) if self.input_bytes else 0.0,
+                "speech_segments": self.speech_segments
+            }
+
+
+class VoiceActivityGate:
+    """基于能量的语音活动检测门限，位于 send_audio_frame 之前
+
+    按 frame_ms 分帧，用 NumPy 对整块数据计算每帧能量（dBFS）。判定阈值取固定阈值与
+    自适应噪声底 + margin_db 中的较大者。语音开始时先补发 preroll_ms 的缓存音频，避免截掉起始音；
+    语音结束后继续发送 hangover_ms 再判定为静音。持续静音按 silence_mode 丢弃，
+    或每隔 keepalive_interval 秒（按音频时间）发送一个 keepalive_ms 的静音帧。
+    输入输出均为 16 位单声道 PCM，非线程安全，每条音频路径各用一个实例。
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=20, threshold_db=-45.0, margin_db=10.0,
+                 hangover_ms=400, preroll_ms=300, silence_mode=SILENCE_KEEPALIVE,
+                 keepalive_interval=1.0, keepalive_ms=20, stats=None):
+        if silence_mode not in SILENCE_MODES:
+            raise ValueError(f"不支持的静音处理方式: {silence_mode}")
+        self.frame_samples = int(sample_rate * frame_ms / 1000)
+        self.frame_bytes = self.frame_samples * 2
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.hangover_frames = max(1, int(hangover_ms / frame_ms))
+        self.silence_mode = silence_mode
+        self.keepalive_frames = max(1, int(keepalive_interval * 1000 / frame_ms))
+        self.keepalive_frame = b'\x00' * (int(sample_rate * keepalive_ms / 1000) * 2)
+        self.stats = stats or VadStats(sample_rate)
+
+        self.noise_floor_db = threshold_db - margin_db
+        self.in_speech = False
+        self._hang = 0
+        self._preroll = deque(maxlen=max(0, int(preroll_ms / frame_ms)))
+        self._silent_frames = 0
+        self._pending = b''
+
+    def process(self, chunk):
+        """输入一块 PCM，返回应发送给识别器的数据（可能为空）"""
+        data = self._pending + chunk
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending = data[usable:]
+        if not usable:
+            return b''
+
+        samples = np.frombuffer(data[:usable], dtype='<i2').reshape(-1, self.frame_samples)
+        levels = frame_levels(samples)
+        fb = self.frame_bytes
+
+        out = []
+        speech_bytes = suppressed_bytes = keepalive_bytes = segments = 0
+        for i, level in enumerate(levels):
+            frame = data[i * fb:(i + 1) * fb]
+            if self._is_speech(level):
+                if not self.in_speech:
+                    # 语音开始：补发预录缓存
+                    self.in_speech = True
+                    segments += 1
+                    for cached in self._preroll:
+                        out.append(cached)
+                        speech_bytes += fb
+                        suppressed_bytes -= fb
+                    self._preroll.clear()
+                self._hang = self.hangover_frames
+            elif self.in_speech:
+                self._hang -= 1
+                if self._hang <= 0:
+                    self.in_speech = False
+                    self._silent_frames = 0
+
+            if self.in_speech:
+                out.append(frame)
+                speech_bytes += fb
+                continue
+
+            # 静音：先记为被抑制，若之后语音开始在预录中补发则冲回
+            suppressed_bytes += fb
+            if self._preroll.maxlen:
+                self._preroll.append(frame)
+            self._silent_frames += 1
+            if self.silence_mode == SILENCE_KEEPALIVE and self._silent_frames >= self.keepalive_frames:
+                self._silent_frames = 0
+                out.append(self.keepalive_frame)
+                keepalive_bytes += len(self.keepalive_frame)
+
+        self.stats.add(usable, speech_bytes, suppressed_bytes, keepalive_bytes, segments)
+        return b''.join(out)
+
+    def flush(self):
+        """结束时把未满一帧的剩余数据原样发出"""
+        data, self._pending = self._pending, b''
+        if data:
+            self.stats.add(len(data), speech_bytes=len(data))
+        return data
+
+    def _is_speech(self, level):
+        # 噪声底：下降时快速跟随，上升时缓慢跟随，语音期间不更新
+        if level < self.noise_floor_db:
+            self.noise_floor_db = 0.5 * self.noise_floor_db + 0.5 * level
+        elif not self.in_speech:
+            self.noise_floor_db = 0.99 * self.noise_floor_db + 0.01 * level
+        return level > max(self.threshold_db, self.noise_floor_db + self.margin_db)
+
+
+def frame_levels(frames):
+    """每帧的 RMS 能量（dBFS）"""
+    values = frames.astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(values * values, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))